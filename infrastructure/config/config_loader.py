@@ -1,13 +1,16 @@
 # config/config_loader.py
 import yaml
 from pathlib import Path
-from dataclasses import dataclass
-from typing import List, Union
+from dataclasses import dataclass, field
+from typing import List, Optional, Union
 
 @dataclass
 class Neighbour:
     id: str
     url: str
+    # Per-neighbour overrides of Config.timeout / Config.hedge_after
+    timeout: Optional[float] = None
+    hedge_after: Optional[float] = None
 
 @dataclass
 class Config:
@@ -15,6 +18,30 @@ class Config:
     role: str
     neighbours: List[Neighbour]
     threshold: int
+    # HTTP client tuning (optional in the YAML)
+    timeout: float = 10.0
+    max_connections: int = 64
+    max_in_flight: int = 8          # concurrent requests per neighbour
+    http2: bool = False
+    # Collection: re-issue an unanswered index request after hedge_after
+    # seconds (0 disables), and stop once collect_quorum neighbours answered
+    # and every secret has threshold shares (0 means threshold neighbours)
+    hedge_after: float = 0.0
+    collect_quorum: int = 0
+    # Long-poll storage servers for up to poll_wait seconds for new shares
+    poll_wait: float = 0.0
+    # Give up on a storage server that is not ready after this many seconds (0 waits forever)
+    ready_timeout: float = 0.0
+    # Placement: copies of every file, points per server on the hash ring,
+    # and (for Bob) the secrets and share count to look up on the ring
+    replication: int = 1
+    vnodes: int = 64
+    num_shares: int = 0
+    secrets: List[str] = field(default_factory=list)
+    # Observability: send W3C traceparent headers (joining $TRACEPARENT if
+    # set), and write the metrics registry to metrics_path after a run
+    trace: bool = False
+    metrics_path: str = ''
 
 
 def load_config(path: Union[str, Path]) -> Config:
@@ -24,5 +51,19 @@ def load_config(path: Union[str, Path]) -> Config:
         id=data['id'],
         role=data['role'],
         neighbours=neighbours,
-        threshold=int(data.get('threshold', 0))
+        threshold=int(data.get('threshold', 0)),
+        timeout=float(data.get('timeout', 10.0)),
+        max_connections=int(data.get('max_connections', 64)),
+        max_in_flight=int(data.get('max_in_flight', 8)),
+        http2=bool(data.get('http2', False)),
+        hedge_after=float(data.get('hedge_after', 0.0)),
+        collect_quorum=int(data.get('collect_quorum', 0)),
+        poll_wait=float(data.get('poll_wait', 0.0)),
+        ready_timeout=float(data.get('ready_timeout', 0.0)),
+        replication=int(data.get('replication', 1)),
+        vnodes=int(data.get('vnodes', 64)),
+        num_shares=int(data.get('num_shares', 0)),
+        secrets=[str(s) for s in data.get('secrets') or []],
+        trace=bool(data.get('trace', False)),
+        metrics_path=str(data.get('metrics_path') or '')
     )
\ No newline at end of file
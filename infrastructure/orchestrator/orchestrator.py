@@ -1,107 +1,649 @@
 # orchestrator/orchestrator.py
 import asyncio
 import logging
-import base64
+import os
 import random
+import struct
+import time
+from contextlib import contextmanager
 from pathlib import Path
+from urllib.parse import quote
 import httpx
-from httpx import ConnectError
 from config.config_loader import load_config, Neighbour, Config
+try:
+    from orchestrator.placement import Placement, _share_key
+except ImportError:
+    # Run as a script (python orchestrator/orchestrator.py), 'orchestrator' is this file
+    from placement import Placement, _share_key
+from storage_server.deltas import HEADER as DELTA_HEADER, encode_record, split_record
+from storage_server.metrics import (Registry, SIZE_BUCKETS, format_traceparent, new_span_id,
+                                    new_trace_id, parse_traceparent)
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("orchestrator")
 
+# Files are streamed to and from the storage servers in chunks of this size
+CHUNK_SIZE = 1 << 16
+
+# Files up to this size are sent together through POST /files:batch
+BATCH_FILE_LIMIT = 256 << 10
+# Upper bound for the body of one batch request
+BATCH_MAX_BYTES = 4 << 20
+# Batch frame: filename length u16, content length u32, filename, content
+_FRAME = struct.Struct('<HI')
+# Index entries requested per page of a storage server's change feed
+INDEX_PAGE = 1000
+# Readiness probes: jittered backoff bounds and per-probe timeout, in seconds
+PROBE_MIN = 0.05
+PROBE_MAX = 0.8
+PROBE_TIMEOUT = 1.0
+
+
+def _encode_batch(files):
+    parts = []
+    for path in files:
+        name, data = path.name.encode(), path.read_bytes()
+        parts.append(_FRAME.pack(len(name), len(data)) + name + data)
+    return b''.join(parts)
+
+
+class _BatchSizer:
+    """
+    Batch size for one neighbour: grows by half while batches complete under
+    the target latency, halves on slow or failed batches.
+    """
+
+    def __init__(self, size=32, low=1, high=1024, target=0.5):
+        self.size, self.low, self.high, self.target = size, low, high, target
+
+    def success(self, elapsed):
+        if elapsed <= self.target:
+            self.size = min(self.high, self.size + max(1, self.size // 2))
+        else:
+            self.size = max(self.low, self.size // 2)
+
+    def failure(self):
+        self.size = max(self.low, self.size // 2)
+
+
+async def _iter_file(path: Path, chunk_size: int = CHUNK_SIZE):
+    with path.open('rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+def _h2_available():
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        logger.warning("http2 requested but the h2 package is not installed; using HTTP/1.1")
+        return False
+
+
 class Orchestrator:
-    def __init__(self, config: Config):
+    def __init__(self, config: Config, transport=None):
         self.node_id = config.id
         self.role = config.role
         self.neighbours = config.neighbours
         self.threshold = config.threshold
         self.data_dir = Path('data')
-        self.client = httpx.AsyncClient(timeout=10)
+        self.max_in_flight = config.max_in_flight
+        self.timeout = config.timeout
+        self.hedge_after = config.hedge_after
+        self.poll_wait = config.poll_wait
+        self.ready_timeout = config.ready_timeout
+        self.num_shares = config.num_shares
+        self.secrets = config.secrets
+        self.placement = Placement([n.id for n in self.neighbours], vnodes=config.vnodes,
+                                   replication=config.replication)
+        self.collect_quorum = min(config.collect_quorum or config.threshold or len(self.neighbours),
+                                  len(self.neighbours))
+        self._semaphores = {}
+        self._batch_sizers = {}
+        self._batch_supported = {}
+        self.metrics_path = config.metrics_path
+        self.metrics = Registry()
+        self._latency = self.metrics.histogram(
+            'orchestrator_request_seconds', 'Request latency per neighbour and operation',
+            ('neighbour', 'op'))
+        self._payload = self.metrics.histogram(
+            'orchestrator_payload_bytes', 'Bytes sent (batch, put) or received (index, download)',
+            ('neighbour', 'op'), buckets=SIZE_BUCKETS)
+        self._retries = self.metrics.counter(
+            'orchestrator_retries_total', 'Uploads sent again after a failed attempt',
+            ('neighbour', 'op'))
+        self._failures = self.metrics.counter(
+            'orchestrator_failures_total', 'Requests that failed (uploads: every attempt)',
+            ('neighbour', 'op'))
+        self._hedges = self.metrics.counter(
+            'orchestrator_hedged_requests_total', 'Index requests issued a second time',
+            ('neighbour',))
+        self._in_flight = self.metrics.gauge(
+            'orchestrator_in_flight_requests', 'Requests awaiting a response', ('neighbour',))
+        # Tracing: one trace per orchestrator run, joining the caller's if
+        # $TRACEPARENT is set; every request is a new span of it
+        self.trace_id = None
+        if config.trace:
+            parent = parse_traceparent(os.environ.get('TRACEPARENT'))
+            self.trace_id = parent[0] if parent else new_trace_id()
+        # downloaded file name -> traceparent of the upload that stored it
+        self.upload_traces = {}
+        limits = httpx.Limits(max_connections=config.max_connections,
+                              max_keepalive_connections=config.max_connections,
+                              keepalive_expiry=30)
+        # transport stands in for the network, e.g. httpx.ASGITransport to in-process servers
+        self.client = httpx.AsyncClient(timeout=config.timeout, limits=limits,
+                                        http2=config.http2 and _h2_available(),
+                                        transport=transport)
+
+    @contextmanager
+    def _track(self, neighbour, op):
+        """Time one request to neighbour, counting it as in flight meanwhile."""
+        self._in_flight.inc(neighbour=neighbour.id)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._in_flight.dec(neighbour=neighbour.id)
+            self._latency.observe(time.perf_counter() - start, neighbour=neighbour.id, op=op)
+
+    def _headers(self, headers=None):
+        """headers plus, when tracing, the traceparent of a new span."""
+        if self.trace_id is None:
+            return headers
+        return {**(headers or {}), 'traceparent': format_traceparent(self.trace_id, new_span_id())}
+
+    async def _wait_until_ready(self, neighbour):
+        """
+        Probe a neighbour's /healthz until it reports ready, backing off
+        exponentially from PROBE_MIN to PROBE_MAX seconds with full jitter.
+        Servers without /healthz count as ready once they answer at all.
+        Returns False if ready_timeout (when set) runs out first.
+        """
+        url = f"{neighbour.url}/healthz"
+        deadline = time.monotonic() + self.ready_timeout if self.ready_timeout else None
+        backoff = PROBE_MIN
+        while True:
+            try:
+                with self._track(neighbour, 'probe'):
+                    r = await self.client.get(url, timeout=PROBE_TIMEOUT, headers=self._headers())
+                if r.status_code in (200, 404):
+                    logger.info(f"{neighbour.id} is ready at {neighbour.url}")
+                    return True
+                logger.info(f"{neighbour.id} not ready: {r.status_code}")
+            except httpx.TransportError:
+                logger.debug(f"Waiting for {neighbour.id} at {neighbour.url}...")
+            if deadline is not None and time.monotonic() >= deadline:
+                logger.error(f"{neighbour.id} not ready after {self.ready_timeout}s")
+                return False
+            await asyncio.sleep(random.uniform(0, backoff))
+            backoff = min(backoff * 2, PROBE_MAX)
 
     async def _wait_for_neighbours(self):
-        for neighbour in self.neighbours:
-            url = neighbour.url
-            while True:
-                try:
-                    _ = await self.client.get(url)
-                    logger.info(f"Connected to {neighbour.id} at {url}")
-                    break
-                except ConnectError:
-                    logger.info(f"Waiting for {neighbour.id} at {url}...")
-                    await asyncio.sleep(1)
+        """Probe every neighbour concurrently; returns those that became ready."""
+        ready = await asyncio.gather(*(self._wait_until_ready(n) for n in self.neighbours))
+        return [n for n, ok in zip(self.neighbours, ready) if ok]
 
-    async def distribute_files(self):
+    async def distribute_files(self, wait_ready=False):
+        """
+        Send every file to the neighbours chosen by the placement ring. With
+        wait_ready, each neighbour is probed first and receives its files as
+        soon as it is ready, independently of the others.
+        """
         src = self.data_dir / 'alice'
-        files = list(src.iterdir())
-        random.shuffle(files)
-        n = len(self.neighbours)
-        groups = [files[i::n] for i in range(n)]
+        if not src.is_dir():
+            logger.warning(f"Nothing to distribute: {src} does not exist")
+            return
+        by_node = self.placement.assign(sorted(p.name for p in src.iterdir()))
+        groups = [[src / name for name in by_node.get(n.id, [])] for n in self.neighbours]
+
+        async def deliver(neighbour, group):
+            if wait_ready and not await self._wait_until_ready(neighbour):
+                logger.error(f"Skipping {len(group)} files for {neighbour.id}")
+                return
+            await self._send_group(neighbour, group)
+
+        await asyncio.gather(*(deliver(neighbour, group)
+                               for neighbour, group in zip(self.neighbours, groups)))
+        logger.info("All files distributed.")
+
+    def _semaphore(self, neighbour_id):
+        # Bounds the requests in flight to one neighbour
+        if neighbour_id not in self._semaphores:
+            self._semaphores[neighbour_id] = asyncio.Semaphore(self.max_in_flight)
+        return self._semaphores[neighbour_id]
+
+    async def _send_group(self, neighbour, files):
+        """Send small files in adaptive batches and large ones as streamed PUTs."""
+        small, large = [], []
+        for file_path in files:
+            (small if file_path.stat().st_size <= BATCH_FILE_LIMIT else large).append(file_path)
+        tasks = [self._put_with_retry(neighbour, file_path) for file_path in large]
+        tasks.append(self._send_batches(neighbour, small))
+        await asyncio.gather(*tasks)
+
+    async def _send_batches(self, neighbour, files):
+        sizer = self._batch_sizers.setdefault(neighbour.id, _BatchSizer())
         tasks = []
-        for neighbour, group in zip(self.neighbours, groups):
-            for file_path in group:
-                content = base64.b64encode(file_path.read_bytes()).decode()
-                payload = {'from': self.node_id, 'to': neighbour.id,
-                           'filename': file_path.name, 'content': content}
-                url = f"{neighbour.url}/files"
-                logger.info(f"POST file {file_path.name} to {neighbour.id}")
-                tasks.append(self._post_with_retry(url, payload, neighbour.id, file_path.name))
+        i = 0
+        while i < len(files):
+            batch, size = [], 0
+            while i < len(files) and len(batch) < sizer.size:
+                file_size = files[i].stat().st_size
+                if batch and size + file_size > BATCH_MAX_BYTES:
+                    break
+                batch.append(files[i])
+                size += file_size
+                i += 1
+            # Wait for a free slot before cutting the next batch, so later
+            # batches are sized with feedback from the earlier ones
+            await self._semaphore(neighbour.id).acquire()
+            tasks.append(asyncio.create_task(self._post_batch_with_retry(neighbour, batch, sizer)))
         await asyncio.gather(*tasks)
-        logger.info("All files distributed.")
 
-    async def _post_with_retry(self, url, payload, neighbour_id, filename, retries=5):
+    async def _post_batch_with_retry(self, neighbour, batch, sizer, retries=5):
+        """Send one batch; the caller has already acquired a slot for the first attempt."""
+        sem = self._semaphore(neighbour.id)
+        if self._batch_supported.get(neighbour.id) is False:
+            sem.release()
+            await asyncio.gather(*(self._put_with_retry(neighbour, f) for f in batch))
+            return
+        url = f"{neighbour.url}/files:batch"
+        headers = {'Content-Type': 'application/octet-stream',
+                   'X-From': quote(self.node_id), 'X-To': quote(neighbour.id)}
+        body = _encode_batch(batch)
         backoff = 1
         for attempt in range(1, retries + 1):
+            if attempt > 1:
+                await sem.acquire()
+                self._retries.inc(neighbour=neighbour.id, op='batch')
+            start = time.monotonic()
+            self._payload.observe(len(body), neighbour=neighbour.id, op='batch')
             try:
-                r = await self.client.post(url, json=payload)
-                if r.status_code == 200:
-                    return
-                else:
-                    logger.error(f"Attempt {attempt}: Error posting {filename} to {neighbour_id}: {r.status_code}")
-            except ConnectError as e:
-                logger.error(f"Attempt {attempt}: Connection error to {neighbour_id}: {e}")
-            await asyncio.sleep(backoff)
+                with self._track(neighbour, 'batch'):
+                    r = await self.client.post(url, content=body, headers=self._headers(headers))
+                status = r.status_code
+            except httpx.TransportError as e:
+                status = None
+                logger.error(f"Attempt {attempt}: Connection error to {neighbour.id}: {e}")
+            finally:
+                sem.release()
+            if status == 200:
+                sizer.success(time.monotonic() - start)
+                logger.info(f"POST batch of {len(batch)} files to {neighbour.id}")
+                return
+            if status in (404, 405):
+                # Server without the batch endpoint: fall back to one PUT per file
+                self._batch_supported[neighbour.id] = False
+                await asyncio.gather(*(self._put_with_retry(neighbour, f) for f in batch))
+                return
+            if status is not None:
+                logger.error(f"Attempt {attempt}: Error posting batch to {neighbour.id}: {status}")
+            sizer.failure()
+            # Back off without holding a slot so other batches keep flowing
+            await asyncio.sleep(backoff * (0.5 + random.random()))
             backoff *= 2
-        logger.error(f"Failed to POST {filename} to {neighbour_id} after {retries} attempts")
+        self._failures.inc(neighbour=neighbour.id, op='batch')
+        logger.error(f"Failed to POST batch of {len(batch)} files to {neighbour.id} after {retries} attempts")
 
-    async def collect_files(self):
+    async def _put_with_retry(self, neighbour, file_path, retries=5):
+        # The body is streamed from disk, so it is re-opened on every attempt
+        filename = file_path.name
+        url = f"{neighbour.url}/files/{quote(neighbour.id, safe='')}/{quote(filename, safe='')}"
+        headers = {'Content-Type': 'application/octet-stream',
+                   'Content-Length': str(file_path.stat().st_size),
+                   'X-From': quote(self.node_id)}
+        backoff = 1
+        for attempt in range(1, retries + 1):
+            if attempt > 1:
+                self._retries.inc(neighbour=neighbour.id, op='put')
+            async with self._semaphore(neighbour.id):
+                logger.info(f"PUT file {filename} to {neighbour.id}")
+                self._payload.observe(int(headers['Content-Length']), neighbour=neighbour.id, op='put')
+                try:
+                    with self._track(neighbour, 'put'):
+                        r = await self.client.put(url, content=_iter_file(file_path),
+                                                  headers=self._headers(headers))
+                    if r.status_code == 200:
+                        return
+                    logger.error(f"Attempt {attempt}: Error posting {filename} to {neighbour.id}: {r.status_code}")
+                except httpx.TransportError as e:
+                    logger.error(f"Attempt {attempt}: Connection error to {neighbour.id}: {e}")
+            await asyncio.sleep(backoff * (0.5 + random.random()))
+            backoff *= 2
+        self._failures.inc(neighbour=neighbour.id, op='put')
+        logger.error(f"Failed to PUT {filename} to {neighbour.id} after {retries} attempts")
+
+    def _policy(self, neighbour):
+        """(timeout, hedge delay) for requests to one neighbour."""
+        timeout = neighbour.timeout if neighbour.timeout is not None else self.timeout
+        hedge = neighbour.hedge_after if neighbour.hedge_after is not None else self.hedge_after
+        return timeout, hedge
+
+    async def _get_index(self, neighbour, since=0, wait=0.0):
+        """
+        Fetch one page of a neighbour's index after cursor since, long-polling
+        up to wait seconds if it is empty. Returns None if it fails or times
+        out. With a hedge delay, a second identical request is started if the
+        first has not answered by then; whichever answers first is used.
+        """
+        timeout, hedge = self._policy(neighbour)
+        timeout += wait
+        hedge = hedge and hedge + wait
+        url = f"{neighbour.url}/files/{quote(neighbour.id, safe='')}/index"
+        params = {'since': since, 'wait': wait, 'limit': INDEX_PAGE}
+
+        async def attempt():
+            with self._track(neighbour, 'index'):
+                resp = await self.client.get(url, params=params, timeout=timeout,
+                                             headers=self._headers())
+            self._payload.observe(len(resp.content), neighbour=neighbour.id, op='index')
+            if resp.status_code != 200:
+                raise httpx.HTTPStatusError(f"{resp.status_code}", request=resp.request, response=resp)
+            return resp.json()
+
+        attempts = [asyncio.create_task(attempt())]
+        hedged = not hedge
+        deadline = time.monotonic() + timeout
+        try:
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                wait = remaining if hedged else min(remaining, hedge)
+                done, _ = await asyncio.wait(attempts, timeout=wait,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    attempts.remove(task)
+                    if task.exception() is None:
+                        return task.result()
+                    logger.warning(f"GET index from {neighbour.id} failed: {task.exception()!r}")
+                if not hedged:
+                    # Slow or failed: issue the one hedged request
+                    hedged = True
+                    self._hedges.inc(neighbour=neighbour.id)
+                    logger.info(f"Hedging index request to {neighbour.id}")
+                    attempts.append(asyncio.create_task(attempt()))
+                elif not attempts:
+                    break
+            self._failures.inc(neighbour=neighbour.id, op='index')
+            logger.error(f"No index from {neighbour.id}")
+            return None
+        finally:
+            for task in attempts:
+                task.cancel()
+
+    async def _download(self, neighbour, entry, dst):
+        """
+        Stream one stored file to dst/filename. Writes go to a temporary
+        name, so a cancelled download leaves nothing.
+        """
+        base = f"{neighbour.url}/files/{quote(neighbour.id, safe='')}"
+        timeout, _ = self._policy(neighbour)
+        name = Path(entry['filename']).name
+        part = dst / f".{name}.{neighbour.id}.part"
+        size = 0
+        try:
+            async with self._semaphore(neighbour.id):
+                with self._track(neighbour, 'download'):
+                    async with self.client.stream('GET', f"{base}/{entry['seq']}", timeout=timeout,
+                                                  headers=self._headers()) as resp:
+                        if resp.status_code != 200:
+                            logger.warning(f"GET {name} from {neighbour.id} returned {resp.status_code}")
+                            self._failures.inc(neighbour=neighbour.id, op='download')
+                            return None
+                        with part.open('wb') as out:
+                            async for chunk in resp.aiter_bytes(CHUNK_SIZE):
+                                out.write(chunk)
+                                size += len(chunk)
+                part.replace(dst / name)
+            self._payload.observe(size, neighbour=neighbour.id, op='download')
+            uploaded = resp.headers.get('x-upload-traceparent')
+            if uploaded is not None and self.trace_id is not None:
+                self.upload_traces[name] = uploaded
+                logger.info(f"{name} was uploaded in trace {uploaded}")
+            return name
+        except httpx.TransportError as e:
+            self._failures.inc(neighbour=neighbour.id, op='download')
+            logger.error(f"Error downloading {name} from {neighbour.id}: {e}")
+            return None
+        finally:
+            part.unlink(missing_ok=True)
+
+    async def _ack(self, neighbour, seqs, upto=None):
+        """Tell a neighbour the downloaded entries (and any seq <= upto) can be deleted."""
+        url = f"{neighbour.url}/files/{quote(neighbour.id, safe='')}/ack"
+        body = {'seqs': sorted(seqs)}
+        if upto is not None:
+            body['upto'] = upto
+        try:
+            with self._track(neighbour, 'ack'):
+                resp = await self.client.post(url, json=body, headers=self._headers())
+            if resp.status_code != 200:
+                self._failures.inc(neighbour=neighbour.id, op='ack')
+                logger.warning(f"Ack to {neighbour.id} returned {resp.status_code}")
+        except httpx.TransportError as e:
+            self._failures.inc(neighbour=neighbour.id, op='ack')
+            logger.error(f"Error acknowledging files on {neighbour.id}: {e}")
+
+    async def refresh_shares(self, record_path):
+        """
+        Ship a delta record (proactive share refresh) to the servers holding
+        the shares and commit_ files it names: each server gets only its own
+        entries, in records of at most BATCH_MAX_BYTES that keep the original
+        record id, so a retried or repeated refresh is not applied twice.
+        Returns the number of files refreshed.
+        """
+        size, record_id, moduli, entries = split_record(Path(record_path).read_bytes())
+        by_node = self.placement.assign(sorted(entries))
+        header_size = DELTA_HEADER.size + len(moduli)
+
+        def records(names):
+            chunk, length = [], header_size
+            for name in names:
+                if chunk and length + len(entries[name]) > BATCH_MAX_BYTES:
+                    yield chunk
+                    chunk, length = [], header_size
+                chunk.append(entries[name])
+                length += len(entries[name])
+            if chunk:
+                yield chunk
+
+        tasks = []
+        for neighbour in self.neighbours:
+            for chunk in records(by_node.get(neighbour.id, [])):
+                body = encode_record(size, record_id, moduli, chunk)
+                tasks.append(self._post_refresh_with_retry(neighbour, body, len(chunk)))
+        applied = sum(await asyncio.gather(*tasks))
+        logger.info(f"Refreshed {applied} of {len(entries)} files")
+        return applied
+
+    async def _post_refresh_with_retry(self, neighbour, body, count, retries=5):
+        url = f"{neighbour.url}/files/{quote(neighbour.id, safe='')}/refresh"
+        headers = {'Content-Type': 'application/octet-stream'}
+        backoff = 1
+        for attempt in range(1, retries + 1):
+            if attempt > 1:
+                self._retries.inc(neighbour=neighbour.id, op='refresh')
+            async with self._semaphore(neighbour.id):
+                self._payload.observe(len(body), neighbour=neighbour.id, op='refresh')
+                try:
+                    with self._track(neighbour, 'refresh'):
+                        r = await self.client.post(url, content=body, headers=self._headers(headers))
+                    if r.status_code == 200:
+                        result = r.json()
+                        if result['missing']:
+                            logger.warning(f"{neighbour.id} holds no share for {len(result['missing'])} "
+                                           f"of {count} deltas")
+                        return result['applied']
+                    logger.error(f"Attempt {attempt}: Error refreshing shares on {neighbour.id}: {r.status_code}")
+                    if r.status_code in (400, 413):
+                        break
+                except httpx.TransportError as e:
+                    logger.error(f"Attempt {attempt}: Connection error to {neighbour.id}: {e}")
+            await asyncio.sleep(backoff * (0.5 + random.random()))
+            backoff *= 2
+        self._failures.inc(neighbour=neighbour.id, op='refresh')
+        logger.error(f"Failed to refresh {count} shares on {neighbour.id}")
+        return 0
+
+    async def collect_files(self, secrets=None):
+        """
+        Follow the change feeds of the neighbours concurrently. When the
+        secrets to collect (and num_shares) are known, only the neighbours
+        that the placement ring assigns their shares to are contacted.
+        Share files (share_{idx}_{name}) are only needed until every secret
+        has threshold distinct indices: further downloads of a complete
+        secret are cancelled. When the secrets are known, collection ends
+        once collect_quorum neighbours have answered, every secret has
+        threshold shares and nothing else is outstanding; slower requests
+        are then cancelled. Otherwise a secret could sit only on neighbours
+        that have not answered yet, so every neighbour is waited for. With poll_wait, a neighbour's feed is
+        long-polled again while shares are missing, until it stays empty for
+        poll_wait seconds. Downloaded entries are acknowledged, which deletes
+        them on the server. So is everything up to the cursor of a neighbour
+        whose feed was read to the end, once no entry on it is still needed:
+        surplus shares of complete secrets would otherwise stay behind and
+        be collected again, with a later round's shares of the same name.
+        """
         dst = self.data_dir / 'bob'
         dst.mkdir(parents=True, exist_ok=True)
         collected = []
-        for neighbour in self.neighbours:
-            url = f"{neighbour.url}/files/{neighbour.id}"
-            logger.info(f"GET files from {neighbour.id}")
-            try:
-                resp = await self.client.get(url)
-                if resp.status_code == 200:
-                    entries = resp.json()
+        secrets = self.secrets if secrets is None else secrets
+        targets = self.neighbours
+        known = bool(secrets and self.num_shares)
+        if known:
+            holders = set(self.placement.holders(secrets, self.num_shares))
+            targets = [n for n in self.neighbours if n.id in holders]
+            logger.info(f"Shares of {len(secrets)} secrets are held by {len(targets)} neighbours")
+        quorum = min(self.collect_quorum, len(targets)) if known else len(targets)
+        indexes = {asyncio.create_task(self._get_index(n, wait=self.poll_wait)): n
+                   for n in targets}
+        cursors = {n.id: 0 for n in targets}
+        downloads = {}          # task -> (neighbour, seq, secret, idx); secret is None for other files
+        acked = {n.id: [] for n in targets}
+        have = {}               # secret -> share indices on disk
+        requested = {}          # secret -> share indices downloaded or in flight
+        others = set()          # non-share file names seen
+        answered = set()
+        cancelled = {}          # download task -> key, for downloads no longer needed
+        skipped = {n.id: set() for n in targets}   # secrets of share entries not downloaded
+        failed = set()          # neighbours a download from failed
+
+        def complete():
+            return (len(answered) >= quorum
+                    and all(key[2] is not None for key in downloads.values())
+                    and all(len(have.get(s, ())) >= self.threshold
+                            for s in requested.keys() | set(secrets if known else ())))
+
+        while indexes or downloads:
+            if complete():
+                break
+            done, _ = await asyncio.wait(list(indexes) + list(downloads),
+                                         return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task in indexes:
+                    neighbour = indexes.pop(task)
+                    entries = task.result()
+                    if entries is None:
+                        continue
+                    logger.info(f"{neighbour.id} sent {len(entries)} index entries")
                     for entry in entries:
-                        name = entry['filename']
-                        data = base64.b64decode(entry['content'])
-                        out = dst / name
-                        out.write_bytes(data)
-                        collected.append(name)
-                else:
-                    logger.warning(f"{neighbour.id} returned {resp.status_code}")
-            except ConnectError as e:
-                logger.error(f"Error connecting to {neighbour.id}: {e}")
+                        cursors[neighbour.id] = max(cursors[neighbour.id], entry['seq'])
+                        key = _share_key(entry['filename'])
+                        if key is None:
+                            if entry['filename'] in others:
+                                continue
+                            others.add(entry['filename'])
+                            secret, idx = None, entry['filename']
+                        else:
+                            secret, idx = key
+                            wanted = requested.setdefault(secret, set())
+                            if len(have.get(secret, ())) >= self.threshold or idx in wanted:
+                                skipped[neighbour.id].add(secret)
+                                continue
+                            wanted.add(idx)
+                        download = asyncio.create_task(self._download(neighbour, entry, dst))
+                        downloads[download] = (neighbour, entry['seq'], secret, idx)
+                    if len(entries) == INDEX_PAGE:
+                        # More pages waiting: fetch the next one right away
+                        indexes[asyncio.create_task(
+                            self._get_index(neighbour, cursors[neighbour.id]))] = neighbour
+                        continue
+                    answered.add(neighbour.id)
+                    if entries and self.poll_wait and not complete():
+                        indexes[asyncio.create_task(self._get_index(
+                            neighbour, cursors[neighbour.id], self.poll_wait))] = neighbour
+                    continue
+                neighbour, seq, secret, idx = downloads.pop(task)
+                name = task.result()
+                if name is None:
+                    failed.add(neighbour.id)
+                    if secret is not None:
+                        requested[secret].discard(idx)
+                    continue
+                collected.append(name)
+                acked[neighbour.id].append(seq)
+                if secret is None:
+                    continue
+                have.setdefault(secret, set()).add(idx)
+                if len(have[secret]) == self.threshold:
+                    for other, key in list(downloads.items()):
+                        if key[2] == secret and not other.done():
+                            other.cancel()
+                            cancelled[other] = key
+                            del downloads[other]
+
+        cancelled.update(downloads)
+        pending = list(indexes) + list(cancelled)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        for task, (neighbour, seq, _, _) in cancelled.items():
+            # A cancellation can land after the download already finished
+            if not task.cancelled() and task.exception() is None and task.result() is not None:
+                collected.append(task.result())
+                acked[neighbour.id].append(seq)
+
+        def drained(n):
+            # Read to the end, and nothing left on it is a share still missing
+            return (n.id in answered and n.id not in failed and cursors[n.id]
+                    and all(len(have.get(s, ())) >= self.threshold for s in skipped[n.id]))
+
+        uptos = {n.id: cursors[n.id] if drained(n) else None for n in targets}
+        await asyncio.gather(*(self._ack(n, acked[n.id], uptos[n.id]) for n in targets
+                               if acked[n.id] or uptos[n.id]))
+        short = sorted(s for s in requested.keys() | set(secrets if known else ())
+                       if len(have.get(s, ())) < self.threshold)
+        if short:
+            logger.error(f"Fewer than {self.threshold} shares collected for {short}")
+        if not collected:
+            logger.error(f"Nothing collected from {len(targets)} neighbours")
         logger.info(f"Collected {len(collected)} files: {collected}")
+        return collected
 
-    async def run(self):
+    async def run(self, refresh=None):
         logger.info(f"Node {self.node_id} running as {self.role}")
-        if self.role == 'alice':
-            await self._wait_for_neighbours()
-            await self.distribute_files()
+        if refresh:
+            await self.refresh_shares(refresh)
+        elif self.role == 'alice':
+            await self.distribute_files(wait_ready=True)
         elif self.role == 'bob':
-            await asyncio.sleep(2)
             await self.collect_files()
         await self.client.aclose()
+        if self.metrics_path:
+            Path(self.metrics_path).write_text(self.metrics.render())
+            logger.info(f"Metrics written to {self.metrics_path}")
 
 if __name__ == '__main__':
     import argparse
     p = argparse.ArgumentParser()
     p.add_argument('-c','--config', required=True)
+    p.add_argument('--refresh', metavar='RECORD', default=None,
+                   help='Apply a delta record (sss refresh) to the stored shares instead')
     args = p.parse_args()
     cfg = load_config(args.config)
-    asyncio.run(Orchestrator(cfg).run())
\ No newline at end of file
+    asyncio.run(Orchestrator(cfg).run(refresh=args.refresh))
\ No newline at end of file
@@ -0,0 +1,170 @@
+# orchestrator/placement.py
+"""
+Consistent-hash placement of files on storage servers.
+
+Every server owns `vnodes` points on a 64-bit hash ring. A key's preference
+list is the sequence of distinct servers met walking clockwise from the
+key's hash, so finding where a key lives is a binary search plus a short
+walk, and adding or removing a server only moves the keys next to its
+points.
+
+Shares (share_{idx}_{name}) of one secret are placed together: each share
+index is hashed on its own, but servers already holding another share of
+the same secret are skipped (anti-affinity), and each share is stored on
+`replication` distinct servers. Only when a secret has more shares times
+replicas than there are servers do servers start taking a second share,
+spread as evenly as possible.
+"""
+import bisect
+import hashlib
+import heapq
+import logging
+from typing import Dict, Iterable, Iterator, List, Sequence
+
+logger = logging.getLogger("orchestrator.placement")
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'big')
+
+
+def _share_key(filename):
+    """(secret name, share index) for share_{idx}_{name} files, else None."""
+    parts = filename.split('_', 2)
+    if len(parts) == 3 and parts[0] == 'share' and parts[1].isdigit():
+        return parts[2], int(parts[1])
+    return None
+
+
+class HashRing:
+    """Consistent-hash ring of node ids with virtual nodes."""
+
+    def __init__(self, nodes: Iterable[str] = (), vnodes: int = 64):
+        self.vnodes = vnodes
+        self._nodes = set()
+        self._points: List[int] = []
+        self._owners: List[str] = []
+        self.update(nodes)
+
+    def __len__(self) -> int:
+        return len(self._nodes)
+
+    def __contains__(self, node: str) -> bool:
+        return node in self._nodes
+
+    def add(self, node: str) -> None:
+        self.update([node])
+
+    def update(self, nodes: Iterable[str]) -> None:
+        """Add several nodes with one merge into the ring (adding them one by one is quadratic)."""
+        fresh = [node for node in dict.fromkeys(nodes) if node not in self._nodes]
+        if not fresh:
+            return
+        self._nodes.update(fresh)
+        new = sorted((_hash(f"{node}#{v}"), node) for node in fresh for v in range(self.vnodes))
+        merged = list(heapq.merge(zip(self._points, self._owners), new))
+        self._points = [p for p, _ in merged]
+        self._owners = [n for _, n in merged]
+
+    def remove(self, node: str) -> None:
+        if node not in self._nodes:
+            return
+        self._nodes.discard(node)
+        kept = [(p, n) for p, n in zip(self._points, self._owners) if n != node]
+        self._points = [p for p, _ in kept]
+        self._owners = [n for _, n in kept]
+
+    def walk(self, key: str) -> Iterator[str]:
+        """Distinct nodes clockwise from key's position (its preference list)."""
+        total = len(self._points)
+        if not total:
+            return
+        start = bisect.bisect(self._points, _hash(key))
+        seen = set()
+        for i in range(total):
+            node = self._owners[(start + i) % total]
+            if node not in seen:
+                seen.add(node)
+                yield node
+                if len(seen) == len(self._nodes):
+                    return
+
+    def lookup(self, key: str) -> str:
+        """The node owning key. Raises LookupError on an empty ring."""
+        for node in self.walk(key):
+            return node
+        raise LookupError("Hash ring has no nodes")
+
+
+class Placement:
+    """Decides which storage servers hold each file."""
+
+    def __init__(self, nodes: Iterable[str], vnodes: int = 64, replication: int = 1):
+        self.ring = HashRing(nodes, vnodes)
+        if replication < 1:
+            raise ValueError("replication must be at least 1")
+        self.replication = replication
+
+    def file_nodes(self, name: str) -> List[str]:
+        """Servers for a file that is not a share: its first replicas on the ring."""
+        nodes = []
+        for node in self.ring.walk(name):
+            nodes.append(node)
+            if len(nodes) == self.replication:
+                break
+        return nodes
+
+    def share_nodes(self, secret: str, indices: Iterable[int]) -> Dict[int, List[str]]:
+        """
+        Servers for each share index of one secret. Depends only on the
+        secret, the set of indices and the ring, so Alice and Bob agree.
+        """
+        if not len(self.ring):
+            raise LookupError("Hash ring has no nodes")
+        replicas = min(self.replication, len(self.ring))
+        used = set()
+        placed = {}
+        crowded = False
+        for idx in sorted(set(indices)):
+            chosen: List[str] = []
+            while len(chosen) < replicas:
+                for node in self.ring.walk(f"{secret}#{idx}"):
+                    if node not in used and node not in chosen:
+                        chosen.append(node)
+                        if len(chosen) == replicas:
+                            break
+                else:
+                    # Every server already holds a share of this secret:
+                    # start another round so the extra shares spread evenly
+                    crowded = True
+                    used.clear()
+            used.update(chosen)
+            placed[idx] = chosen
+        if crowded:
+            logger.warning(f"Fewer servers than shares of {secret}; some hold several")
+        return placed
+
+    def assign(self, names: Sequence[str]) -> Dict[str, List[str]]:
+        """Group file names by the servers that should store them."""
+        groups: Dict[str, List[str]] = {}
+        secrets: Dict[str, Dict[int, str]] = {}
+        for name in names:
+            key = _share_key(name)
+            if key is None:
+                for node in self.file_nodes(name):
+                    groups.setdefault(node, []).append(name)
+            else:
+                secrets.setdefault(key[0], {})[key[1]] = name
+        for secret, shares in secrets.items():
+            for idx, nodes in self.share_nodes(secret, shares).items():
+                for node in nodes:
+                    groups.setdefault(node, []).append(shares[idx])
+        return groups
+
+    def holders(self, secrets: Iterable[str], num_shares: int) -> List[str]:
+        """Every server that holds a share of the given secrets."""
+        nodes = set()
+        for secret in secrets:
+            for placed in self.share_nodes(secret, range(1, num_shares + 1)).values():
+                nodes.update(placed)
+        return sorted(nodes)
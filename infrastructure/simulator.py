@@ -0,0 +1,316 @@
+# simulator.py
+"""
+In-process virtual cluster for scaling tests.
+
+Every simulated storage node is its own instance of storage_server/app.py
+(a fresh copy of the module, so backends, long-polls and metrics are not
+shared), reached through one httpx transport that routes each request by
+host name to the node's ASGI app. Nodes can be given extra latency (fixed
+plus uniform jitter), a rate of injected connection failures, or be down
+altogether; "slow" nodes are simply nodes with a much larger latency.
+
+Topologies are generated as Config/Neighbour objects, so the orchestrator
+runs unchanged: Alice's distribute_files (probing readiness first, so that
+down nodes are skipped after ready_timeout) and Bob's collect_files for
+the secrets Alice stored. Each scenario reports the wall time and share
+throughput of both phases, and the per-request latency percentiles seen at
+the transport, as node count and share count grow.
+
+Rows use the experiment,metric,seconds schema of statistics/: experiment
+is the repeat number and metric the phase and scenario, e.g.
+collect_n300_s10000 is collect_files with 300 nodes and 10000 shares.
+
+Usage (from infrastructure/):
+    python3 simulator.py --nodes 100,300,1000 --shares 1000,10000
+    python3 simulator.py --nodes 500 --slow 0.05 --down 0.01 --latency 0.002 --out sim.csv
+"""
+import argparse
+import asyncio
+import csv
+import importlib.util
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Sequence
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+STORAGE_SERVER = os.path.join(ROOT, 'storage_server')
+sys.path.insert(0, ROOT)
+# storage_server is not a package: its modules import each other by file name
+sys.path.insert(0, STORAGE_SERVER)
+
+import httpx  # noqa: E402
+
+from config.config_loader import Config, Neighbour  # noqa: E402
+from orchestrator.orchestrator import Orchestrator  # noqa: E402
+from storage import MemoryBackend  # noqa: E402
+
+PERCENTILES = (50, 90, 99)
+SHARE_BYTES = 66
+
+
+@dataclass
+class NodeProfile:
+    """Injected behaviour of one simulated node."""
+    latency: float = 0.0        # seconds added to every request
+    jitter: float = 0.0         # plus up to this many seconds, uniformly
+    fail_rate: float = 0.0      # share of requests failing with a connection error
+    down: bool = False          # every request fails
+
+
+def topology(size: int, latency: float = 0.0, jitter: float = 0.0, fail_rate: float = 0.0,
+             slow: float = 0.0, slow_latency: float = 0.05, down: float = 0.0,
+             seed: int = 1) -> List[NodeProfile]:
+    """
+    Profiles of size nodes: all get latency/jitter/fail_rate, a fraction
+    slow of them slow_latency on top, and a fraction down of them are down.
+    """
+    rng = random.Random(seed)
+    order = list(range(size))
+    rng.shuffle(order)
+    n_down, n_slow = round(size * down), round(size * slow)
+    profiles = [NodeProfile(latency, jitter, fail_rate) for _ in range(size)]
+    for i in order[:n_down]:
+        profiles[i].down = True
+    for i in order[n_down:n_down + n_slow]:
+        profiles[i].latency += slow_latency
+    return profiles
+
+
+def _load_app(name: str):
+    """A fresh, unshared copy of the storage_server app module."""
+    spec = importlib.util.spec_from_file_location(name, os.path.join(STORAGE_SERVER, 'app.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class ClusterTransport(httpx.AsyncBaseTransport):
+    """Routes requests by host to the nodes' ASGI apps, injecting each node's profile."""
+
+    def __init__(self, cluster: 'Cluster', seed: int = 1):
+        self.cluster = cluster
+        self.rng = random.Random(seed)
+        self.latencies: List[float] = []
+
+    async def handle_async_request(self, request):
+        node = self.cluster.nodes.get(request.url.host)
+        if node is None:
+            raise httpx.ConnectError(f"Unknown host {request.url.host}", request=request)
+        profile = node.profile
+        start = time.perf_counter()
+        delay = profile.latency + (self.rng.random() * profile.jitter if profile.jitter else 0.0)
+        if delay:
+            await asyncio.sleep(delay)
+        if profile.down or (profile.fail_rate and self.rng.random() < profile.fail_rate):
+            raise httpx.ConnectError(f"Injected failure on {request.url.host}", request=request)
+        response = await node.transport.handle_async_request(request)
+        self.latencies.append(time.perf_counter() - start)
+        return response
+
+
+class SimulatedNode:
+    def __init__(self, node_id: str, profile: NodeProfile, app=None):
+        self.id = node_id
+        self.profile = profile
+        if app is None:
+            app = _load_app(f"sim_app_{node_id}")
+            app.backend = MemoryBackend()
+        self.app = app
+        self.transport = httpx.ASGITransport(app=app.app)
+
+
+class Cluster:
+    """
+    Simulated storage nodes node-1 .. node-N. Node apps are kept when the
+    cluster is resized, so growing it only loads the new ones; reset()
+    gives every node an empty store.
+
+    Loading an app instance costs FastAPI some 20 ms of route set-up. With
+    isolated=False all nodes share one instance instead: stores stay
+    separate (the server keys them by receiver id, which is the node id)
+    but quotas, long-polls and /metrics are shared.
+    """
+
+    def __init__(self, profiles: Sequence[NodeProfile] = (), seed: int = 1, isolated: bool = True):
+        self.nodes: Dict[str, SimulatedNode] = {}
+        self._pool: List[SimulatedNode] = []
+        self._shared = None
+        if not isolated:
+            self._shared = _load_app("sim_app_shared")
+            self._shared.backend = MemoryBackend()
+        self.transport = ClusterTransport(self, seed)
+        self.resize(profiles)
+
+    def resize(self, profiles: Sequence[NodeProfile]) -> None:
+        while len(self._pool) < len(profiles):
+            self._pool.append(SimulatedNode(f"node-{len(self._pool) + 1}", NodeProfile(),
+                                            self._shared))
+        self.nodes = {}
+        for node, profile in zip(self._pool, profiles):
+            node.profile = profile
+            self.nodes[node.id] = node
+
+    def reset(self) -> None:
+        for app in {id(node.app): node.app for node in self._pool}.values():
+            app.backend = MemoryBackend()
+        self.transport.latencies = []
+
+    @property
+    def neighbours(self) -> List[Neighbour]:
+        return [Neighbour(node_id, f"http://{node_id}:8000") for node_id in self.nodes]
+
+    def config(self, role: str, threshold: int, **kwargs) -> Config:
+        return Config(role, role, self.neighbours, threshold, **kwargs)
+
+    def orchestrator(self, role: str, threshold: int, data_dir, **kwargs) -> Orchestrator:
+        orch = Orchestrator(self.config(role, threshold, **kwargs), transport=self.transport)
+        orch.data_dir = Path(data_dir)
+        return orch
+
+    def stored(self, node_id: str) -> int:
+        """Entries stored for node_id."""
+        return len(self.nodes[node_id].app.backend.entries(node_id))
+
+
+def write_shares(directory, num_secrets: int, num_shares: int, size: int = SHARE_BYTES) -> List[str]:
+    """share_{idx}_{name} files of num_secrets secrets in directory; returns the secret names."""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    names = [f"key_{i}.txt" for i in range(1, num_secrets + 1)]
+    for name in names:
+        for idx in range(1, num_shares + 1):
+            (directory / f"share_{idx}_{name}").write_bytes(os.urandom(size))
+    return names
+
+
+def percentile(samples, q):
+    """Nearest-rank percentile of samples (0 < q <= 100)."""
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    rank = max(1, -(-q * len(ordered) // 100))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+async def scenario(cluster: Cluster, num_shares_total: int, threshold: int, num_shares: int,
+                   work_dir, ready_timeout: float = 1.0, replication: int = 1) -> Dict:
+    """
+    Distribute num_shares_total share files and collect them back; returns
+    phase times, share throughput, request latency percentiles and the
+    number of secrets Bob got threshold shares of.
+    """
+    cluster.reset()
+    work_dir = Path(work_dir)
+    secrets = write_shares(work_dir / 'alice', max(1, num_shares_total // num_shares), num_shares)
+    total = len(secrets) * num_shares
+    common = dict(ready_timeout=ready_timeout, replication=replication, num_shares=num_shares)
+    alice = cluster.orchestrator('alice', threshold, work_dir, **common)
+    bob = cluster.orchestrator('bob', threshold, work_dir, secrets=secrets, **common)
+
+    start = time.perf_counter()
+    await alice.distribute_files(wait_ready=True)
+    distribute = time.perf_counter() - start
+    post_latencies, cluster.transport.latencies = cluster.transport.latencies, []
+
+    start = time.perf_counter()
+    collected = await bob.collect_files()
+    collect = time.perf_counter() - start
+    get_latencies = cluster.transport.latencies
+    await alice.client.aclose()
+    await bob.client.aclose()
+
+    indices = {}
+    for name in collected:
+        parts = name.split('_', 2)
+        if len(parts) == 3 and parts[0] == 'share':
+            indices.setdefault(parts[2], set()).add(parts[1])
+    result = {'distribute': distribute, 'collect': collect, 'shares': total,
+              'distribute_rate': total / distribute, 'collect_rate': total / collect,
+              'recovered': sum(len(v) >= threshold for v in indices.values()),
+              'secrets': len(secrets)}
+    for q in PERCENTILES:
+        result[f'post_p{q}'] = percentile(post_latencies, q)
+        result[f'get_p{q}'] = percentile(get_latencies, q)
+    return result
+
+
+async def sweep(node_counts, share_counts, args) -> List:
+    """(repeat, node count, share count, result) for every point of the sweep."""
+    cluster = Cluster(seed=args.seed, isolated=not args.shared_app)
+    rows = []
+    for nodes in node_counts:
+        profiles = topology(nodes, latency=args.latency, jitter=args.jitter,
+                            fail_rate=args.fail_rate, slow=args.slow,
+                            slow_latency=args.slow_latency, down=args.down, seed=args.seed)
+        start = time.perf_counter()
+        cluster.resize(profiles)
+        print(f"{nodes} nodes ready in {time.perf_counter() - start:.2f} s", file=sys.stderr)
+        for shares in share_counts:
+            for repeat in range(1, args.repeats + 1):
+                with tempfile.TemporaryDirectory() as work_dir:
+                    result = await scenario(cluster, shares, args.threshold, args.num_shares,
+                                            work_dir, args.ready_timeout, args.replication)
+                rows.append((repeat, nodes, shares, result))
+    return rows
+
+
+def print_summary(rows, out=sys.stderr):
+    print(f"{'nodes':>6} {'shares':>7} {'post s':>8} {'post/s':>9} {'get s':>8} {'get/s':>9}"
+          + ''.join(f" {f'post p{q} ms':>12}" for q in PERCENTILES)
+          + ''.join(f" {f'get p{q} ms':>11}" for q in PERCENTILES) + f" {'recovered':>11}", file=out)
+    for _, nodes, shares, r in rows:
+        print(f"{nodes:>6} {r['shares']:>7} {r['distribute']:>8.3f} {r['distribute_rate']:>9.0f}"
+              f" {r['collect']:>8.3f} {r['collect_rate']:>9.0f}"
+              + ''.join(f" {r[f'post_p{q}'] * 1e3:>12.2f}" for q in PERCENTILES)
+              + ''.join(f" {r[f'get_p{q}'] * 1e3:>11.2f}" for q in PERCENTILES)
+              + f" {r['recovered']:>5}/{r['secrets']:<5}", file=out)
+
+
+def _ints(list_arg):
+    return [int(v) for v in list_arg.split(',') if v]
+
+
+if __name__ == '__main__':
+    p = argparse.ArgumentParser(description="Scaling tests against an in-process virtual cluster")
+    p.add_argument('--nodes', type=_ints, default=[100, 300, 1000], help='Node counts to sweep')
+    p.add_argument('--shares', type=_ints, default=[1000, 10000], help='Share counts to sweep')
+    p.add_argument('--threshold', type=int, default=3)
+    p.add_argument('--num-shares', type=int, default=5, help='Shares per secret')
+    p.add_argument('--replication', type=int, default=1)
+    p.add_argument('--repeats', type=int, default=1)
+    p.add_argument('--latency', type=float, default=0.0, help='Seconds added to every request')
+    p.add_argument('--jitter', type=float, default=0.0, help='Up to this many seconds more')
+    p.add_argument('--fail-rate', type=float, default=0.0,
+                   help='Share of requests failing (uploads retry with backoff)')
+    p.add_argument('--slow', type=float, default=0.0, help='Fraction of slow nodes')
+    p.add_argument('--slow-latency', type=float, default=0.05, help='Extra seconds on slow nodes')
+    p.add_argument('--down', type=float, default=0.0, help='Fraction of nodes that are down')
+    p.add_argument('--ready-timeout', type=float, default=1.0,
+                   help='Seconds Alice waits for a node before skipping it')
+    p.add_argument('--seed', type=int, default=1)
+    p.add_argument('--shared-app', action='store_true',
+                   help='One storage app instance for all nodes (fast set-up)')
+    p.add_argument('--out', default=None, help='CSV file to write (default: stdout)')
+    p.add_argument('--verbose', action='store_true', help='Keep the orchestrator\'s own logs')
+    args = p.parse_args()
+
+    if not args.verbose:
+        # Down nodes are expected: their errors would drown the summary
+        logging.getLogger('orchestrator').setLevel(logging.CRITICAL)
+        logging.getLogger('httpx').setLevel(logging.WARNING)
+    rows = asyncio.run(sweep(args.nodes, args.shares, args))
+    out = open(args.out, 'w', newline='') if args.out else sys.stdout
+    writer = csv.writer(out)
+    writer.writerow(['experiment', 'metric', 'seconds'])
+    for repeat, nodes, shares, r in rows:
+        for phase in ('distribute', 'collect'):
+            writer.writerow([repeat, f"{phase}_n{nodes}_s{shares}", f"{r[phase]:.9f}"])
+    if args.out:
+        out.close()
+    print_summary(rows)
@@ -1,8 +1,219 @@
 # storage_server/app.py
-from fastapi import FastAPI, HTTPException
-app = FastAPI()
-# in-memory store: receiver_id -> list of {'from', 'filename', 'content'}
-store = {}
+import asyncio
+import base64
+import binascii
+import contextvars
+import json
+import logging
+import struct
+import tempfile
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from urllib.parse import quote, unquote
+from typing import Dict, Set
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from storage import backend_from_env, QuotaExceeded
+from deltas import decode_record
+from metrics import (Registry, SIZE_BUCKETS, format_traceparent, new_span_id,
+                     parse_traceparent)
+
+# share store: receiver_id -> entries; backend chosen by STORAGE_BACKEND (see storage.py)
+backend = backend_from_env()
+
+# Raw uploads larger than this are spooled to disk before they are stored
+SPOOL_BYTES = 1 << 20
+CHUNK_SIZE = 1 << 16
+# Largest body accepted by POST /files:batch
+BATCH_MAX_BYTES = 16 << 20
+# Batch frame: filename length u16, content length u32, filename, content
+_FRAME = struct.Struct('<HI')
+# Change feed paging: entries per page, content bytes per page, longest long-poll
+FEED_LIMIT = 1000
+FEED_MAX_BYTES = 8 << 20
+MAX_WAIT = 30.0
+
+# receiver_id -> futures of the long-polls waiting for its next append
+_waiters: Dict[str, Set[asyncio.Future]] = {}
+
+# Traced uploads remembered so that their downloads can link back to them
+TRACE_ENTRIES = 100_000
+# (receiver_id, seq) -> traceparent of the request that stored the entry
+_traces: "OrderedDict[tuple, str]" = OrderedDict()
+# traceparent of the request being handled, if it carried one
+_trace: contextvars.ContextVar = contextvars.ContextVar('trace', default=None)
+
+trace_logger = logging.getLogger("storage_server.trace")
+
+# ---- metrics, served in the Prometheus text format on GET /metrics ----
+registry = Registry()
+REQUESTS = registry.counter('storage_requests_total', 'Requests handled',
+                            ('handler', 'status'))
+LATENCY = registry.histogram('storage_request_seconds',
+                             'Time from request to the end of the response', ('handler',))
+BYTES_IN = registry.histogram('storage_request_bytes', 'Request body sizes', ('handler',),
+                              buckets=SIZE_BUCKETS)
+BYTES_OUT = registry.histogram('storage_response_bytes', 'Response body sizes', ('handler',),
+                               buckets=SIZE_BUCKETS)
+IN_FLIGHT = registry.gauge('storage_in_flight_requests', 'Requests being handled')
+STORE_QUEUE = registry.gauge('storage_store_in_flight',
+                             'Uploads handed to the backend and not yet stored')
+registry.gauge('storage_store_bytes', 'Bytes stored',
+               collect=lambda: {(): backend.stats()['bytes']})
+registry.gauge('storage_store_entries', 'Entries stored',
+               collect=lambda: {(): backend.stats()['entries']})
+registry.gauge('storage_store_receivers', 'Receivers with stored entries',
+               collect=lambda: {(): backend.stats()['receivers']})
+registry.gauge('storage_long_polls', 'Change feed requests waiting for an append',
+               collect=lambda: {(): sum(len(w) for w in _waiters.values())})
+
+
+def _notify(receiver_id: str):
+    for waiter in _waiters.pop(receiver_id, ()):
+        if not waiter.done():
+            waiter.set_result(None)
+
+
+async def _poll(receiver_id: str, since: int, wait: float, limit: int):
+    """Entries after since; if there are none yet, wait up to wait seconds for one."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + min(max(wait, 0.0), MAX_WAIT)
+    while True:
+        # entries() also expires old entries, which can write tombstones
+        entries = await asyncio.to_thread(backend.entries, receiver_id, since, limit)
+        remaining = deadline - loop.time()
+        if entries or remaining <= 0:
+            return entries
+        waiter = loop.create_future()
+        _waiters.setdefault(receiver_id, set()).add(waiter)
+        try:
+            await asyncio.wait_for(waiter, remaining)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            waiters = _waiters.get(receiver_id)
+            if waiters is not None:
+                waiters.discard(waiter)
+                if not waiters:
+                    del _waiters[receiver_id]
+
+
+async def _flush_periodically():
+    # fsync batching: make sure a quiet server does not sit on unsynced writes
+    interval = getattr(backend, 'fsync_interval', 0) or 1.0
+    while True:
+        await asyncio.sleep(interval)
+        await asyncio.to_thread(backend.flush)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    flusher = asyncio.create_task(_flush_periodically())
+    yield
+    flusher.cancel()
+    backend.close()
+
+app = FastAPI(lifespan=lifespan)
+
+
+class Instrumentation:
+    """
+    ASGI middleware recording count, latency and body sizes per handler.
+    A request carrying a traceparent header is handled as a child span: the
+    response carries the server's traceparent, and the span is logged on
+    the storage_server.trace logger.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        size_in = size_out = 0
+        status = 500
+        parent = parse_traceparent(dict(scope['headers']).get(b'traceparent', b'').decode('latin-1'))
+        span = parent and new_span_id()
+        token = _trace.set(parent and format_traceparent(parent[0], span))
+
+        async def counted_receive():
+            nonlocal size_in
+            message = await receive()
+            if message['type'] == 'http.request':
+                size_in += len(message.get('body', b''))
+            return message
+
+        async def counted_send(message):
+            nonlocal size_out, status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+                if span:
+                    headers = list(message.get('headers', []))
+                    headers.append((b'traceparent', _trace.get().encode()))
+                    message = {**message, 'headers': headers}
+            elif message['type'] == 'http.response.body':
+                size_out += len(message.get('body', b''))
+            await send(message)
+
+        IN_FLIGHT.inc()
+        try:
+            await self.app(scope, counted_receive, counted_send)
+        finally:
+            IN_FLIGHT.dec()
+            _trace.reset(token)
+            elapsed = time.perf_counter() - start
+            # The router leaves the matched endpoint in the scope
+            handler = getattr(scope.get('endpoint'), '__name__', 'unmatched')
+            REQUESTS.inc(handler=handler, status=status)
+            LATENCY.observe(elapsed, handler=handler)
+            BYTES_IN.observe(size_in, handler=handler)
+            BYTES_OUT.observe(size_out, handler=handler)
+            if span:
+                trace_logger.info(f"trace={parent[0]} span={span} parent={parent[1]} "
+                                  f"{handler} {status} {elapsed * 1e3:.2f}ms")
+
+
+app.add_middleware(Instrumentation)
+
+
+def _remember_trace(receiver_id: str, seqs):
+    traceparent = _trace.get()
+    if traceparent is None:
+        return
+    for seq in seqs:
+        _traces[(receiver_id, seq)] = traceparent
+    while len(_traces) > TRACE_ENTRIES:
+        _traces.popitem(last=False)
+
+
+async def _store(func, *args):
+    # Backend writes run in worker threads; STORE_QUEUE counts the ones pending
+    STORE_QUEUE.inc()
+    try:
+        return await asyncio.to_thread(func, *args)
+    finally:
+        STORE_QUEUE.dec()
+
+
+@app.get("/healthz")
+async def healthz():
+    """Readiness and load. 503 while the store cannot take uploads (quota full, no eviction)."""
+    stats = backend.stats()
+    quota = backend.quota_bytes
+    ready = not (quota and not backend.evict and stats['bytes'] >= quota)
+    body = {'ready': ready, 'backend': type(backend).__name__, **stats,
+            'quota_bytes': quota, 'long_polls': sum(len(w) for w in _waiters.values())}
+    return JSONResponse(body, status_code=200 if ready else 503)
+
+
+@app.get("/metrics")
+async def metrics():
+    """Counters, gauges and histograms in the Prometheus text format."""
+    return PlainTextResponse(registry.render(), media_type='text/plain; version=0.0.4')
+
 
 @app.post("/files")
 async def receive_file(payload: dict):
@@ -12,11 +223,260 @@ async def receive_file(payload: dict):
     content = payload.get('content')
     if to is None or frm is None or fname is None or content is None:
         raise HTTPException(status_code=400, detail="Missing field in payload")
-    store.setdefault(to, []).append({'from': frm, 'filename': fname, 'content': content})
+    try:
+        data = base64.b64decode(content, validate=True)
+    except (binascii.Error, ValueError):
+        raise HTTPException(status_code=400, detail="content is not valid base64")
+    try:
+        entry = await _store(backend.append, to, frm, fname, data)
+    except QuotaExceeded as e:
+        raise HTTPException(status_code=507, detail=str(e))
+    _remember_trace(to, [entry.seq])
+    _notify(to)
     return {'ok': True}
 
+
 @app.get("/files/{receiver_id}")
-async def get_files(receiver_id: str):
-    # Always return a list, even if empty
-    files = store.pop(receiver_id, [])
+async def get_files(receiver_id: str, since: int = 0, wait: float = 0.0,
+                    limit: int = Query(FEED_LIMIT, ge=1, le=FEED_LIMIT)):
+    """
+    Change feed: entries with seq > since, oldest first, with base64 content.
+    Always a list, possibly empty after waiting up to wait seconds. Pages stop
+    at limit entries or about FEED_MAX_BYTES of content; X-Next-Since is the
+    cursor for the next page. Nothing is removed until it is acknowledged
+    through POST /files/{receiver_id}/ack.
+
+    The page's contents are read up front, under the backend lock: an ack,
+    eviction or compaction racing with a lazy read could cut the stream
+    mid-body. Entries removed since the poll are left out.
+    """
+    entries = await _poll(receiver_id, since, wait, limit)
+    page, size = [], 0
+    for entry in entries:
+        if page and size + entry.size > FEED_MAX_BYTES:
+            break
+        page.append(entry)
+        size += entry.size
+
+    contents = await asyncio.to_thread(backend.read_live, receiver_id, page)
+
+    def body():
+        yield b'['
+        for i, (entry, content) in enumerate(contents):
+            meta = json.dumps({'seq': entry.seq, 'from': entry.sender, 'filename': entry.filename})
+            yield (',' if i else '').encode() + meta[:-1].encode() + b', "content": "'
+            # multiples of 3 bytes keep the base64 chunks concatenable
+            view = memoryview(content)
+            for start in range(0, len(view), 3 << 15):
+                yield base64.b64encode(view[start:start + (3 << 15)])
+            yield b'"}'
+        yield b']'
+
+    next_since = page[-1].seq if page else since
+    return StreamingResponse(body(), media_type='application/json',
+                             headers={'X-Next-Since': str(next_since)})
+
+
+@app.post("/files/{receiver_id}/ack")
+async def ack_files(receiver_id: str, payload: dict):
+    """Delete acknowledged entries: {"upto": seq} and/or {"seqs": [...]}."""
+    upto, seqs = payload.get('upto'), payload.get('seqs')
+    if upto is None and seqs is None:
+        raise HTTPException(status_code=400, detail="Need upto or seqs")
+    try:
+        upto = None if upto is None else int(upto)
+        seqs = None if seqs is None else [int(s) for s in seqs]
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="upto and seqs must be integers")
+    return {'ok': True, 'deleted': await _store(backend.delete, receiver_id, seqs, upto)}
+
+
+# ---- raw application/octet-stream endpoints; metadata travels in path and headers ----
+
+def _decode_batch(body: bytes):
+    files, off = [], 0
+    while off < len(body):
+        if off + _FRAME.size > len(body):
+            raise ValueError("truncated frame header")
+        name_len, size = _FRAME.unpack_from(body, off)
+        off += _FRAME.size
+        if off + name_len + size > len(body):
+            raise ValueError("truncated frame")
+        name = body[off:off + name_len].decode('utf-8')
+        off += name_len
+        files.append((name, body[off:off + size]))
+        off += size
     return files
+
+
+def _append_batch(receiver_id, frm, files):
+    return [backend.append(receiver_id, frm, name, data).seq for name, data in files]
+
+
+@app.post("/files:batch")
+async def put_batch(request: Request):
+    frm, to = request.headers.get('x-from'), request.headers.get('x-to')
+    if frm is None or to is None:
+        raise HTTPException(status_code=400, detail="Missing X-From or X-To header")
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > BATCH_MAX_BYTES:
+            raise HTTPException(status_code=413, detail=f"Batch larger than {BATCH_MAX_BYTES} bytes")
+    try:
+        files = _decode_batch(bytes(body))
+    except (ValueError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=400, detail=f"Malformed batch: {e}")
+    try:
+        seqs = await _store(_append_batch, unquote(to), unquote(frm), files)
+    except QuotaExceeded as e:
+        raise HTTPException(status_code=507, detail=str(e))
+    _remember_trace(unquote(to), seqs)
+    _notify(unquote(to))
+    return {'ok': True, 'seqs': seqs}
+
+
+def _refreshed(content: bytes, delta, modulus: int, group: int) -> bytes:
+    """
+    A stored share with delta added, or stored commitments multiplied by
+    delta's factors. A commit_ file starts with a "field <hex>" line, which
+    must name the record's modulus.
+    """
+    text = content.decode('ascii')
+    if isinstance(delta, int):
+        return format((int(text.strip(), 16) + delta) % modulus, 'x').encode()
+    head, *lines = text.split('\n')
+    field = head.split()
+    if len(field) != 2 or field[0] != 'field' or int(field[1], 16) != modulus:
+        raise ValueError("commitments are not for the record's field")
+    old = [int(line, 16) for line in lines if line.strip()]
+    if len(old) != len(delta):
+        raise ValueError("commitment count does not match")
+    return '\n'.join([head] + [format(c * f % group, 'x') for c, f in zip(old, delta)]).encode()
+
+
+def _apply_deltas(receiver_id: str, record_id: bytes, modulus: int, group: int,
+                  deltas: Dict[str, object]):
+    """
+    Apply each delta to the latest stored file of that name: the refreshed
+    share (or commit_ file) is appended tagged with record_id, then the old
+    entry deleted. Names that already have an entry tagged with record_id
+    are skipped (and an old entry left by an interrupted delete removed), so
+    a retried record is only resumed where it stopped, also after a restart.
+    Returns (number applied, names that were not found or did not parse).
+    """
+    with backend.lock:
+        latest, done = {}, set()
+        for entry in backend.entries(receiver_id):
+            if entry.filename not in deltas:
+                continue
+            if entry.tag == record_id:
+                done.add(entry.filename)
+                stale = latest.pop(entry.filename, None)
+                if stale is not None:
+                    backend.delete(receiver_id, seqs=[stale.seq])
+            elif entry.filename not in done:
+                latest[entry.filename] = entry
+        applied = 0
+        for name, entry in latest.items():
+            try:
+                content = _refreshed(backend.read(receiver_id, entry), deltas[name], modulus, group)
+            except (UnicodeDecodeError, ValueError):
+                continue
+            backend.append(receiver_id, entry.sender, name, content, tag=record_id)
+            backend.delete(receiver_id, seqs=[entry.seq])
+            done.add(name)
+            applied += 1
+    return applied, sorted(name for name in deltas if name not in done)
+
+
+@app.post("/files/{receiver_id}/refresh")
+async def refresh_shares(receiver_id: str, request: Request):
+    """
+    Apply a delta record (proactive share refresh) to the shares stored for
+    receiver_id, without ever seeing a secret. The refreshed entries carry
+    the record id, so a record that was already applied is only resumed
+    where it stopped, also after a server restart.
+    """
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > BATCH_MAX_BYTES:
+            raise HTTPException(status_code=413, detail=f"Record larger than {BATCH_MAX_BYTES} bytes")
+    try:
+        record_id, modulus, group, deltas = decode_record(bytes(body))
+    except (ValueError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=400, detail=f"Malformed delta record: {e}")
+    try:
+        applied, missing = await _store(_apply_deltas, receiver_id, record_id, modulus, group, deltas)
+    except QuotaExceeded as e:
+        raise HTTPException(status_code=507, detail=str(e))
+    _notify(receiver_id)
+    return {'ok': True, 'applied': applied, 'missing': missing}
+
+
+@app.put("/files/{receiver_id}/{filename}")
+async def put_file(receiver_id: str, filename: str, request: Request):
+    frm = request.headers.get('x-from')
+    if frm is None:
+        raise HTTPException(status_code=400, detail="Missing X-From header")
+    frm = unquote(frm)
+    size = 0
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES) as spool:
+        async for chunk in request.stream():
+            spool.write(chunk)
+            size += len(chunk)
+        spool.seek(0)
+        try:
+            entry = await _store(backend.append_file, receiver_id, frm, filename, spool, size)
+        except QuotaExceeded as e:
+            raise HTTPException(status_code=507, detail=str(e))
+    _remember_trace(receiver_id, [entry.seq])
+    _notify(receiver_id)
+    return {'ok': True, 'seq': entry.seq, 'size': size}
+
+
+@app.get("/files/{receiver_id}/index")
+async def list_files(receiver_id: str, since: int = 0, wait: float = 0.0,
+                     limit: int = Query(FEED_LIMIT, ge=1, le=FEED_LIMIT)):
+    """Metadata-only change feed, paged and long-polled like GET /files/{receiver_id}."""
+    entries = await _poll(receiver_id, since, wait, limit)
+    return [{'seq': e.seq, 'from': e.sender, 'filename': e.filename, 'size': e.size}
+            for e in entries]
+
+
+async def _find(receiver_id: str, seq: int):
+    entry = await asyncio.to_thread(backend.get, receiver_id, seq)
+    if entry is not None:
+        return entry
+    raise HTTPException(status_code=404, detail=f"No entry {seq} for {receiver_id}")
+
+
+@app.get("/files/{receiver_id}/{seq}")
+async def get_file(receiver_id: str, seq: int):
+    """
+    One stored file. Like the change feed, its content is read under the
+    backend lock before the response starts: a delete, eviction or
+    compaction racing with a lazy read would cut the body short of the
+    Content-Length already sent.
+    """
+    entry = await _find(receiver_id, seq)
+    live = await asyncio.to_thread(backend.read_live, receiver_id, [entry])
+    if not live:
+        raise HTTPException(status_code=404, detail=f"No entry {seq} for {receiver_id}")
+    content = memoryview(live[0][1])
+    headers = {'X-From': quote(entry.sender), 'X-Filename': quote(entry.filename),
+               'X-Seq': str(entry.seq), 'Content-Length': str(entry.size)}
+    uploaded = _traces.get((receiver_id, seq))
+    if uploaded is not None:
+        # Lets the downloader link its span to the upload's trace
+        headers['X-Upload-Traceparent'] = uploaded
+    chunks = (content[start:start + CHUNK_SIZE] for start in range(0, len(content), CHUNK_SIZE))
+    return StreamingResponse(chunks, media_type='application/octet-stream', headers=headers)
+
+
+@app.delete("/files/{receiver_id}/{seq}")
+async def delete_file(receiver_id: str, seq: int):
+    await _find(receiver_id, seq)
+    await _store(backend.delete, receiver_id, [seq])
+    return {'ok': True}
@@ -0,0 +1,90 @@
+# storage_server/deltas.py
+"""
+Delta records of a proactive share refresh, as written by `sss refresh`
+(sss/src/logic/refresh.py). The storage server decodes them to apply the
+deltas; the orchestrator splits them into one record per server. Both use
+this module, so the layout is parsed in one place:
+    header      magic b"SSSD", version u8, value size u8, entry count u32,
+                record id (16 bytes)
+    modulus     value size bytes
+    group       group size u16, commitment group modulus (group size bytes)
+    entries     name length u16, factor count u8, file name (UTF-8), then
+                a share delta (value size bytes) if the factor count is 0,
+                else that many commitment factors (group size bytes each)
+All integers are little-endian.
+"""
+import struct
+from typing import Dict, List, Sequence, Tuple, Union
+
+MAGIC = b"SSSD"
+VERSION = 1
+HEADER = struct.Struct('<4sBBI16s')
+GROUP = struct.Struct('<H')
+ENTRY = struct.Struct('<HB')
+
+# A share delta, or the commitment factors of a commit_ file
+Delta = Union[int, List[int]]
+
+
+def split_record(record: bytes) -> Tuple[int, bytes, bytes, Dict[str, bytes]]:
+    """
+    (value size, record id, moduli, {file name: encoded entry}) of a delta
+    record. moduli holds the modulus and group section as encoded, and the
+    entries stay encoded, so they can be regrouped with encode_record().
+    Raises ValueError for a malformed record.
+    """
+    if len(record) < HEADER.size:
+        raise ValueError("truncated header")
+    magic, version, size, count, record_id = HEADER.unpack_from(record)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"not a version {VERSION} delta record")
+    off = HEADER.size + size
+    if off + GROUP.size > len(record):
+        raise ValueError("truncated header")
+    (group_size,) = GROUP.unpack_from(record, off)
+    off += GROUP.size + group_size
+    moduli = record[HEADER.size:off]
+    entries = {}
+    for _ in range(count):
+        if off + ENTRY.size > len(record):
+            raise ValueError("truncated entry")
+        name_len, factors = ENTRY.unpack_from(record, off)
+        start = off + ENTRY.size
+        end = start + name_len + (factors * group_size if factors else size)
+        if end > len(record):
+            raise ValueError("truncated entry")
+        entries[record[start:start + name_len].decode('utf-8')] = record[off:end]
+        off = end
+    if off != len(record):
+        raise ValueError("bad record length")
+    return size, record_id, moduli, entries
+
+
+def encode_record(size: int, record_id: bytes, moduli: bytes, entries: Sequence[bytes]) -> bytes:
+    """A delta record of encoded entries, with split_record()'s header fields."""
+    return HEADER.pack(MAGIC, VERSION, size, len(entries), record_id) + moduli + b''.join(entries)
+
+
+def decode_record(record: bytes) -> Tuple[bytes, int, int, Dict[str, Delta]]:
+    """
+    (record id, modulus, group modulus, {file name: delta}) of a delta
+    record. Raises ValueError for a malformed record.
+    """
+    size, record_id, moduli, entries = split_record(record)
+    modulus = int.from_bytes(moduli[:size], 'little')
+    group_size = len(moduli) - size - GROUP.size
+    group = int.from_bytes(moduli[size + GROUP.size:], 'little')
+    if modulus < 2:
+        raise ValueError("bad modulus")
+    deltas: Dict[str, Delta] = {}
+    for name, raw in entries.items():
+        name_len, factors = ENTRY.unpack_from(raw)
+        body = raw[ENTRY.size + name_len:]
+        if not factors:
+            deltas[name] = int.from_bytes(body, 'little')
+            continue
+        if group < 2:
+            raise ValueError("bad group modulus")
+        deltas[name] = [int.from_bytes(body[i:i + group_size], 'little')
+                        for i in range(0, len(body), group_size)]
+    return record_id, modulus, group, deltas
@@ -0,0 +1,198 @@
+# storage_server/metrics.py
+"""
+Dependency-free metrics registry and W3C trace context helpers, shared by
+the storage server (exposed on GET /metrics) and the orchestrator (kept
+in-process and optionally written out after a run).
+
+Metrics are Prometheus counters, gauges and histograms with labels, and
+render() produces the Prometheus text exposition format (version 0.0.4).
+A gauge can also be computed when it is rendered, from a callable that
+returns {label values: value}. Updates are plain dict operations made from
+the event loop, without locks.
+
+Trace context follows the W3C traceparent header:
+    00-<32 hex trace id>-<16 hex parent span id>-<2 hex flags>
+"""
+import os
+import re
+from bisect import bisect_left
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+# Request latency buckets, in seconds
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Payload size buckets, in bytes: 64 B to 64 MiB in powers of 4
+SIZE_BUCKETS = tuple(float(64 << (2 * i)) for i in range(11))
+
+_TRACEPARENT = re.compile(r'^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$')
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def _number(value) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, doc: str, labels: Sequence[str] = ()):
+        self.name, self.doc, self.labels = name, doc, tuple(labels)
+        # Unlabelled metrics are exposed from the start, at 0
+        self.values: Dict[Tuple[str, ...], float] = {} if self.labels else {(): 0}
+
+    def _key(self, labels: Dict[str, object]) -> Tuple[str, ...]:
+        if len(labels) != len(self.labels):
+            raise ValueError(f"{self.name} takes labels {self.labels}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def _series(self, key, suffix='', extra=()):
+        pairs = list(zip(self.labels, key)) + list(extra)
+        if not pairs:
+            return self.name + suffix
+        return self.name + suffix + '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs) + '}'
+
+    def samples(self):
+        """(series, value) pairs in exposition order."""
+        return [(self._series(key), value) for key, value in sorted(self.values.items())]
+
+    def get(self, **labels) -> float:
+        return self.values.get(self._key(labels), 0)
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def __init__(self, name, doc, labels=(), collect: Optional[Callable[[], Dict]] = None):
+        super().__init__(name, doc, labels)
+        self.collect = collect
+
+    def set(self, value: float, **labels) -> None:
+        self.values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def samples(self):
+        if self.collect is not None:
+            self.values = {tuple(str(v) for v in key): value
+                           for key, value in self.collect().items()}
+        return super().samples()
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, doc, labels=(), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, doc, labels)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (last one is +Inf), sum, count]
+        self.values = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        series = self.values.get(key)
+        if series is None:
+            series = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def get(self, **labels) -> Tuple[float, int]:
+        """(sum, count) of the observations with these labels."""
+        series = self.values.get(self._key(labels))
+        return (series[1], series[2]) if series else (0.0, 0)
+
+    def quantile(self, q: float, **labels) -> float:
+        """Upper bound of the bucket holding quantile q (inf if above the last bucket)."""
+        series = self.values.get(self._key(labels))
+        if not series or not series[2]:
+            return 0.0
+        rank, seen = q * series[2], 0
+        for bound, count in zip(self.buckets + (float('inf'),), series[0]):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+    def samples(self):
+        out = []
+        for key, (counts, total, count) in sorted(self.values.items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float('inf'),), counts):
+                cumulative += n
+                out.append((self._series(key, '_bucket', [('le', _number(bound))]), cumulative))
+            out.append((self._series(key, '_sum'), total))
+            out.append((self._series(key, '_count'), count))
+        return out
+
+
+class Registry:
+    """A set of named metrics; counter()/gauge()/histogram() create or return one."""
+
+    def __init__(self):
+        self.metrics: Dict[str, _Metric] = {}
+
+    def _add(self, cls, name, doc, labels, **kwargs):
+        metric = self.metrics.get(name)
+        if metric is None:
+            metric = self.metrics[name] = cls(name, doc, labels, **kwargs)
+        elif not isinstance(metric, cls) or metric.labels != tuple(labels):
+            raise ValueError(f"Metric {name} already registered differently")
+        return metric
+
+    def counter(self, name: str, doc: str, labels: Sequence[str] = ()) -> Counter:
+        return self._add(Counter, name, doc, labels)
+
+    def gauge(self, name: str, doc: str, labels: Sequence[str] = (), collect=None) -> Gauge:
+        return self._add(Gauge, name, doc, labels, collect=collect)
+
+    def histogram(self, name: str, doc: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._add(Histogram, name, doc, labels, buckets=buckets)
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text format."""
+        lines = []
+        for name, metric in sorted(self.metrics.items()):
+            lines.append(f"# HELP {name} {_escape(metric.doc)}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            lines.extend(f"{series} {_number(value)}" for series, value in metric.samples())
+        return '\n'.join(lines) + '\n'
+
+
+# ---- trace context ----
+
+def new_trace_id() -> str:
+    return os.urandom(16).hex()
+
+
+def new_span_id() -> str:
+    return os.urandom(8).hex()
+
+
+def format_traceparent(trace_id: str, span_id: str, sampled: bool = True) -> str:
+    return f"00-{trace_id}-{span_id}-{'01' if sampled else '00'}"
+
+
+def parse_traceparent(header: Optional[str]) -> Optional[Tuple[str, str]]:
+    """(trace id, parent span id) of a traceparent header, or None if it is absent or invalid."""
+    match = _TRACEPARENT.match((header or '').strip().lower())
+    if match is None or set(match.group(1)) == {'0'} or set(match.group(2)) == {'0'}:
+        return None
+    return match.group(1), match.group(2)
@@ -0,0 +1,452 @@
+# storage_server/storage.py
+"""
+Pluggable share storage for the storage server.
+
+Every stored file is an Entry with a per-receiver sequence number. Both
+backends keep the entry index in memory; MemoryBackend also keeps the file
+contents in memory, SegmentBackend appends them to one segment file per
+receiver and reads them back with positioned reads, so RSS stays flat no
+matter how many shares are stored.
+
+Both backends enforce an optional byte quota (evicting the oldest entries
+or rejecting new ones) and an optional TTL. All entries are also kept in
+one creation-ordered index, so eviction and expiry take the oldest entries
+from its front instead of scanning every receiver.
+"""
+import io
+import os
+import struct
+import time
+import threading
+from bisect import bisect_right
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import BinaryIO, Dict, List, Optional, Tuple
+
+
+class QuotaExceeded(Exception):
+    """Raised when an entry does not fit and eviction is disabled."""
+
+
+@dataclass
+class Entry:
+    seq: int
+    sender: str
+    filename: str
+    size: int
+    created: float
+    offset: int = 0
+    # Opaque, e.g. the id of the delta record whose refresh wrote the entry
+    tag: bytes = b''
+
+
+class StorageBackend:
+    """
+    Base class holding the in-memory index, quota and TTL logic.
+    Subclasses store the contents (_write/_read_range/_drop).
+    """
+
+    def __init__(self, quota_bytes: int = 0, ttl: float = 0, evict: bool = True):
+        self.quota_bytes = quota_bytes
+        self.ttl = ttl
+        self.evict = evict
+        self.index: Dict[str, "OrderedDict[int, Entry]"] = {}
+        # (receiver, seq) -> entry for every receiver, oldest first
+        self._order: "OrderedDict[Tuple[str, int], Entry]" = OrderedDict()
+        # receiver -> ascending seqs for bisecting to a page start; may still
+        # hold removed seqs, and is rebuilt once most of it is removed ones
+        self._seqs: Dict[str, List[int]] = {}
+        self.last_seq: Dict[str, int] = {}
+        self.total_bytes = 0
+        self.lock = threading.RLock()
+
+    # -- content storage, implemented by subclasses --
+    def _write(self, receiver: str, entry: Entry, src: BinaryIO) -> None:
+        raise NotImplementedError
+
+    def _read_range(self, receiver: str, entry: Entry, start: int, size: int) -> bytes:
+        raise NotImplementedError
+
+    def _drop(self, receiver: str, entries: List[Entry]) -> None:
+        raise NotImplementedError
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.flush()
+
+    # -- public API --
+    def append(self, receiver: str, sender: str, filename: str, content: bytes,
+               tag: bytes = b'') -> Entry:
+        """Store one file for receiver; returns its Entry."""
+        return self.append_file(receiver, sender, filename, io.BytesIO(content), len(content), tag)
+
+    def append_file(self, receiver: str, sender: str, filename: str,
+                    src: BinaryIO, size: int, tag: bytes = b'') -> Entry:
+        """
+        Store size bytes read from src (e.g. a spooled upload) for receiver.
+        tag (at most 255 bytes) is stored with the entry in the same write.
+        """
+        with self.lock:
+            self._expire()
+            if self.quota_bytes:
+                if size > self.quota_bytes:
+                    raise QuotaExceeded(f"{size} bytes exceed the {self.quota_bytes} byte quota")
+                if self.total_bytes + size > self.quota_bytes:
+                    if not self.evict:
+                        raise QuotaExceeded(f"Storage quota of {self.quota_bytes} bytes reached")
+                    self._evict(self.total_bytes + size - self.quota_bytes)
+            seq = self.last_seq.get(receiver, 0) + 1
+            entry = Entry(seq=seq, sender=sender, filename=filename,
+                          size=size, created=time.time(), tag=tag)
+            self._write(receiver, entry, src)
+            self.last_seq[receiver] = seq
+            self.index.setdefault(receiver, OrderedDict())[seq] = entry
+            self._order[(receiver, seq)] = entry
+            self._seqs.setdefault(receiver, []).append(seq)
+            self.total_bytes += entry.size
+            return entry
+
+    def entries(self, receiver: str, since: int = 0, limit: Optional[int] = None) -> List[Entry]:
+        """Entries for receiver with seq > since, oldest first."""
+        with self.lock:
+            self._expire()
+            live = self.index.get(receiver, {})
+            seqs = self._seqs.get(receiver, [])
+            out = []
+            for i in range(bisect_right(seqs, since), len(seqs)):
+                entry = live.get(seqs[i])
+                if entry is not None:
+                    out.append(entry)
+                    if limit is not None and len(out) >= limit:
+                        break
+            return out
+
+    def get(self, receiver: str, seq: int) -> Optional[Entry]:
+        with self.lock:
+            self._expire()
+            return self.index.get(receiver, {}).get(seq)
+
+    def read(self, receiver: str, entry: Entry) -> bytes:
+        return self._read_range(receiver, entry, 0, entry.size)
+
+    def read_live(self, receiver: str, entries: List[Entry]) -> List[Tuple[Entry, bytes]]:
+        """
+        (entry, content) for those of entries still stored, read under the lock
+        so a concurrent delete, eviction or compaction cannot cut one short.
+        """
+        with self.lock:
+            live = self.index.get(receiver, {})
+            return [(e, self.read(receiver, e)) for e in entries if live.get(e.seq) is e]
+
+    def delete(self, receiver: str, seqs: Optional[List[int]] = None, upto: Optional[int] = None) -> int:
+        """Delete the given seqs and/or every seq <= upto; returns the count removed."""
+        with self.lock:
+            entries = self.index.get(receiver)
+            if not entries:
+                return 0
+            doomed = {}
+            if upto is not None:
+                # Seqs are in order: stop at the first one past upto
+                for seq, entry in entries.items():
+                    if seq > upto:
+                        break
+                    doomed[seq] = entry
+            for seq in seqs or ():
+                if seq in entries:
+                    doomed[seq] = entries[seq]
+            doomed = list(doomed.values())
+            self._remove(receiver, doomed)
+            return len(doomed)
+
+    def stats(self) -> Dict[str, int]:
+        with self.lock:
+            return {'receivers': len(self.index),
+                    'entries': sum(len(v) for v in self.index.values()),
+                    'bytes': self.total_bytes}
+
+    # -- internals --
+    def _remove(self, receiver: str, doomed: List[Entry]) -> None:
+        if not doomed:
+            return
+        entries = self.index[receiver]
+        for entry in doomed:
+            del entries[entry.seq]
+            del self._order[(receiver, entry.seq)]
+            self.total_bytes -= entry.size
+        if not entries:
+            del self.index[receiver]
+            self._seqs.pop(receiver, None)
+        elif len(self._seqs[receiver]) > 2 * len(entries) + 64:
+            self._seqs[receiver] = list(entries)
+        self._drop(receiver, doomed)
+
+    def _expire(self) -> None:
+        if not self.ttl or not self._order:
+            return
+        cutoff = time.time() - self.ttl
+        doomed: Dict[str, List[Entry]] = {}
+        for (receiver, _), entry in self._order.items():
+            if entry.created >= cutoff:
+                break
+            doomed.setdefault(receiver, []).append(entry)
+        for receiver, entries in doomed.items():
+            self._remove(receiver, entries)
+
+    def _evict(self, needed: int) -> None:
+        # Oldest first across all receivers
+        doomed: Dict[str, List[Entry]] = {}
+        freed = 0
+        for (receiver, _), entry in self._order.items():
+            if freed >= needed:
+                break
+            doomed.setdefault(receiver, []).append(entry)
+            freed += entry.size
+        for receiver, entries in doomed.items():
+            self._remove(receiver, entries)
+
+    def _rebuild_order(self) -> None:
+        """Creation-ordered and per-receiver seq indexes of entries loaded from disk."""
+        loaded = [((r, seq), e) for r, es in self.index.items() for seq, e in es.items()]
+        loaded.sort(key=lambda item: item[1].created)
+        self._order = OrderedDict(loaded)
+        self._seqs = {r: list(es) for r, es in self.index.items()}
+
+
+class MemoryBackend(StorageBackend):
+    """Keeps contents in process memory (lost on restart)."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._data: Dict[Tuple[str, int], bytes] = {}
+
+    def _write(self, receiver, entry, src):
+        self._data[(receiver, entry.seq)] = src.read(entry.size)
+
+    def _read_range(self, receiver, entry, start, size):
+        return self._data[(receiver, entry.seq)][start:start + size]
+
+    def _drop(self, receiver, entries):
+        for entry in entries:
+            self._data.pop((receiver, entry.seq), None)
+
+
+# Segment record: kind u8, seq u64, created f64, sender len u16,
+# filename len u16, content len u32; followed by sender, filename, content.
+# kind 1 is a tombstone whose seq is the deleted entry; kind 2 is an entry
+# with a tag, whose content starts with the tag length u8 and the tag.
+_RECORD = struct.Struct('<BQdHHI')
+_DATA, _TOMBSTONE, _TAGGED = 0, 1, 2
+
+
+class SegmentBackend(StorageBackend):
+    """
+    Appends contents to one segment file per receiver and keeps only offsets
+    in memory. Writes are fsynced in batches (every fsync_batch records or
+    fsync_interval seconds, whichever comes first); the index is rebuilt by
+    replaying the segments on start-up. A segment is truncated once all of
+    its entries are deleted and compacted once most of it is dead.
+    """
+
+    def __init__(self, root: str, fsync_batch: int = 64, fsync_interval: float = 0.05, **kwargs):
+        super().__init__(**kwargs)
+        self.root = root
+        self.fsync_batch = fsync_batch
+        self.fsync_interval = fsync_interval
+        self._files: Dict[str, BinaryIO] = {}
+        self._dead_bytes: Dict[str, int] = {}
+        self._live_bytes: Dict[str, int] = {}
+        self._pending = 0
+        self._last_sync = time.monotonic()
+        os.makedirs(root, exist_ok=True)
+        self._replay()
+        self._rebuild_order()
+
+    def _path(self, receiver: str) -> str:
+        # Hex keeps arbitrary receiver ids safe and reversible as file names
+        return os.path.join(self.root, receiver.encode().hex() + '.seg')
+
+    def _file(self, receiver: str) -> BinaryIO:
+        f = self._files.get(receiver)
+        if f is None:
+            f = open(self._path(receiver), 'a+b')
+            self._files[receiver] = f
+        return f
+
+    def _replay(self) -> None:
+        for name in sorted(os.listdir(self.root)):
+            if not name.endswith('.seg'):
+                continue
+            receiver = bytes.fromhex(name[:-4]).decode()
+            path = os.path.join(self.root, name)
+            size = os.path.getsize(path)
+            entries: "OrderedDict[int, Entry]" = OrderedDict()
+            last_seq, dead, pos = 0, 0, 0
+            with open(path, 'rb') as f:
+                while pos + _RECORD.size <= size:
+                    kind, seq, created, slen, flen, clen = _RECORD.unpack(f.read(_RECORD.size))
+                    start = pos + _RECORD.size + slen + flen
+                    if start + clen > size:
+                        break  # torn write at the tail
+                    meta = f.read(slen + flen)
+                    tag = b''
+                    if kind == _TAGGED and clen:
+                        tag = f.read(f.read(1)[0])
+                        start += 1 + len(tag)
+                        clen -= 1 + len(tag)
+                    f.seek(clen, os.SEEK_CUR)
+                    pos = start + clen
+                    last_seq = max(last_seq, seq)
+                    if kind == _TOMBSTONE:
+                        old = entries.pop(seq, None)
+                        dead += _RECORD.size + (old.size if old else 0)
+                        continue
+                    entries[seq] = Entry(seq=seq, sender=meta[:slen].decode(),
+                                         filename=meta[slen:].decode(),
+                                         size=clen, created=created, offset=start, tag=tag)
+            if pos < size:
+                os.truncate(path, pos)
+            self.last_seq[receiver] = last_seq
+            self._dead_bytes[receiver] = dead
+            self._live_bytes[receiver] = sum(e.size for e in entries.values())
+            if entries:
+                self.index[receiver] = entries
+                self.total_bytes += self._live_bytes[receiver]
+
+    @staticmethod
+    def _write_record(f: BinaryIO, kind, seq, created, sender, filename,
+                      src: Optional[BinaryIO] = None, size: int = 0, tag: bytes = b'') -> int:
+        """Write one record at the end of f, copying size bytes from src; returns the content offset."""
+        f.seek(0, os.SEEK_END)
+        s, fn = sender.encode(), filename.encode()
+        prefix = bytes([len(tag)]) + tag if tag else b''
+        if tag:
+            kind = _TAGGED
+        offset = f.tell() + _RECORD.size + len(s) + len(fn) + len(prefix)
+        f.write(_RECORD.pack(kind, seq, created, len(s), len(fn), size + len(prefix))
+                + s + fn + prefix)
+        remaining = size
+        while remaining:
+            chunk = src.read(min(remaining, 1 << 16))
+            if not chunk:
+                raise IOError(f"Source ended {remaining} bytes short")
+            f.write(chunk)
+            remaining -= len(chunk)
+        return offset
+
+    def _append_record(self, receiver, kind, seq, created, sender, filename,
+                       src: Optional[BinaryIO] = None, size: int = 0, tag: bytes = b''):
+        return self._write_record(self._file(receiver), kind, seq, created, sender, filename,
+                                  src, size, tag)
+
+    def _mark_seq(self, receiver: str) -> None:
+        # A tombstone for the last seq keeps the counter monotonic across restarts
+        self._append_record(receiver, _TOMBSTONE, self.last_seq.get(receiver, 0), time.time(), '', '')
+
+    def _write(self, receiver, entry, src):
+        entry.offset = self._append_record(receiver, _DATA, entry.seq, entry.created,
+                                           entry.sender, entry.filename, src, entry.size,
+                                           entry.tag)
+        self._live_bytes[receiver] = self._live_bytes.get(receiver, 0) + entry.size
+        self._pending += 1
+        if (self._pending >= self.fsync_batch
+                or time.monotonic() - self._last_sync >= self.fsync_interval):
+            self.flush()
+
+    def _read_range(self, receiver, entry, start, size):
+        f = self._files.get(receiver)
+        if f is not None:
+            f.flush()
+            return os.pread(f.fileno(), size, entry.offset + start)
+        with open(self._path(receiver), 'rb') as g:
+            return os.pread(g.fileno(), size, entry.offset + start)
+
+    def _drop(self, receiver, entries):
+        if receiver not in self.index:
+            # Nothing live is left: reclaim the whole segment
+            f = self._files.pop(receiver, None)
+            if f is not None:
+                f.close()
+            os.truncate(self._path(receiver), 0)
+            self._mark_seq(receiver)
+            self._dead_bytes[receiver] = 0
+            self._live_bytes[receiver] = 0
+            return
+        for entry in entries:
+            self._append_record(receiver, _TOMBSTONE, entry.seq, time.time(), '', '')
+        self._dead_bytes[receiver] = self._dead_bytes.get(receiver, 0) + \
+            sum(e.size + _RECORD.size for e in entries)
+        self._live_bytes[receiver] -= sum(e.size for e in entries)
+        if self._dead_bytes[receiver] > max(self._live_bytes[receiver], 1 << 20):
+            self._compact(receiver)
+
+    def _compact(self, receiver: str) -> None:
+        """
+        Rewrite a segment with only its live entries, streamed record by
+        record into a new file that then replaces it; offsets in the index
+        change only once the new segment is complete and synced.
+        """
+        live = list(self.index[receiver].values())
+        f = self._files.pop(receiver, None)
+        if f is not None:
+            f.close()
+        path = self._path(receiver)
+        tmp = path + '.tmp'
+        try:
+            with open(path, 'rb') as src, open(tmp, 'wb') as dst:
+                offsets = []
+                for entry in live:
+                    src.seek(entry.offset)
+                    offsets.append(self._write_record(dst, _DATA, entry.seq, entry.created,
+                                                      entry.sender, entry.filename, src, entry.size,
+                                                      entry.tag))
+                last_seq = self.last_seq.get(receiver, 0)
+                if not live or live[-1].seq != last_seq:
+                    # Keeps the seq counter monotonic across restarts; a live
+                    # last entry already does (a tombstone would delete it)
+                    self._write_record(dst, _TOMBSTONE, last_seq, time.time(), '', '')
+                dst.flush()
+                os.fsync(dst.fileno())
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+        for entry, offset in zip(live, offsets):
+            entry.offset = offset
+        self._dead_bytes[receiver] = 0
+
+    def flush(self) -> None:
+        with self.lock:
+            for f in self._files.values():
+                f.flush()
+                os.fsync(f.fileno())
+            self._pending = 0
+            self._last_sync = time.monotonic()
+
+    def close(self) -> None:
+        self.flush()
+        for f in self._files.values():
+            f.close()
+        self._files.clear()
+
+
+def backend_from_env(env=os.environ) -> StorageBackend:
+    """
+    Build the backend selected by STORAGE_BACKEND (memory | segment) with
+    STORAGE_DIR, STORAGE_QUOTA_BYTES, STORAGE_TTL_SECONDS, STORAGE_EVICTION
+    (evict | reject), STORAGE_FSYNC_BATCH and STORAGE_FSYNC_INTERVAL.
+    """
+    common = dict(quota_bytes=int(env.get('STORAGE_QUOTA_BYTES', 0)),
+                  ttl=float(env.get('STORAGE_TTL_SECONDS', 0)),
+                  evict=env.get('STORAGE_EVICTION', 'evict') == 'evict')
+    kind = env.get('STORAGE_BACKEND', 'memory')
+    if kind == 'memory':
+        return MemoryBackend(**common)
+    if kind == 'segment':
+        return SegmentBackend(env.get('STORAGE_DIR', 'store'),
+                              fsync_batch=int(env.get('STORAGE_FSYNC_BATCH', 64)),
+                              fsync_interval=float(env.get('STORAGE_FSYNC_INTERVAL', 0.05)),
+                              **common)
+    raise ValueError(f"Unknown STORAGE_BACKEND {kind!r}")
@@ -86,3 +86,320 @@ def test_docker_build_and_run(project_root):
     assert run.returncode == 0, f"End-to-end failed: {full}"
     # Verify Bob reconstructed dummy shares
     assert "Reconstructed shares: {'server-1': b'dummy', 'server-2': b'dummy', 'server-3': b'dummy'}" in full
+
+
+def _storage_app():
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'storage_server'))
+    import app as storage_app
+    from storage import MemoryBackend
+    storage_app.backend = MemoryBackend()
+    return storage_app
+
+
+def test_distribute_and_collect_in_process(project_root, tmp_path):
+    import asyncio
+    import httpx
+
+    storage_app = _storage_app()
+    (tmp_path / 'alice').mkdir()
+    files = {f"share_{i}_key.txt": os.urandom(64) for i in range(1, 6)}
+    files['enc_big.bin'] = os.urandom(3 << 20)
+    for name, data in files.items():
+        (tmp_path / 'alice' / name).write_bytes(data)
+
+    async def run():
+        transport = httpx.ASGITransport(app=storage_app.app)
+        alice = Orchestrator(load_config(os.path.join(project_root, "config/examples/alice.yaml")))
+        bob = Orchestrator(load_config(os.path.join(project_root, "config/examples/bob.yaml")))
+        for orch in (alice, bob):
+            await orch.client.aclose()
+            orch.client = httpx.AsyncClient(transport=transport)
+            orch.data_dir = tmp_path
+        await alice.distribute_files()
+        await bob.collect_files()
+        for orch in (alice, bob):
+            await orch.client.aclose()
+
+    asyncio.run(run())
+    got = {p.name: p.read_bytes() for p in (tmp_path / 'bob').iterdir()}
+    assert got['enc_big.bin'] == files['enc_big.bin']
+    shares = [name for name in got if name.startswith('share_')]
+    assert len(shares) >= 3
+    assert all(got[name] == files[name] for name in shares)
+    # Every feed was read to the end: shares beyond the threshold go too
+    assert storage_app.backend.stats()['entries'] == 0
+
+
+def test_collect_rounds_do_not_mix_shares(project_root, tmp_path):
+    import asyncio
+    import httpx
+
+    storage_app = _storage_app()
+
+    async def round_trip(work_dir, files):
+        (work_dir / 'alice').mkdir(parents=True)
+        for name, data in files.items():
+            (work_dir / 'alice' / name).write_bytes(data)
+        transport = httpx.ASGITransport(app=storage_app.app)
+        alice = Orchestrator(load_config(os.path.join(project_root, "config/examples/alice.yaml")))
+        bob = Orchestrator(load_config(os.path.join(project_root, "config/examples/bob.yaml")))
+        for orch in (alice, bob):
+            await orch.client.aclose()
+            orch.client = httpx.AsyncClient(transport=transport)
+            orch.data_dir = work_dir
+        await alice.distribute_files()
+        await bob.collect_files()
+        for orch in (alice, bob):
+            await orch.client.aclose()
+        return {p.name: p.read_bytes() for p in (work_dir / 'bob').iterdir()}
+
+    # Two rounds reuse the share file names with new contents
+    for n in (1, 2):
+        files = {f"share_{i}_alice_raw_key.txt": os.urandom(64) for i in range(1, 6)}
+        got = asyncio.run(round_trip(tmp_path / f"round_{n}", files))
+        assert len(got) >= 3
+        assert all(files[name] == data for name, data in got.items())
+        # Nothing from this round is left for the next one to collect
+        assert storage_app.backend.stats()['entries'] == 0
+
+
+def test_collect_early_exit_with_stalled_server(project_root, tmp_path):
+    import asyncio
+    import httpx
+
+    storage_app = _storage_app()
+    (tmp_path / 'alice').mkdir()
+    files = {f"share_{i}_key.txt": os.urandom(64) for i in range(1, 6)}
+    for name, data in files.items():
+        (tmp_path / 'alice' / name).write_bytes(data)
+
+    class StallServer3(httpx.AsyncBaseTransport):
+        def __init__(self, inner):
+            self.inner = inner
+
+        async def handle_async_request(self, request):
+            if request.url.host == 'server-3':
+                await asyncio.sleep(30)
+            return await self.inner.handle_async_request(request)
+
+    async def run():
+        transport = httpx.ASGITransport(app=storage_app.app)
+        alice = Orchestrator(load_config(os.path.join(project_root, "config/examples/alice.yaml")))
+        bob = Orchestrator(load_config(os.path.join(project_root, "config/examples/bob.yaml")))
+        await alice.client.aclose()
+        alice.client = httpx.AsyncClient(transport=transport)
+        alice.data_dir = bob.data_dir = tmp_path
+        await alice.distribute_files()
+        await alice.client.aclose()
+
+        await bob.client.aclose()
+        bob.client = httpx.AsyncClient(transport=StallServer3(transport))
+        # Quorum only ends collection early when Bob knows what to collect
+        bob.collect_quorum, bob.hedge_after = 2, 0.05
+        bob.secrets, bob.num_shares = ['key.txt'], 5
+        start = time.monotonic()
+        await bob.collect_files()
+        elapsed = time.monotonic() - start
+        await bob.client.aclose()
+        return elapsed
+
+    # Round-robin placement leaves at most two of the five shares on server-3
+    assert asyncio.run(run()) < 5
+    got = {p.name: p.read_bytes() for p in (tmp_path / 'bob').iterdir()}
+    assert len(got) >= 3
+    assert all(files[name] == data for name, data in got.items())
+
+
+def test_collect_long_polls_while_alice_uploads(project_root, tmp_path):
+    import asyncio
+    import httpx
+
+    storage_app = _storage_app()
+    (tmp_path / 'alice').mkdir()
+    files = {f"share_{i}_key.txt": os.urandom(64) for i in range(1, 6)}
+    for name, data in files.items():
+        (tmp_path / 'alice' / name).write_bytes(data)
+
+    async def run():
+        transport = httpx.ASGITransport(app=storage_app.app)
+        alice = Orchestrator(load_config(os.path.join(project_root, "config/examples/alice.yaml")))
+        bob = Orchestrator(load_config(os.path.join(project_root, "config/examples/bob.yaml")))
+        for orch in (alice, bob):
+            await orch.client.aclose()
+            orch.client = httpx.AsyncClient(transport=transport)
+            orch.data_dir = tmp_path
+        bob.poll_wait = 2.0
+        # Bob starts first and waits on the servers' change feeds
+        collect = asyncio.create_task(bob.collect_files())
+        await asyncio.sleep(0.1)
+        await alice.distribute_files()
+        collected = await asyncio.wait_for(collect, 10)
+        for orch in (alice, bob):
+            await orch.client.aclose()
+        return collected
+
+    collected = asyncio.run(run())
+    assert len(collected) >= 3
+    assert all((tmp_path / 'bob' / name).read_bytes() == files[name] for name in collected)
+
+
+def test_distribute_waits_for_each_server_independently(project_root, tmp_path):
+    import asyncio
+    import httpx
+
+    storage_app = _storage_app()
+    (tmp_path / 'alice').mkdir()
+    for i in range(1, 7):
+        (tmp_path / 'alice' / f"share_{i}_key.txt").write_bytes(os.urandom(64))
+
+    class FlakyServers(httpx.AsyncBaseTransport):
+        """server-2 refuses its first probes, server-3 never comes up."""
+        def __init__(self, inner):
+            self.inner, self.refused = inner, 0
+
+        async def handle_async_request(self, request):
+            host = request.url.host
+            if host == 'server-3' or (host == 'server-2' and self.refused < 3):
+                self.refused += host == 'server-2'
+                raise httpx.ConnectError("connection refused", request=request)
+            return await self.inner.handle_async_request(request)
+
+    async def run():
+        alice = Orchestrator(load_config(os.path.join(project_root, "config/examples/alice.yaml")))
+        await alice.client.aclose()
+        alice.client = httpx.AsyncClient(transport=FlakyServers(httpx.ASGITransport(app=storage_app.app)))
+        alice.data_dir = tmp_path
+        alice.ready_timeout = 1.0
+        start = time.monotonic()
+        await alice.distribute_files(wait_ready=True)
+        await alice.client.aclose()
+        return time.monotonic() - start
+
+    assert asyncio.run(run()) < 3
+    held = {r: len(storage_app.backend.entries(r)) for r in ('server-1', 'server-2', 'server-3')}
+    assert held == {'server-1': 2, 'server-2': 2, 'server-3': 0}
+
+
+def test_collect_contacts_only_placement_holders(tmp_path):
+    import asyncio
+    import httpx
+    from config.config_loader import Config, Neighbour
+
+    storage_app = _storage_app()
+    neighbours = [Neighbour(f"server-{i}", f"http://server-{i}:8000") for i in range(1, 21)]
+    (tmp_path / 'alice').mkdir()
+    files = {f"share_{i}_key.txt": os.urandom(64) for i in range(1, 4)}
+    for name, data in files.items():
+        (tmp_path / 'alice' / name).write_bytes(data)
+
+    class Recording(httpx.AsyncBaseTransport):
+        def __init__(self, inner):
+            self.inner, self.hosts = inner, set()
+
+        async def handle_async_request(self, request):
+            self.hosts.add(request.url.host)
+            return await self.inner.handle_async_request(request)
+
+    async def run():
+        transport = httpx.ASGITransport(app=storage_app.app)
+        alice = Orchestrator(Config('alice', 'alice', neighbours, 2))
+        bob = Orchestrator(Config('bob', 'bob', neighbours, 2, num_shares=3, secrets=['key.txt']))
+        recording = Recording(transport)
+        for orch, t in ((alice, transport), (bob, recording)):
+            await orch.client.aclose()
+            orch.client = httpx.AsyncClient(transport=t)
+            orch.data_dir = tmp_path
+        await alice.distribute_files()
+        collected = await bob.collect_files()
+        for orch in (alice, bob):
+            await orch.client.aclose()
+        return collected, recording.hosts, bob.placement.holders(['key.txt'], 3)
+
+    collected, hosts, holders = asyncio.run(run())
+    assert len(holders) == 3 and hosts == set(holders)
+    assert len(collected) >= 2
+
+
+def test_orchestrator_metrics_and_trace_propagation(project_root, tmp_path, monkeypatch):
+    import asyncio
+    import httpx
+    from config.config_loader import Config, Neighbour
+
+    storage_app = _storage_app()
+    neighbours = [Neighbour(f"server-{i}", f"http://server-{i}:8000") for i in (1, 2)]
+    (tmp_path / 'alice').mkdir()
+    for i in range(1, 4):
+        (tmp_path / 'alice' / f"share_{i}_key.txt").write_bytes(os.urandom(64))
+    caller = '00-' + '12' * 16 + '-' + '34' * 8 + '-01'
+    monkeypatch.setenv('TRACEPARENT', caller)
+
+    async def run():
+        transport = httpx.ASGITransport(app=storage_app.app)
+        alice = Orchestrator(Config('alice', 'alice', neighbours, 2, trace=True,
+                                    metrics_path=str(tmp_path / 'alice.prom')), transport)
+        bob = Orchestrator(Config('bob', 'bob', neighbours, 2, trace=True), transport)
+        alice.data_dir = bob.data_dir = tmp_path
+        await alice.run()
+        await bob.collect_files()
+        await bob.client.aclose()
+        return alice, bob
+
+    alice, bob = asyncio.run(run())
+    assert alice.trace_id == '12' * 16 and bob.trace_id == alice.trace_id
+    assert bob.upload_traces and all(t.startswith('00-' + '12' * 16 + '-')
+                                     for t in bob.upload_traces.values())
+    sent = sum(alice._payload.get(neighbour=n.id, op='batch')[1] for n in neighbours)
+    assert sent >= 1
+    # Completed downloads; one cancelled at the quorum is timed but carries no trace
+    downloads = sum(bob._payload.get(neighbour=n.id, op='download')[1] for n in neighbours)
+    assert downloads == len(bob.upload_traces)
+    assert all(bob._in_flight.get(neighbour=n.id) == 0 for n in neighbours)
+    assert 'orchestrator_request_seconds_bucket{neighbour="server-' in (tmp_path / 'alice.prom').read_text()
+
+
+def test_refresh_shares_applies_deltas_once(project_root, tmp_path):
+    import asyncio
+    import struct
+    import httpx
+
+    storage_app = _storage_app()
+    prime, group = 2 ** 257 - 93, 2 ** 127 - 1
+    (tmp_path / 'alice').mkdir()
+    shares = {f"share_{i}_key{k}.txt": int.from_bytes(os.urandom(32), 'big')
+              for k in range(3) for i in range(1, 6)}
+    for name, y in shares.items():
+        (tmp_path / 'alice' / name).write_text(format(y, 'x'))
+    commitments = [3, 5, 7]
+    (tmp_path / 'alice' / 'commit_key0.txt').write_text(
+        '\n'.join([f'field {prime:x}'] + [format(c, 'x') for c in commitments]))
+    deltas = {name: int.from_bytes(os.urandom(33), 'big') % prime for name in shares}
+    deltas['share_1_unknown.txt'] = 1
+    factors = [1, 11, 13]
+    record = struct.pack('<4sBBI16s', b"SSSD", 1, 33, len(deltas) + 1, os.urandom(16)) \
+        + prime.to_bytes(33, 'little') + struct.pack('<H', 16) + group.to_bytes(16, 'little')
+    for name, delta in deltas.items():
+        record += struct.pack('<HB', len(name), 0) + name.encode() + delta.to_bytes(33, 'little')
+    record += struct.pack('<HB', 15, 3) + b'commit_key0.txt' + b''.join(f.to_bytes(16, 'little') for f in factors)
+    (tmp_path / 'deltas.sssd').write_bytes(record)
+
+    async def run():
+        alice = Orchestrator(load_config(os.path.join(project_root, "config/examples/alice.yaml")),
+                             transport=httpx.ASGITransport(app=storage_app.app))
+        alice.data_dir = tmp_path
+        await alice.distribute_files()
+        applied = await alice.refresh_shares(tmp_path / 'deltas.sssd')
+        # Same record id again: nothing left to apply
+        again = await alice.refresh_shares(tmp_path / 'deltas.sssd')
+        await alice.client.aclose()
+        return applied, again
+
+    applied, again = asyncio.run(run())
+    stored = [(e.filename, storage_app.backend.read(receiver, e))
+              for receiver in ('server-1', 'server-2', 'server-3')
+              for e in storage_app.backend.entries(receiver)]
+    assert applied == len(stored) > len(shares) and again == 0
+    for name, content in stored:
+        if name == 'commit_key0.txt':
+            assert content == f'field {prime:x}\n3\n37\n5b'.encode()
+        else:
+            assert int(content, 16) == (shares[name] + deltas[name]) % prime
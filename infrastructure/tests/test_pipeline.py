@@ -0,0 +1,29 @@
+# tests/test_pipeline.py
+import argparse
+import asyncio
+import csv
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+import pipeline
+
+
+def test_pipeline_writes_spans_for_every_stage(tmp_path):
+    args = argparse.Namespace(experiments=2, parallel=1, threshold=2, num_shares=3,
+                              servers=3, noise=0.0)
+    results = asyncio.run(pipeline.run(args))
+    assert [exp for exp, _, _ in results] == [1, 2]
+    assert all(match for _, _, match in results)
+
+    out = tmp_path / "stats" / "pipeline.csv"
+    pipeline.write_csv(results, str(out))
+    with open(out, newline='') as f:
+        reader = csv.reader(f)
+        assert next(reader) == ['experiment', 'metric', 'seconds']
+        rows = list(reader)
+    for exp in ('1', '2'):
+        metrics = {metric for e, metric, _ in rows if e == exp}
+        assert set(pipeline.STAGES) | {'total', 'SSS_split/split_secret'} <= metrics
+    assert all(float(seconds) > 0 for _, _, seconds in rows)
@@ -0,0 +1,63 @@
+# tests/test_placement.py
+import os
+import sys
+from collections import Counter
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from orchestrator.placement import HashRing, Placement
+
+NODES = [f"server-{i}" for i in range(1, 101)]
+
+
+def test_ring_lookup_is_stable_and_balanced():
+    ring = HashRing(NODES, vnodes=64)
+    owners = [ring.lookup(f"key-{i}") for i in range(20000)]
+    assert owners == [ring.lookup(f"key-{i}") for i in range(20000)]
+    counts = Counter(owners)
+    assert len(counts) == 100
+    # 64 virtual nodes keep every server within a few times its fair share
+    assert max(counts.values()) < 3 * 200 and min(counts.values()) > 200 // 3
+    with pytest.raises(LookupError):
+        HashRing().lookup("key")
+
+
+def test_adding_a_node_moves_few_keys():
+    ring = HashRing(NODES)
+    before = {f"key-{i}": ring.lookup(f"key-{i}") for i in range(10000)}
+    ring.add("server-101")
+    moved = [k for k, node in before.items() if ring.lookup(k) != node]
+    # Only keys taken over by the new server move: about 1/101 of them
+    assert all(ring.lookup(k) == "server-101" for k in moved)
+    assert len(moved) < 3 * 10000 // 101
+    ring.remove("server-101")
+    assert all(ring.lookup(k) == node for k, node in before.items())
+
+
+def test_shares_of_a_secret_land_on_distinct_nodes():
+    placement = Placement(NODES, replication=3)
+    for s in range(50):
+        placed = placement.share_nodes(f"secret-{s}", range(1, 11))
+        nodes = [node for replicas in placed.values() for node in replicas]
+        assert len(nodes) == 30 and len(set(nodes)) == 30
+    assert placement.share_nodes("secret-0", range(1, 11)) == \
+        Placement(list(reversed(NODES)), replication=3).share_nodes("secret-0", range(1, 11))
+
+
+def test_more_shares_than_nodes_spread_evenly():
+    placement = Placement(["a", "b", "c"])
+    placed = placement.share_nodes("key.txt", range(1, 6))
+    counts = Counter(nodes[0] for nodes in placed.values())
+    assert sorted(counts.values()) == [1, 2, 2]
+
+
+def test_assign_and_holders_agree():
+    placement = Placement(NODES, replication=2)
+    names = [f"share_{i}_key.txt" for i in range(1, 6)] + ["enc_big.bin"]
+    groups = placement.assign(names)
+    share_holders = {node for node, files in groups.items()
+                     if any(f.startswith("share_") for f in files)}
+    assert share_holders == set(placement.holders(["key.txt"], 5))
+    assert sum(len(files) for files in groups.values()) == 12
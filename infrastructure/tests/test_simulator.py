@@ -0,0 +1,50 @@
+# tests/test_simulator.py
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from simulator import Cluster, topology, scenario, write_shares
+
+
+def test_topology_marks_slow_and_down_nodes():
+    profiles = topology(100, latency=0.001, slow=0.1, slow_latency=0.05, down=0.05, seed=3)
+    assert sum(p.down for p in profiles) == 5
+    assert sum(p.latency > 0.01 for p in profiles) == 10
+    assert all(p.latency >= 0.001 for p in profiles)
+    assert topology(100, slow=0.1, down=0.05, seed=3) == topology(100, slow=0.1, down=0.05, seed=3)
+
+
+@pytest.mark.parametrize('isolated', [True, False])
+def test_scenario_survives_down_and_slow_nodes(tmp_path, isolated):
+    profiles = topology(12, jitter=0.001, slow=0.25, slow_latency=0.02, down=0.1, seed=2)
+    cluster = Cluster(profiles, isolated=isolated)
+    down = [node_id for node_id, node in cluster.nodes.items() if node.profile.down]
+    result = asyncio.run(scenario(cluster, 100, 3, 5, tmp_path, ready_timeout=0.2))
+    assert result['shares'] == 100
+    # Anti-affinity puts at most one share of a secret on the down node
+    assert result['recovered'] == result['secrets'] == 20
+    assert result['post_p99'] >= result['post_p50'] > 0
+    assert all(cluster.stored(node_id) == 0 for node_id in down)
+    assert len({id(node.app) for node in cluster.nodes.values()}) == (12 if isolated else 1)
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_collect_without_known_secrets_waits_for_every_node(tmp_path, seed):
+    # More nodes than the threshold, and Bob is not told which secrets exist
+    cluster = Cluster(topology(30, jitter=0.05, seed=seed), seed=seed)
+    write_shares(tmp_path / 'alice', 1, 5)
+
+    async def run():
+        alice = cluster.orchestrator('alice', 3, tmp_path, num_shares=5)
+        bob = cluster.orchestrator('bob', 3, tmp_path)
+        await alice.distribute_files()
+        collected = await bob.collect_files()
+        await alice.client.aclose()
+        await bob.client.aclose()
+        return collected
+
+    assert len(asyncio.run(run())) >= 3
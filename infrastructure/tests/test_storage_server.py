@@ -0,0 +1,358 @@
+# tests/test_storage_server.py
+import os
+import sys
+import base64
+import pytest
+
+# storage_server is not a package: its modules import each other by file name
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'storage_server')))
+
+from storage import MemoryBackend, SegmentBackend, QuotaExceeded, backend_from_env
+
+
+@pytest.fixture(params=['memory', 'segment'])
+def make_backend(request, tmp_path):
+    def make(**kwargs):
+        if request.param == 'memory':
+            return MemoryBackend(**kwargs)
+        return SegmentBackend(str(tmp_path / 'store'), **kwargs)
+    return make
+
+
+def test_backend_append_list_delete(make_backend):
+    backend = make_backend()
+    backend.append('server-1', 'alice', 'share_1_key.txt', b'abc')
+    backend.append('server-1', 'alice', 'share_2_key.txt', b'defg')
+    entries = backend.entries('server-1')
+    assert [e.seq for e in entries] == [1, 2]
+    assert backend.read('server-1', entries[1]) == b'defg'
+    assert [e.filename for e in backend.entries('server-1', since=1)] == ['share_2_key.txt']
+    assert backend.delete('server-1', seqs=[1]) == 1
+    assert backend.stats() == {'receivers': 1, 'entries': 1, 'bytes': 4}
+    backend.close()
+
+
+def test_backend_quota_evicts_oldest(make_backend):
+    backend = make_backend(quota_bytes=10)
+    backend.append('r', 'a', 'f1', b'12345')
+    backend.append('r', 'a', 'f2', b'12345')
+    backend.append('r', 'a', 'f3', b'123')
+    assert [e.filename for e in backend.entries('r')] == ['f2', 'f3']
+    backend.close()
+
+
+def test_backend_quota_rejects(make_backend):
+    backend = make_backend(quota_bytes=4, evict=False)
+    backend.append('r', 'a', 'f1', b'1234')
+    with pytest.raises(QuotaExceeded):
+        backend.append('r', 'a', 'f2', b'5')
+    backend.close()
+
+
+def test_backend_pages_from_cursor_after_deletes(make_backend):
+    backend = make_backend()
+    for i in range(300):
+        backend.append('bob', 'alice', f'{i}.txt', b'x')
+    backend.delete('bob', upto=100)
+    backend.delete('bob', seqs=list(range(150, 290)))
+    page = backend.entries('bob', since=120, limit=20)
+    assert [e.seq for e in page] == list(range(121, 141))
+    assert [e.seq for e in backend.entries('bob', since=140)] == \
+        list(range(141, 150)) + list(range(290, 301))
+    assert backend.entries('bob', since=300) == []
+    backend.append('bob', 'alice', 'late.txt', b'y')
+    assert [e.filename for e in backend.entries('bob', since=300)] == ['late.txt']
+    backend.close()
+
+
+def test_segment_backend_survives_restart(tmp_path):
+    root = str(tmp_path / 'store')
+    backend = SegmentBackend(root)
+    for i in range(5):
+        backend.append('bob', 'alice', f'share_{i}', bytes([i]) * 100)
+    backend.delete('bob', upto=2)
+    backend.close()
+
+    reopened = SegmentBackend(root)
+    entries = reopened.entries('bob')
+    assert [e.seq for e in entries] == [3, 4, 5]
+    assert reopened.read('bob', entries[0]) == bytes([2]) * 100
+    reopened.delete('bob', upto=5)
+    assert reopened.append('bob', 'alice', 'next', b'x').seq == 6
+    reopened.close()
+    assert SegmentBackend(root).last_seq['bob'] == 6
+
+
+def test_backend_eviction_and_ttl_take_oldest_across_receivers(make_backend, monkeypatch):
+    import storage
+    clock = [1000.0]
+    monkeypatch.setattr(storage.time, 'time', lambda: clock[0])
+    backend = make_backend(quota_bytes=12, ttl=100)
+    for receiver, name in (('r1', 'f1'), ('r2', 'f2'), ('r1', 'f3')):
+        backend.append(receiver, 'a', name, b'1234')
+        clock[0] += 1
+    backend.append('r2', 'a', 'f4', b'1234')
+    assert [e.filename for e in backend.entries('r1')] == ['f3']
+    assert [e.filename for e in backend.entries('r2')] == ['f2', 'f4']
+    # f2 was created at 1001, f3 at 1002
+    clock[0] = 1101.5
+    assert [e.filename for e in backend.entries('r2')] == ['f4']
+    assert [e.filename for e in backend.entries('r1')] == ['f3']
+    backend.close()
+
+
+def test_segment_backend_compaction_keeps_live_entries(tmp_path):
+    root = str(tmp_path / 'store')
+    backend = SegmentBackend(root)
+    contents = [bytes([i]) * (600 << 10) for i in range(4)]
+    for i, content in enumerate(contents):
+        backend.append('bob', 'alice', f'share_{i}', content)
+    backend.delete('bob', seqs=[1, 2, 3])
+    # The dead records outweighed the live one, so the segment was rewritten
+    assert os.path.getsize(backend._path('bob')) < 700 << 10
+    (entry,) = backend.entries('bob')
+    assert backend.read('bob', entry) == contents[3]
+    backend.close()
+    reopened = SegmentBackend(root)
+    assert reopened.read('bob', reopened.entries('bob')[0]) == contents[3]
+    assert reopened.append('bob', 'alice', 'next', b'x').seq == 5
+    reopened.close()
+
+def test_backend_from_env(tmp_path):
+    assert isinstance(backend_from_env({}), MemoryBackend)
+    backend = backend_from_env({'STORAGE_BACKEND': 'segment', 'STORAGE_DIR': str(tmp_path)})
+    assert isinstance(backend, SegmentBackend)
+
+
+def test_app_post_and_get_roundtrip():
+    from fastapi.testclient import TestClient
+    import app as storage_app
+
+    storage_app.backend = MemoryBackend()
+    with TestClient(storage_app.app) as client:
+        content = base64.b64encode(os.urandom(300_000)).decode()
+        r = client.post('/files', json={'from': 'alice', 'to': 'server-1',
+                                        'filename': 'share_1_key.txt', 'content': content})
+        assert r.status_code == 200
+        assert client.post('/files', json={'from': 'alice'}).status_code == 400
+        r = client.get('/files/server-1')
+        files = r.json()
+        assert files == [{'seq': 1, 'from': 'alice', 'filename': 'share_1_key.txt', 'content': content}]
+        assert r.headers['x-next-since'] == '1'
+        assert client.get('/files/server-1', params={'since': 1}).json() == []
+        # Nothing is removed until it is acknowledged
+        assert client.get('/files/server-1').json() == files
+        assert client.post('/files/server-1/ack', json={'upto': 1}).json()['deleted'] == 1
+        assert client.get('/files/server-1').json() == []
+
+
+def test_app_change_feed_long_poll_and_paging():
+    import asyncio
+    import httpx
+    import app as storage_app
+
+    storage_app.backend = MemoryBackend()
+
+    async def run():
+        transport = httpx.ASGITransport(app=storage_app.app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://server') as client:
+            # A long-poll returns as soon as an upload arrives
+            poll = asyncio.create_task(client.get('/files/bob/index', params={'wait': 5}))
+            await asyncio.sleep(0.1)
+            assert not poll.done()
+            await client.put('/files/bob/a.txt', content=b'a', headers={'X-From': 'alice'})
+            index = (await asyncio.wait_for(poll, 2)).json()
+            assert [e['filename'] for e in index] == ['a.txt']
+            # An empty feed answers with [] once the wait expires
+            r = await client.get('/files/bob/index', params={'since': index[-1]['seq'], 'wait': 0.05})
+            assert r.json() == []
+            for i in range(5):
+                await client.put(f'/files/bob/{i}.txt', content=b'x', headers={'X-From': 'alice'})
+            page = (await client.get('/files/bob', params={'since': 1, 'limit': 2})).json()
+            assert [e['filename'] for e in page] == ['0.txt', '1.txt']
+            r = await client.post('/files/bob/ack', json={'seqs': [e['seq'] for e in page]})
+            assert r.json()['deleted'] == 2
+            assert (await client.post('/files/bob/ack', json={})).status_code == 400
+            return (await client.get('/files/bob/index')).json()
+
+    assert [e['filename'] for e in asyncio.run(run())] == ['a.txt', '2.txt', '3.txt', '4.txt']
+
+
+def test_app_change_feed_skips_entries_acked_mid_request(monkeypatch):
+    from fastapi.testclient import TestClient
+    import app as storage_app
+
+    storage_app.backend = MemoryBackend()
+    poll = storage_app._poll
+
+    async def poll_then_ack(receiver_id, since, wait, limit):
+        entries = await poll(receiver_id, since, wait, limit)
+        # Another client acknowledges the first entry before its content is read
+        storage_app.backend.delete(receiver_id, seqs=[1])
+        return entries
+
+    monkeypatch.setattr(storage_app, '_poll', poll_then_ack)
+    with TestClient(storage_app.app) as client:
+        for name in ('a.txt', 'b.txt'):
+            client.put(f'/files/bob/{name}', content=name.encode(), headers={'X-From': 'alice'})
+        r = client.get('/files/bob')
+        assert [(e['seq'], base64.b64decode(e['content'])) for e in r.json()] == [(2, b'b.txt')]
+        assert r.headers['x-next-since'] == '2'
+
+
+def test_app_download_survives_concurrent_delete(tmp_path, monkeypatch):
+    from fastapi.testclient import TestClient
+    import app as storage_app
+
+    storage_app.backend = SegmentBackend(str(tmp_path / 'store'))
+    content = os.urandom(200_000)
+    find = storage_app._find
+
+    async def find_then_delete(receiver_id, seq):
+        entry = await find(receiver_id, seq)
+        if seq == 2:
+            # An ack lands between the lookup and the read
+            storage_app.backend.delete(receiver_id, seqs=[seq])
+        return entry
+
+    monkeypatch.setattr(storage_app, '_find', find_then_delete)
+    with TestClient(storage_app.app) as client:
+        for name in ('a.bin', 'b.bin'):
+            client.put(f'/files/bob/{name}', content=content, headers={'X-From': 'alice'})
+        r = client.get('/files/bob/1')
+        assert r.content == content and r.headers['content-length'] == '200000'
+        assert client.get('/files/bob/2').status_code == 404
+    storage_app.backend.close()
+
+
+def test_app_batch_upload():
+    import struct
+    from fastapi.testclient import TestClient
+    import app as storage_app
+
+    storage_app.backend = MemoryBackend()
+    files = [(f'share_1_key{i}.txt', os.urandom(100 + i)) for i in range(5)]
+    body = b''.join(struct.pack('<HI', len(n), len(d)) + n.encode() + d for n, d in files)
+    headers = {'X-From': 'alice', 'X-To': 'server-1'}
+    with TestClient(storage_app.app) as client:
+        r = client.post('/files:batch', content=body, headers=headers)
+        assert r.status_code == 200
+        assert len(r.json()['seqs']) == 5
+        index = client.get('/files/server-1/index').json()
+        assert [e['filename'] for e in index] == [n for n, _ in files]
+        assert client.get(f"/files/server-1/{index[2]['seq']}").content == files[2][1]
+        assert client.post('/files:batch', content=body[:-1], headers=headers).status_code == 400
+        assert client.post('/files:batch', content=body).status_code == 400
+
+
+def test_app_refresh_applies_delta_record_once():
+    import struct
+    from fastapi.testclient import TestClient
+    import app as storage_app
+
+    storage_app.backend = MemoryBackend()
+    storage_app.backend.append('server-1', 'alice', 'share_2_key.txt', b'ff')
+    storage_app.backend.append('server-1', 'alice', 'enc_key.bin', b'not a share')
+    deltas = [('share_2_key.txt', 16), ('share_3_key.txt', 1)]
+    body = struct.pack('<4sBBI16s', b"SSSD", 1, 1, len(deltas), b'r' * 16) + bytes([251]) \
+        + struct.pack('<H', 0)
+    body += b''.join(struct.pack('<HB', len(n), 0) + n.encode() + bytes([d]) for n, d in deltas)
+    with TestClient(storage_app.app) as client:
+        r = client.post('/files/server-1/refresh', content=body)
+        assert r.json() == {'ok': True, 'applied': 1, 'missing': ['share_3_key.txt']}
+        # (255 + 16) mod 251, with the refreshed share at the end of the feed
+        index = client.get('/files/server-1/index').json()
+        assert [e['filename'] for e in index] == ['enc_key.bin', 'share_2_key.txt']
+        assert client.get(f"/files/server-1/{index[1]['seq']}").content == b'14'
+        assert client.post('/files/server-1/refresh', content=body).json()['applied'] == 0
+        assert client.post('/files/server-1/refresh', content=body[:-1]).status_code == 400
+
+
+def test_app_refresh_is_not_reapplied_after_restart(tmp_path):
+    import struct
+    from fastapi.testclient import TestClient
+    import app as storage_app
+
+    path = str(tmp_path / 'store')
+    storage_app.backend = SegmentBackend(path)
+    storage_app.backend.append('server-1', 'alice', 'share_2_key.txt', b'ff')
+    storage_app.backend.append('server-1', 'alice', 'share_3_key.txt', b'10')
+    deltas = [('share_2_key.txt', 16), ('share_3_key.txt', 1)]
+    body = struct.pack('<4sBBI16s', b"SSSD", 1, 1, len(deltas), b'r' * 16) + bytes([251]) \
+        + struct.pack('<H', 0)
+    body += b''.join(struct.pack('<HB', len(n), 0) + n.encode() + bytes([d]) for n, d in deltas)
+    # A crash between appending the refreshed share_3 and deleting the old one
+    storage_app.backend.append('server-1', 'alice', 'share_3_key.txt', b'11', tag=b'r' * 16)
+    storage_app.backend.close()
+    storage_app.backend = SegmentBackend(path)
+    with TestClient(storage_app.app) as client:
+        r = client.post('/files/server-1/refresh', content=body)
+        assert r.json() == {'ok': True, 'applied': 1, 'missing': []}
+    storage_app.backend.close()
+    storage_app.backend = SegmentBackend(path)
+    with TestClient(storage_app.app) as client:
+        assert client.post('/files/server-1/refresh', content=body).json()['applied'] == 0
+        index = client.get('/files/server-1/index').json()
+        assert [e['filename'] for e in index] == ['share_3_key.txt', 'share_2_key.txt']
+        assert [client.get(f"/files/server-1/{e['seq']}").content for e in index] == [b'11', b'14']
+    storage_app.backend._compact('server-1')
+    storage_app.backend.close()
+    storage_app.backend = SegmentBackend(path)
+    assert [e.tag for e in storage_app.backend.entries('server-1')] == [b'r' * 16] * 2
+    storage_app.backend.close()
+
+
+def test_delta_records_written_by_sss_decode():
+    import deltas
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'sss'))
+    from src.logic.refresh import encode_deltas
+    from src.logic.shamir import PRIME, VSS_P
+
+    entries = [('share_1_key.txt', 12345), ('commit_key.txt', [2, 3, 5])]
+    record = encode_deltas(entries, b'r' * 16)
+    assert deltas.decode_record(record) == (b'r' * 16, PRIME, VSS_P, dict(entries))
+    size, record_id, moduli, raw = deltas.split_record(record)
+    assert deltas.encode_record(size, record_id, moduli, list(raw.values())) == record
+    with pytest.raises(ValueError):
+        deltas.split_record(record + b'\0')
+
+
+def test_app_healthz_reports_readiness_and_load():
+    from fastapi.testclient import TestClient
+    import app as storage_app
+
+    storage_app.backend = MemoryBackend(quota_bytes=10, evict=False)
+    with TestClient(storage_app.app) as client:
+        r = client.get('/healthz')
+        assert r.status_code == 200
+        assert r.json()['ready'] and r.json()['entries'] == 0
+        client.put('/files/bob/a.txt', content=b'x' * 10, headers={'X-From': 'alice'})
+        r = client.get('/healthz')
+        assert r.status_code == 503
+        assert r.json()['bytes'] == 10
+
+
+def test_app_metrics_and_trace_context():
+    from fastapi.testclient import TestClient
+    import app as storage_app
+
+    storage_app.backend = MemoryBackend()
+    # The registry lives as long as the module: compare against earlier tests' counts
+    puts = storage_app.REQUESTS.get(handler='put_file', status=200)
+    sent = storage_app.BYTES_OUT.get(handler='get_file')[0]
+    upload = '00-' + 'ab' * 16 + '-' + 'cd' * 8 + '-01'
+    with TestClient(storage_app.app) as client:
+        r = client.put('/files/bob/a.txt', content=b'x' * 100,
+                       headers={'X-From': 'alice', 'traceparent': upload})
+        assert r.headers['traceparent'].startswith('00-' + 'ab' * 16 + '-')
+        assert r.headers['traceparent'] != upload
+        r = client.get(f"/files/bob/{r.json()['seq']}")
+        assert r.headers['x-upload-traceparent'].startswith('00-' + 'ab' * 16 + '-')
+        assert 'traceparent' not in r.headers
+        text = client.get('/metrics').text
+    assert storage_app.REQUESTS.get(handler='put_file', status=200) == puts + 1
+    assert storage_app.BYTES_OUT.get(handler='get_file')[0] == sent + 100
+    assert '# TYPE storage_request_seconds histogram' in text
+    assert 'storage_request_seconds_bucket{handler="get_file",le="+Inf"}' in text
+    assert 'storage_store_bytes 100' in text
+    assert 'storage_store_in_flight 0' in text
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+pipeline.py
+
+In-process runner for the QKD → SSS → storage → SSS pipeline that main.sh
+drives through docker compose. Every stage calls the same code the
+containers run, inside one interpreter, so the timings measure the work
+itself rather than image builds, container start-up and `cp` loops:
+
+    QKD_gen       AliceSession against an in-process BobServer (loopback TCP)
+    SSS_split     split_secret, share files written to Alice's data dir
+    Infra_post    Orchestrator.distribute_files to in-process storage servers
+                  (storage_server/app.py behind an httpx ASGI transport)
+    Infra_get     Orchestrator.collect_files into Bob's data dir
+    SSS_combine   recover_secret from the collected shares
+
+AES encryption stays in the Rust aes/ module and is not part of the run.
+
+Each stage is a timing span (time.perf_counter_ns); steps inside a stage
+are nested spans named stage/step, and 'total' times the whole run.
+Experiments run without prompts, up to --parallel of them at once on one
+event loop (each gets its own storage server ids and data directories).
+Spans are written in the experiment,metric,seconds schema of statistics/.
+
+Per-stage spans are only meaningful with --parallel 1. The CPU-bound work
+(split_secret, recover_secret, key distillation) runs on the shared event
+loop, so with several experiments in flight a span also counts the time the
+loop spent on other experiments. --parallel > 1 is for throughput (the
+wall-clock experiments/s in the summary), not for stage breakdowns.
+
+Usage:
+    python3 pipeline.py --experiments 100 --threshold 3 --num-shares 5
+    python3 pipeline.py --experiments 100 --parallel 8 --out statistics/run.csv
+"""
+import argparse
+import asyncio
+import contextlib
+import csv
+import io
+import logging
+import os
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+for sub in ('qkd', 'sss', 'infrastructure', os.path.join('infrastructure', 'storage_server')):
+    sys.path.insert(0, os.path.join(ROOT, sub))
+
+import httpx  # noqa: E402
+
+from alice import AliceSession  # noqa: E402
+from bob import BobServer  # noqa: E402
+from src.logic.shamir import split_secret, recover_secret  # noqa: E402
+from config.config_loader import Config, Neighbour  # noqa: E402
+from orchestrator.orchestrator import Orchestrator  # noqa: E402
+import app as storage_app  # noqa: E402
+from storage import MemoryBackend  # noqa: E402
+
+STAGES = ('QKD_gen', 'SSS_split', 'Infra_post', 'Infra_get', 'SSS_combine')
+KEY_NAME = 'alice_raw_key.txt'
+
+
+class Spans:
+    """Nested timing spans of one experiment, as (path, nanoseconds) records."""
+
+    def __init__(self):
+        self.records = []
+        self._stack = []
+
+    @contextmanager
+    def span(self, name):
+        self._stack.append(name)
+        path = '/'.join(self._stack)
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.records.append((path, time.perf_counter_ns() - start))
+            self._stack.pop()
+
+
+def _orchestrator(config, transport, data_dir):
+    orch = Orchestrator(config, transport=transport)
+    orch.data_dir = data_dir
+    return orch
+
+
+async def experiment(exp, args, bob_port, transport, work_dir):
+    """Run the pipeline once; returns (spans, whether Bob recovered Alice's key)."""
+    spans = Spans()
+    data_dir = Path(work_dir) / f"exp_{exp}"
+    (data_dir / 'alice').mkdir(parents=True)
+    neighbours = [Neighbour(f"e{exp}-server-{i}", f"http://e{exp}-server-{i}:8000")
+                  for i in range(1, args.servers + 1)]
+
+    start = time.perf_counter_ns()
+    with spans.span('QKD_gen'):
+        session = AliceSession('127.0.0.1', bob_port, distill=args.noise > 0)
+        with spans.span('open'):
+            await session.open()
+        with spans.span('round'):
+            (_, key), = await session.keys(1)
+        await session.close()
+
+    with spans.span('SSS_split'):
+        with spans.span('split_secret'):
+            shares = split_secret(key, args.threshold, args.num_shares)
+        with spans.span('write_shares'):
+            for idx, share in shares:
+                (data_dir / 'alice' / f"share_{idx}_{KEY_NAME}").write_text(share)
+
+    with spans.span('Infra_post'):
+        alice = _orchestrator(Config('alice', 'alice', neighbours, args.threshold),
+                              transport, data_dir)
+        await alice.distribute_files()
+        await alice.client.aclose()
+
+    with spans.span('Infra_get'):
+        bob = _orchestrator(Config('bob', 'bob', neighbours, args.threshold,
+                                   num_shares=args.num_shares, secrets=[KEY_NAME]),
+                            transport, data_dir)
+        collected = await bob.collect_files()
+        await bob.client.aclose()
+
+    with spans.span('SSS_combine'):
+        with spans.span('read_shares'):
+            got = [(int(name.split('_', 2)[1]), (data_dir / 'bob' / name).read_text())
+                   for name in collected if name.startswith('share_')]
+        with spans.span('recover_secret'):
+            recovered = recover_secret(sorted(got), args.threshold)
+    spans.records.append(('total', time.perf_counter_ns() - start))
+    return spans, recovered == key
+
+
+async def run(args):
+    """All experiments; returns [(experiment, spans, key match)]."""
+    storage_app.backend = MemoryBackend()
+    transport = httpx.ASGITransport(app=storage_app.app)
+    with tempfile.TemporaryDirectory() as work_dir:
+        bob = BobServer(os.path.join(work_dir, 'qkd'), noise=args.noise)
+        server = await asyncio.start_server(bob.handle, '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        limit = asyncio.Semaphore(args.parallel)
+
+        async def one(exp):
+            async with limit:
+                spans, match = await experiment(exp, args, port, transport, work_dir)
+                return exp, spans, match
+
+        async with server:
+            return await asyncio.gather(*(one(exp) for exp in range(1, args.experiments + 1)))
+
+
+def write_csv(results, path):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['experiment', 'metric', 'seconds'])
+        for exp, spans, _ in results:
+            for metric, ns in spans.records:
+                writer.writerow([exp, metric, f"{ns / 1e9:.9f}"])
+
+
+def print_summary(results, wall, out=sys.stderr):
+    per_stage = {}
+    for _, spans, _ in results:
+        for metric, ns in spans.records:
+            per_stage.setdefault(metric, []).append(ns)
+    print(f"{len(results)} experiments in {wall:.3f} s "
+          f"({len(results) / wall:.1f}/s), keys matched: "
+          f"{sum(match for _, _, match in results)}/{len(results)}", file=out)
+    for metric in sorted(per_stage, key=lambda m: (m.split('/')[0] not in STAGES, m)):
+        values = sorted(per_stage[metric])
+        print(f"  {metric:<28} median {values[len(values) // 2] / 1e6:9.3f} ms"
+              f"   max {values[-1] / 1e6:9.3f} ms", file=out)
+
+
+if __name__ == '__main__':
+    p = argparse.ArgumentParser(description="Run the QKD/SSS/storage pipeline in-process")
+    p.add_argument('--experiments', type=int, default=100, help='Number of pipeline runs')
+    p.add_argument('--parallel', type=int, default=1,
+                   help='Experiments in flight at once; above 1 the per-stage spans '
+                        'include other experiments\' work, so only throughput is meaningful')
+    p.add_argument('--threshold', type=int, default=3, help='Min shares to reconstruct')
+    p.add_argument('--num-shares', type=int, default=5, help='Total number of shares')
+    p.add_argument('--servers', type=int, default=3, help='Storage servers per experiment')
+    p.add_argument('--noise', type=float, default=0.0,
+                   help='QKD channel noise; above 0 every round is distilled')
+    p.add_argument('--out', default=None,
+                   help='CSV to write (default: statistics/pipeline_stat_<experiments>.csv)')
+    p.add_argument('--verbose', action='store_true', help='Keep the components\' own logs')
+    args = p.parse_args()
+    out = args.out or os.path.join(ROOT, 'statistics', f"pipeline_stat_{args.experiments}.csv")
+
+    if not args.verbose:
+        # Per-request logs (and the expected "fewer servers than shares") drown the summary
+        logging.getLogger('orchestrator').setLevel(logging.ERROR)
+        logging.getLogger('httpx').setLevel(logging.WARNING)
+    start = time.perf_counter()
+    # BobServer reports every key on stdout; keep it out of the summary
+    with contextlib.redirect_stdout(sys.stdout if args.verbose else io.StringIO()):
+        results = asyncio.run(run(args))
+    wall = time.perf_counter() - start
+    write_csv(results, out)
+    print_summary(results, wall)
+    print(f"Statistics written to {out}", file=sys.stderr)
+    sys.exit(0 if all(match for _, _, match in results) else 1)
@@ -1,66 +1,170 @@
 #!/usr/bin/env python3
-import socket
-import json
-import random
+"""
+alice.py
+
+Alice's side of the QKD exchange. An AliceSession keeps one connection to
+Bob open and can run any number of rounds; each round sends enough qubits
+for the requested keys in one QUANTUM frame, so the connection set-up is
+paid once per session rather than once per key.
+
+On a noisy channel (Bob's --noise/--eve) a distilled round estimates the
+QBER, reconciles and privacy-amplifies the sifted bits instead (distill=True,
+or QKD_DISTILL=1; see postprocess.py), and aborts if Eve may know too much.
+
+Run as a script it produces QKD_KEYS keys (default 1) and writes them to
+keys/alice_raw_key.txt, or keys/alice_raw_key_<i>.txt for more than one.
+"""
+import asyncio
 import os
 
+import numpy as np
+
+import engine
+import postprocess
+
 # ——— PARAMETERS ———
 TARGET_KEY_BITS = 256         # we want 256 bits → 64 hex chars
-NUM_BITS = TARGET_KEY_BITS * 4  # send 4× as many to get ~50% matches
 BOB_HOST = 'bob'
 BOB_PORT = 6000
+# Qubits sent per key bit: ~50% survive sifting, the rest is safety margin
+QUBITS_PER_BIT = 4
+# A distilled round also pays for the QBER sample, the disclosed parities and
+# Eve's share; too short a round leaves nothing after the finite-size margins
+DISTILL_QUBITS_PER_BIT = 8
+DISTILL_MIN_QUBITS = 1 << 16
+
+
+class AliceSession:
+    """One session with Bob; keys() may be awaited repeatedly."""
+
+    def __init__(self, host=BOB_HOST, port=BOB_PORT, key_bits=TARGET_KEY_BITS, distill=False):
+        self.host, self.port, self.key_bits = host, port, key_bits
+        self.distill = distill
+        self.qber = None
+        self.session_id = bytes(engine.SESSION_ID_SIZE)
+        self.resume_token = b''
+        self.keys_issued = 0
+        self._reader = self._writer = None
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def _call(self, kind, payload=b''):
+        engine.write_frame(self._writer, kind, payload)
+        await self._writer.drain()
+        reply, body = await engine.read_frame(self._reader)
+        if reply == engine.ERROR:
+            raise RuntimeError(f"Bob: {body.decode()}")
+        return reply, body
+
+    async def open(self, retries=10):
+        for attempt in range(retries):
+            try:
+                self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+                break
+            except OSError:
+                # Bob's container may still be starting
+                if attempt == retries - 1:
+                    raise
+                await asyncio.sleep(0.2 * (attempt + 1))
+        # A new session until Bob has issued one; then resume it with its token
+        _, body = await self._call(engine.HELLO, self.session_id + self.resume_token)
+        self.session_id = body[:engine.SESSION_ID_SIZE]
+        self.resume_token = body[engine.SESSION_ID_SIZE:]
+
+    async def close(self):
+        if self._writer is not None:
+            try:
+                await self._call(engine.BYE)
+            finally:
+                self._writer.close()
+                self._writer = None
+
+    def key_id(self, n):
+        return f"{self.session_id.hex()}-{n}"
+
+    async def _quantum(self, num_bits):
+        bits, bases = await asyncio.to_thread(engine.prepare, num_bits)
+        _, payload = await self._call(engine.QUANTUM, engine.encode_quantum(num_bits, bits, bases))
+        return bits, bases, engine.decode_packed(payload)
+
+    async def _sifted_keys(self, count):
+        num_bits = count * self.key_bits * QUBITS_PER_BIT
+        bits, bases, bob_bases = await self._quantum(num_bits)
+
+        # Sift: keep only matching‐basis bits, as many as the keys need
+        mask = engine.sift_mask(bases, bob_bases, num_bits, limit=count * self.key_bits)
+        keys = engine.split_keys(engine.select(bits, mask, num_bits), self.key_bits)
+        if len(keys) < count:
+            raise RuntimeError(f"Only {len(keys)} of {count} keys survived sifting. "
+                               f"Increase QUBITS_PER_BIT.")
+        _, confirm = await self._call(engine.MATCH, engine.encode_match(self.key_bits, mask))
+        return keys, confirm
+
+    async def _distilled_keys(self, count):
+        num_bits = max(count * self.key_bits * DISTILL_QUBITS_PER_BIT, DISTILL_MIN_QUBITS)
+        bits, bases, bob_bases = await self._quantum(num_bits)
+        mask = engine.sift_mask(bases, bob_bases, num_bits)
+        sifted = engine.select(bits, mask, num_bits)
+        await self._call(engine.SIFT, mask.tobytes())
+
+        # Error estimation: compare a disclosed sample, then drop it on both sides
+        sample = postprocess.sample_mask(len(sifted))
+        _, payload = await self._call(engine.SAMPLE, np.packbits(sample).tobytes())
+        theirs = np.unpackbits(engine.decode_packed(payload), count=int(sample.sum()))
+        qber, bound = postprocess.estimate_qber(sifted[sample], theirs)
+        self.qber = qber
+        if qber > postprocess.QBER_ABORT:
+            raise RuntimeError(f"QBER {qber:.1%} is above {postprocess.QBER_ABORT:.0%}; "
+                               f"the channel may be tapped, round aborted")
+        sifted = sifted[~sample]
+
+        async def query(seed, starts, ends):
+            _, body = await self._call(engine.PARITY, engine.encode_parity(seed, starts, ends))
+            return np.unpackbits(engine.decode_packed(body), count=len(starts))
+
+        disclosed = await postprocess.cascade(sifted, qber, query)
+        out_bits = count * self.key_bits
+        if postprocess.secure_length(len(sifted), bound, disclosed) < out_bits:
+            raise RuntimeError(f"Too little secret key for {count} keys at QBER {qber:.1%}. "
+                               f"Increase DISTILL_QUBITS_PER_BIT.")
+        seed = os.urandom(32)
+        key_bits = await asyncio.to_thread(postprocess.amplify, sifted, out_bits, seed)
+        keys = engine.split_keys(key_bits, self.key_bits)
+        _, confirm = await self._call(engine.AMPLIFY, engine.encode_amplify(self.key_bits, out_bits, seed))
+        return keys, confirm
+
+    async def keys(self, count):
+        """Run one round producing count keys; returns [(key id, hex key), ...]."""
+        if self.distill:
+            keys, confirm = await self._distilled_keys(count)
+        else:
+            keys, confirm = await self._sifted_keys(count)
+        if engine.decode_confirm(confirm) != (len(keys), engine.fingerprint(keys)):
+            raise RuntimeError("Bob derived different keys")
+        ids = [self.key_id(self.keys_issued + i) for i in range(len(keys))]
+        self.keys_issued += len(keys)
+        return list(zip(ids, keys))
+
+
+async def main(num_keys, distill=False):
+    async with AliceSession(distill=distill) as session:
+        keys = await session.keys(num_keys)
+    print(f"Alice generated {len(keys)} keys with Bob")
+
+    os.makedirs('keys', exist_ok=True)
+    for i, (_, hex_key) in enumerate(keys):
+        name = 'alice_raw_key.txt' if num_keys == 1 else f'alice_raw_key_{i}.txt'
+        with open(os.path.join('keys', name), 'w') as f:
+            f.write(hex_key)
+        print(f"→ Written to keys/{name}")
+    print("Key exchange complete.")
+
 
-# ——— 1) Generate random bits & bases ———
-alice_bits  = [random.randint(0,1) for _ in range(NUM_BITS)]
-alice_bases = [random.choice(['Z','X']) for _ in range(NUM_BITS)]
-
-print("Alice generated", NUM_BITS, "qubits")
-
-# ——— 2) Send on “quantum” channel, receive Bob’s bases ———
-with socket.create_connection((BOB_HOST, BOB_PORT)) as sock:
-    sock.sendall((json.dumps({
-        'type': 'QUANTUM',
-        'bits': alice_bits,
-        'bases': alice_bases
-    }) + '\n').encode())
-    bob_bases = json.loads(sock.makefile().readline())['bases']
-
-# ——— 3) Sift: keep only matching‐basis bits ———
-matching_indices = [i for i, (a,b) in enumerate(zip(alice_bases, bob_bases)) if a == b]
-sifted = [alice_bits[i] for i in matching_indices]
-print(f"Sifted down to {len(sifted)} bits")
-
-# ——— 4) Truncate & pack into 256 bits ———
-if len(sifted) < TARGET_KEY_BITS:
-    raise RuntimeError(f"Only {len(sifted)} sifted bits—need ≥{TARGET_KEY_BITS}. Increase NUM_BITS.")
-# take the first 256 bits
-key_bits = sifted[:TARGET_KEY_BITS]
-
-# pack into bytes and hex-encode
-hex_key = ''.join(
-    f"{sum(key_bits[i+j] << (7-j) for j in range(8)):02x}"
-    for i in range(0, TARGET_KEY_BITS, 8)
-)
-assert len(hex_key) == 64
-
-print("Alice’s 64-char hex key:", hex_key)
-
-# ——— 5) Write to file ———
-os.makedirs('keys', exist_ok=True)
-with open('keys/alice_raw_key.txt', 'w') as f:
-    f.write(hex_key)
-print("→ Written to keys/alice_raw_key.txt")
-
-
-
-# ——— 6) Tell Bob which indices matched so he can derive the same key ———
-with socket.create_connection((BOB_HOST, BOB_PORT)) as sock:
-    sock.sendall((json.dumps({
-        'type': 'MATCH',
-        'matches': matching_indices[:TARGET_KEY_BITS]  # only first 256
-    }) + '\n').encode())
-    ack = json.loads(sock.makefile().readline()).get('status')
-    if ack == 'OK':
-        print("Key exchange complete.")
-    else:
-        print("Error in public‐channel exchange.")
+if __name__ == '__main__':
+    asyncio.run(main(int(os.environ.get('QKD_KEYS', 1)),
+                     os.environ.get('QKD_DISTILL', '0') not in ('', '0')))
@@ -1,62 +1,202 @@
 #!/usr/bin/env python3
-import socketserver
-import threading
-import json
-import random
+"""
+bob.py
+
+Bob's QKD server. One asyncio server keeps Alice's connections open and
+holds the state of every session in a dict keyed by session id, so any
+number of Alice clients can run concurrently, and each session can run
+round after round producing many keys (see engine.py for the frames).
+
+Run with --noise/--eve (or QKD_NOISE/QKD_EVE) to simulate a noisy or
+tapped channel; Alice then needs a distilled round (postprocess.py) to
+end up with the same keys as Bob.
+
+Every key Bob derives is appended to keys/bob_keys.txt as "<key id> <hex>",
+and the latest one is also written to keys/bob_raw_key.txt.
+"""
+import argparse
+import asyncio
+import hmac
+import logging
 import os
+import struct
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+import numpy as np
+
+import engine
+import postprocess
+
+logger = logging.getLogger(__name__)
+
+PORT = 6000
+# Sessions whose connection dropped are kept this long for Alice to resume
+SESSION_TTL = 300.0
+
+
+@dataclass
+class Session:
+    id: bytes
+    token: bytes                              # proves the right to resume the session
+    num_bits: int = 0
+    results: Optional[np.ndarray] = None      # Bob's measurements, awaiting MATCH or SIFT
+    sifted: Optional[np.ndarray] = None       # unpacked sifted bits of a distilled round
+    oracle: Optional[postprocess.ParityOracle] = None
+    keys_issued: int = 0
+    last_seen: float = field(default_factory=time.monotonic)
+
+    def key_id(self, n):
+        return f"{self.id.hex()}-{n}"
+
+
+class BobServer:
+    def __init__(self, keys_dir='keys', once=False, noise=0.0, eve=0.0):
+        self.sessions: Dict[bytes, Session] = {}
+        self.keys_dir = keys_dir
+        self.once = once
+        self.noise, self.eve = noise, eve
+        self.done = asyncio.Event()
+        os.makedirs(keys_dir, exist_ok=True)
+
+    def _open_session(self, hello):
+        """
+        The session a HELLO payload asks for, or None. Ids and resume tokens
+        are random and issued here; resuming needs both, since ids are not
+        secret (they are part of every key id).
+        """
+        now = time.monotonic()
+        for sid in [s for s, sess in self.sessions.items() if now - sess.last_seen > SESSION_TTL]:
+            del self.sessions[sid]
+        if not any(hello):
+            sid = os.urandom(engine.SESSION_ID_SIZE)
+            self.sessions[sid] = Session(sid, os.urandom(engine.RESUME_TOKEN_SIZE))
+            return self.sessions[sid]
+        session = self.sessions.get(hello[:engine.SESSION_ID_SIZE])
+        if session is None or not hmac.compare_digest(session.token,
+                                                      hello[engine.SESSION_ID_SIZE:]):
+            return None
+        return session
+
+    def _store(self, session, keys):
+        lines = []
+        for key in keys:
+            lines.append(f"{session.key_id(session.keys_issued)} {key}\n")
+            session.keys_issued += 1
+        with open(os.path.join(self.keys_dir, 'bob_keys.txt'), 'a') as f:
+            f.writelines(lines)
+        with open(os.path.join(self.keys_dir, 'bob_raw_key.txt'), 'w') as f:
+            f.write(keys[-1])
+
+    def _issue(self, session, keys):
+        if keys:
+            self._store(session, keys)
+        print(f"Bob derived {len(keys)} keys in session {session.id.hex()}")
+        return engine.encode_confirm(keys)
+
+    async def _distill(self, session, kind, payload):
+        """Answer one SIFT/SAMPLE/PARITY/AMPLIFY frame; returns (kind, payload)."""
+        if kind == engine.SIFT:
+            if session.results is None:
+                return engine.ERROR, b"SIFT before QUANTUM"
+            session.sifted = engine.select(session.results, engine.decode_packed(payload),
+                                           session.num_bits)
+            session.results, session.oracle = None, None
+            return engine.OK, b''
+        if session.sifted is None:
+            return engine.ERROR, b"No sifted key; SIFT first"
+        if kind == engine.SAMPLE:
+            flags = np.unpackbits(engine.decode_packed(payload),
+                                  count=len(session.sifted)).astype(bool)
+            disclosed = np.packbits(session.sifted[flags])
+            session.sifted = session.sifted[~flags]
+            session.oracle = postprocess.ParityOracle(session.sifted)
+            return engine.OK, disclosed.tobytes()
+        if kind == engine.PARITY:
+            seed, starts, ends = engine.decode_parity(payload)
+            if len(starts) and not (0 <= starts.min() and (starts <= ends).all()
+                                    and ends.max() <= len(session.sifted)):
+                return engine.ERROR, b"PARITY range outside the sifted key"
+            if session.oracle is None:
+                session.oracle = postprocess.ParityOracle(session.sifted)
+            return engine.OK, np.packbits(session.oracle.parities(seed, starts, ends)).tobytes()
+        key_size, out_bits, seed = engine.decode_amplify(payload)
+        key_bits = await asyncio.to_thread(postprocess.amplify, session.sifted, out_bits, seed)
+        session.sifted, session.oracle = None, None
+        return engine.OK, self._issue(session, engine.split_keys(key_bits, key_size))
+
+    async def handle(self, reader, writer):
+        session = None
+        try:
+            while True:
+                kind, payload = await engine.read_frame(reader)
+                if kind == engine.HELLO:
+                    session = self._open_session(payload)
+                    if session is None:
+                        engine.write_frame(writer, engine.ERROR, b"Unknown session or resume token")
+                    else:
+                        engine.write_frame(writer, engine.HELLO, session.id + session.token)
+                elif session is None:
+                    engine.write_frame(writer, engine.ERROR, b"HELLO first")
+                elif kind == engine.QUANTUM:
+                    # receive Alice’s qubits; Bob picks random bases & “measures”
+                    n, bits, bases = engine.decode_quantum(payload)
+                    bob_bases, session.results = await asyncio.to_thread(
+                        engine.measure, bits, bases, n, self.noise, self.eve)
+                    session.num_bits = n
+                    engine.write_frame(writer, engine.BASES, bob_bases.tobytes())
+                elif kind == engine.MATCH:
+                    if session.results is None:
+                        engine.write_frame(writer, engine.ERROR, b"MATCH before QUANTUM")
+                    else:
+                        key_size, mask = engine.decode_match(payload)
+                        key_bits = engine.select(session.results, mask, session.num_bits)
+                        keys = engine.split_keys(key_bits, key_size)
+                        session.results = None
+                        engine.write_frame(writer, engine.OK, self._issue(session, keys))
+                elif kind in (engine.SIFT, engine.SAMPLE, engine.PARITY, engine.AMPLIFY):
+                    engine.write_frame(writer, *await self._distill(session, kind, payload))
+                elif kind == engine.BYE:
+                    self.sessions.pop(session.id, None)
+                    engine.write_frame(writer, engine.OK)
+                    await writer.drain()
+                    if self.once:
+                        self.done.set()
+                    return
+                else:
+                    engine.write_frame(writer, engine.ERROR, f"Unknown frame {kind}".encode())
+                await writer.drain()
+                if session is not None:
+                    session.last_seen = time.monotonic()
+        except (ConnectionError, asyncio.IncompleteReadError) as e:
+            logger.info(f"Connection ended: {e}")
+        except (ValueError, struct.error) as e:
+            # Short or malformed frame payloads
+            logger.warning(f"Connection ended on a malformed frame: {e}")
+        finally:
+            writer.close()
+
+
+async def serve(host='0.0.0.0', port=PORT, keys_dir='keys', once=False, noise=0.0, eve=0.0):
+    bob = BobServer(keys_dir, once, noise, eve)
+    server = await asyncio.start_server(bob.handle, host, port)
+    print(f"Bob’s QKD server listening on port {port} …")
+    async with server:
+        if once:
+            await bob.done.wait()
+        else:
+            await server.serve_forever()
 
-# same TARGET and batch size, for clarity (though Bob just follows Alice’s MATCH list)
-TARGET_KEY_BITS = 256
-
-alice_bits  = []
-alice_bases = []
-bob_bases   = []
-bob_results = []
-
-class QKDHandler(socketserver.StreamRequestHandler):
-    def handle(self):
-        global alice_bits, alice_bases, bob_bases, bob_results
-        msg = json.loads(self.rfile.readline().decode().strip())
-
-        if msg['type'] == 'QUANTUM':
-            # receive Alice’s qubits
-            alice_bits  = msg['bits']
-            alice_bases = msg['bases']
-            # Bob picks random bases & “measures”
-            bob_bases   = [random.choice(['Z','X']) for _ in alice_bits]
-            bob_results = [
-                bit if a == b else random.randint(0,1)
-                for bit, a, b in zip(alice_bits, alice_bases, bob_bases)
-            ]
-            # reply with Bob’s bases
-            self.wfile.write((json.dumps({'bases': bob_bases}) + '\n').encode())
-
-        elif msg['type'] == 'MATCH':
-            matches = msg['matches']  # should be first 256 matching indices
-            # build Bob’s version of Alice’s 256 bits
-            key_bits = [bob_results[i] for i in matches]
-            print(f"Bob received {len(key_bits)} bits")
-
-            # pack to hex
-            hex_key = ''.join(
-                f"{sum(key_bits[i+j] << (7-j) for j in range(8)):02x}"
-                for i in range(0, TARGET_KEY_BITS, 8)
-            )
-            assert len(hex_key) == 64
-            print("Bob’s 64-char hex key:", hex_key)
-
-            # write to file
-            os.makedirs('keys', exist_ok=True)
-            with open('keys/bob_raw_key.txt', 'w') as f:
-                f.write(hex_key)
-            print("→ Written to keys/bob_raw_key.txt")
-
-            # ACK and shutdown
-            self.wfile.write((json.dumps({'status':'OK'}) + '\n').encode())
-            threading.Thread(target=self.server.shutdown).start()
 
 if __name__ == '__main__':
-    PORT = 6000
-    server = socketserver.ThreadingTCPServer(('0.0.0.0', PORT), QKDHandler)
-    print(f"Bob’s QKD server listening on port {PORT} …")
-    server.serve_forever()
+    p = argparse.ArgumentParser(description="Bob's QKD server")
+    p.add_argument('--port', type=int, default=PORT)
+    p.add_argument('--once', action='store_true', help='Exit after the first session ends')
+    p.add_argument('--noise', type=float, default=float(os.environ.get('QKD_NOISE', 0)),
+                   help='Probability that the channel flips a qubit')
+    p.add_argument('--eve', type=float, default=float(os.environ.get('QKD_EVE', 0)),
+                   help='Share of qubits intercepted and resent by Eve')
+    args = p.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(serve(port=args.port, once=args.once, noise=args.noise, eve=args.eve))
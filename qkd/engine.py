@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+engine.py
+
+Vectorised BB84 simulation shared by alice.py and bob.py.
+
+Qubit strings are packed uint8 arrays, 8 qubits per byte in np.packbits
+order (first qubit in the most significant bit); trailing pad bits are 0.
+A basis bit of 0 means Z and 1 means X. Sifting, measurement and key
+extraction are whole-array operations, so millions of qubits cost a few
+milliseconds instead of a Python loop per qubit.
+
+Peers exchange binary frames instead of JSON lists:
+    header      kind u8, payload length u32 (little-endian)
+    HELLO       to Bob: empty or all zero for a new session, or a session id
+                (16 bytes) and its resume token (32 bytes) to resume it;
+                from Bob: the session id and resume token, both random
+    QUANTUM     qubit count u64, Alice's bits, Alice's bases
+    BASES       Bob's bases
+    MATCH       key size in bits u32, mask of the positions that make up the keys
+    OK          empty, or after MATCH/AMPLIFY: key count u32, fingerprint of the keys
+    BYE         empty; ends the session
+    ERROR       UTF-8 message
+One connection carries one session, and a session can run any number of
+QUANTUM/MATCH rounds, each yielding as many keys as its mask selects.
+
+A distilled round (see postprocess.py) replaces MATCH with:
+    SIFT        mask of the sifted positions; Bob keeps his sifted bits
+    SAMPLE      mask over the sifted bits; Bob answers with his bits there,
+                and both sides drop them
+    PARITY      permutation seed u64, range count u32, starts u32[], ends u32[];
+                Bob answers with the packed parities of his bits
+    AMPLIFY     key size u32, output bits u32, hash seed (32 bytes); answered
+                like MATCH
+"""
+import asyncio
+import hashlib
+import os
+import struct
+
+import numpy as np
+
+QUANTUM, BASES, MATCH, OK, HELLO, BYE, ERROR = 1, 2, 3, 4, 5, 6, 7
+SIFT, SAMPLE, PARITY, AMPLIFY = 8, 9, 10, 11
+
+SESSION_ID_SIZE = 16
+RESUME_TOKEN_SIZE = 32
+
+_HEADER = struct.Struct('<BI')
+_COUNT = struct.Struct('<Q')
+_KEYS = struct.Struct('<I')
+_SEED = struct.Struct('<QI')
+_AMPLIFY = struct.Struct('<II32s')
+
+
+def packed_size(n):
+    return (n + 7) // 8
+
+
+def _trim(packed, n):
+    """Zero the pad bits after qubit n (in place); returns packed."""
+    if n % 8:
+        packed[-1] &= (0xFF << (8 - n % 8)) & 0xFF
+    return packed
+
+
+def random_packed(n):
+    """n uniformly random bits from the OS CSPRNG, packed."""
+    return _trim(np.frombuffer(os.urandom(packed_size(n)), dtype=np.uint8).copy(), n)
+
+
+def prepare(n):
+    """Alice's random bits and bases for n qubits."""
+    return random_packed(n), random_packed(n)
+
+
+def _bernoulli_packed(n, p, rng):
+    """Packed bits that are 1 with probability p (channel simulation, not key material)."""
+    return _trim(np.packbits(rng.random(n, dtype=np.float32) < p), n)
+
+
+def measure(bits, bases, n, noise=0.0, eve=0.0, rng=None):
+    """
+    Bob measures in random bases: matching bases reproduce the bit that
+    reached him, the others give a random result. Returns (Bob's bases, results).
+
+    The channel flips each result with probability noise. With probability
+    eve a qubit is intercepted and resent by Eve in a random basis, which
+    corrupts a quarter of the intercepted qubits that survive sifting.
+    """
+    if noise or eve:
+        rng = rng or np.random.default_rng()
+    if eve:
+        tapped = _bernoulli_packed(n, eve, rng)
+        eve_bases = random_packed(n)
+        wrong = bases ^ eve_bases
+        eve_bits = (bits & ~wrong) | (random_packed(n) & wrong)
+        bits = (eve_bits & tapped) | (bits & ~tapped)
+        bases = (eve_bases & tapped) | (bases & ~tapped)
+    bob_bases = random_packed(n)
+    same = ~(bases ^ bob_bases)
+    results = (bits & same) | (random_packed(n) & ~same)
+    if noise:
+        results ^= _bernoulli_packed(n, noise, rng)
+    return bob_bases, _trim(results, n)
+
+
+def sift_mask(alice_bases, bob_bases, n, limit=None):
+    """Packed mask of the positions measured in the same basis, at most limit of them."""
+    mask = _trim(~(alice_bases ^ bob_bases), n)
+    if limit is not None:
+        flags = np.unpackbits(mask, count=n)
+        positions = np.flatnonzero(flags)
+        if len(positions) > limit:
+            flags[positions[limit]:] = 0
+            mask = np.packbits(flags)
+    return mask
+
+
+def select(bits, mask, n):
+    """The bits at the positions set in mask, unpacked (one uint8 0/1 per bit)."""
+    flags = np.unpackbits(mask, count=n).astype(bool)
+    return np.unpackbits(bits, count=n)[flags]
+
+
+def count(mask):
+    """Number of positions set in a packed mask."""
+    return int(np.unpackbits(mask).sum())
+
+
+def to_hex(key_bits):
+    """Hex string of unpacked key bits (a multiple of 8 of them)."""
+    return np.packbits(key_bits).tobytes().hex()
+
+
+def split_keys(key_bits, key_size):
+    """Hex keys of key_size bits each from unpacked bits; leftover bits are dropped."""
+    count = len(key_bits) // key_size
+    packed = np.packbits(key_bits[:count * key_size]).tobytes()
+    step = key_size // 8
+    return [packed[i * step:(i + 1) * step].hex() for i in range(count)]
+
+
+def fingerprint(keys):
+    """Short digest both peers compare to confirm they derived the same keys."""
+    return hashlib.blake2b(''.join(keys).encode(), digest_size=16).digest()
+
+
+# ---- framing ----
+
+def encode_quantum(n, bits, bases):
+    return _COUNT.pack(n) + bits.tobytes() + bases.tobytes()
+
+
+def decode_quantum(payload):
+    """(n, bits, bases) from a QUANTUM payload."""
+    (n,) = _COUNT.unpack_from(payload)
+    size = packed_size(n)
+    body = np.frombuffer(payload, dtype=np.uint8, offset=_COUNT.size)
+    if len(body) != 2 * size:
+        raise ValueError("QUANTUM frame does not match its qubit count")
+    return n, body[:size].copy(), body[size:].copy()
+
+
+def decode_packed(payload):
+    return np.frombuffer(payload, dtype=np.uint8).copy()
+
+
+def encode_match(key_size, mask):
+    return _KEYS.pack(key_size) + mask.tobytes()
+
+
+def decode_match(payload):
+    """(key size in bits, mask) from a MATCH payload."""
+    (key_size,) = _KEYS.unpack_from(payload)
+    return key_size, np.frombuffer(payload, dtype=np.uint8, offset=_KEYS.size).copy()
+
+
+def encode_parity(seed, starts, ends):
+    return (_SEED.pack(seed, len(starts)) + np.asarray(starts, dtype='<u4').tobytes()
+            + np.asarray(ends, dtype='<u4').tobytes())
+
+
+def decode_parity(payload):
+    """(seed, starts, ends) from a PARITY payload."""
+    seed, count = _SEED.unpack_from(payload)
+    ranges = np.frombuffer(payload, dtype='<u4', offset=_SEED.size).astype(np.int64)
+    if len(ranges) != 2 * count:
+        raise ValueError("PARITY frame does not match its range count")
+    return seed, ranges[:count], ranges[count:]
+
+
+def encode_amplify(key_size, out_bits, seed):
+    return _AMPLIFY.pack(key_size, out_bits, seed)
+
+
+def decode_amplify(payload):
+    """(key size, output bits, seed) from an AMPLIFY payload."""
+    return _AMPLIFY.unpack(payload)
+
+
+def encode_confirm(keys):
+    return _KEYS.pack(len(keys)) + fingerprint(keys)
+
+
+def decode_confirm(payload):
+    """(key count, fingerprint) from the OK answering a MATCH."""
+    (count,) = _KEYS.unpack_from(payload)
+    return count, payload[_KEYS.size:]
+
+
+def send_frame(sock, kind, payload=b''):
+    sock.sendall(_HEADER.pack(kind, len(payload)) + payload)
+
+
+async def read_frame(reader):
+    """Read one frame from an asyncio StreamReader; returns (kind, payload)."""
+    try:
+        kind, length = _HEADER.unpack(await reader.readexactly(_HEADER.size))
+        return kind, await reader.readexactly(length)
+    except asyncio.IncompleteReadError:
+        raise ConnectionError("Connection closed mid-frame") from None
+
+
+def write_frame(writer, kind, payload=b''):
+    """Queue one frame on an asyncio StreamWriter (await writer.drain() to flush)."""
+    writer.write(_HEADER.pack(kind, len(payload)) + payload)
+
+
+def recv_frame(rfile):
+    """Read one frame from a binary file object; returns (kind, payload)."""
+    header = rfile.read(_HEADER.size)
+    if len(header) < _HEADER.size:
+        raise ConnectionError("Connection closed mid-frame")
+    kind, length = _HEADER.unpack(header)
+    payload = rfile.read(length)
+    if len(payload) < length:
+        raise ConnectionError("Connection closed mid-frame")
+    return kind, payload
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+pool.py
+
+Background QKD key pool. A refill loop keeps an AliceSession open to Bob and
+tops the pool up whenever it falls below a low watermark, so taking a key
+for the SSS split step is a local O(1) operation instead of a QKD exchange.
+
+The pool lives in one append-only log shared by every process using it
+(the refill daemon and any number of `take` calls), guarded by flock:
+    + <key id> <hex>        key added
+    - <key id> <consumer>   key served to consumer
+    g <count> -             keys generated and served before the last compaction
+    = <consumer> <count>    keys served to consumer before the last compaction
+Each process replays only the records appended since it last looked, and
+the log is compacted once it holds many more records than keys.
+
+Example:
+    $ python pool.py run --capacity 1024 --low 256 &
+    $ python pool.py take --consumer sss --out keys/alice_raw_key.txt
+"""
+import argparse
+import asyncio
+import fcntl
+import os
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+
+from alice import AliceSession, BOB_HOST, BOB_PORT
+
+POOL_PATH = os.path.join('keys', 'pool.log')
+
+
+class KeyPool:
+    """Bounded persistent pool of (key id, hex key); safe across processes."""
+
+    def __init__(self, path=POOL_PATH, capacity=1024):
+        self.path = path
+        self.capacity = capacity
+        self.generated = 0
+        self.served = Counter()
+        self._keys = OrderedDict()
+        self._records = 0
+        self._offset = 0
+        self._inode = None
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+    def _open_locked(self):
+        while True:
+            f = open(self.path, 'a+')
+            fcntl.flock(f, fcntl.LOCK_EX)
+            # A compaction may have replaced the file while we waited for the lock
+            if os.fstat(f.fileno()).st_ino == os.stat(self.path).st_ino:
+                return f
+            f.close()
+
+    @contextmanager
+    def _locked(self):
+        with self._open_locked() as f:
+            try:
+                self._sync(f)
+                yield f
+                f.flush()
+                os.fsync(f.fileno())
+                self._offset = f.tell()
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _sync(self, f):
+        # Another process may have compacted the log into a new file
+        inode = os.fstat(f.fileno()).st_ino
+        if inode != self._inode:
+            self._inode, self._offset, self._records = inode, 0, 0
+            self._keys.clear()
+            self.generated, self.served = 0, Counter()
+        f.seek(self._offset)
+        for line in f:
+            kind, a, b = line.split()
+            self._records += 1
+            if kind == '+':
+                self._keys[a] = b
+                self.generated += 1
+            elif kind == '-':
+                self._keys.pop(a, None)
+                self.served[b] += 1
+            elif kind == 'g':
+                self.generated += int(a)
+            elif kind == '=':
+                self.served[a] += int(b)
+        self._offset = f.tell()
+
+    def level(self):
+        """Number of keys available."""
+        with self._locked():
+            return len(self._keys)
+
+    def add(self, keys):
+        """Add (key id, hex) pairs up to capacity; returns how many were kept."""
+        with self._locked() as f:
+            keys = list(keys)[:max(0, self.capacity - len(self._keys))]
+            f.writelines(f"+ {key_id} {key}\n" for key_id, key in keys)
+            for key_id, key in keys:
+                self._keys[key_id] = key
+            self.generated += len(keys)
+            self._records += len(keys)
+            return len(keys)
+
+    def take(self, consumer='default'):
+        """Remove and return the oldest (key id, hex). Raises LookupError if empty."""
+        with self._locked() as f:
+            if not self._keys:
+                raise LookupError("Key pool is empty")
+            key_id, key = self._keys.popitem(last=False)
+            f.write(f"- {key_id} {consumer}\n")
+            self.served[consumer] += 1
+            self._records += 1
+            if self._records > 4 * max(len(self._keys), 64):
+                self._compact()
+            return key_id, key
+
+    def stats(self):
+        with self._locked():
+            return {'available': len(self._keys), 'capacity': self.capacity,
+                    'generated': self.generated, 'served': dict(self.served)}
+
+    def _compact(self):
+        # Called with the lock held; the new file gets a new inode
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as out:
+            out.write(f"g {self.generated - len(self._keys)} -\n")
+            out.writelines(f"= {consumer} {count}\n" for consumer, count in self.served.items())
+            out.writelines(f"+ {key_id} {key}\n" for key_id, key in self._keys.items())
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(tmp, self.path)
+        self._inode = None
+
+
+async def refill(pool, low_watermark, batch, host=BOB_HOST, port=BOB_PORT,
+                 interval=0.5, stop=None, distill=False):
+    """
+    Keep pool at or above low_watermark, generating up to batch keys per
+    round over one long-lived session. Runs until stop (an asyncio.Event) is set.
+    Pool calls take the flock and fsync, so they run in a worker thread to
+    keep the event loop (and the QKD session on it) responsive.
+    """
+    session = None
+    backoff = interval
+    try:
+        while stop is None or not stop.is_set():
+            level = await asyncio.to_thread(pool.level)
+            if level >= low_watermark:
+                await asyncio.sleep(interval)
+                continue
+            try:
+                if session is None:
+                    session = AliceSession(host, port, distill=distill)
+                    await session.open()
+                keys = await session.keys(min(batch, pool.capacity - level))
+                await asyncio.to_thread(pool.add, keys)
+                print(f"Pool refilled to {level + len(keys)} keys")
+                backoff = interval
+            except (OSError, ConnectionError, RuntimeError) as e:
+                print(f"Refill failed: {e}")
+                session = None
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+    finally:
+        if session is not None:
+            await session.close()
+
+
+if __name__ == '__main__':
+    p = argparse.ArgumentParser(description="QKD key pool")
+    p.add_argument('--pool', default=POOL_PATH, help='Pool log file')
+    p.add_argument('--capacity', type=int, default=1024, help='Most keys kept in the pool')
+    sub = p.add_subparsers(dest='cmd', required=True)
+    run = sub.add_parser('run', help='Keep the pool filled in the background')
+    run.add_argument('--low', type=int, default=256, help='Refill below this many keys')
+    run.add_argument('--batch', type=int, default=256, help='Keys generated per QKD round')
+    run.add_argument('--host', default=BOB_HOST)
+    run.add_argument('--port', type=int, default=BOB_PORT)
+    run.add_argument('--distill', action='store_true',
+                     default=os.environ.get('QKD_DISTILL', '0') not in ('', '0'),
+                     help='Reconcile and privacy-amplify every round (noisy channel)')
+    take = sub.add_parser('take', help='Serve one key from the pool')
+    take.add_argument('--consumer', default='default', help='Name charged for the key')
+    take.add_argument('--out', default=os.path.join('keys', 'alice_raw_key.txt'))
+    sub.add_parser('stats', help='Show pool level and consumption')
+    args = p.parse_args()
+
+    pool = KeyPool(args.pool, args.capacity)
+    if args.cmd == 'run':
+        asyncio.run(refill(pool, args.low, args.batch, args.host, args.port,
+                           distill=args.distill))
+    elif args.cmd == 'take':
+        key_id, key = pool.take(args.consumer)
+        with open(args.out, 'w') as f:
+            f.write(key)
+        print(f"Key {key_id} → {args.out}")
+    else:
+        print(pool.stats())
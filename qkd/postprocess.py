@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+postprocess.py
+
+Turns the sifted bits of Alice and Bob into identical, private keys:
+
+    1. QBER estimation: both sides disclose a random sample of sifted bits,
+       compare them and drop them. Above QBER_ABORT the round is abandoned.
+    2. Cascade reconciliation: Alice corrects her bits towards Bob's
+       (reverse reconciliation). Each pass shuffles the key with a seeded
+       interleaver, compares block parities, and bisects odd blocks to
+       find an error. A corrected bit flips the parity of its blocks in
+       the other passes, and those blocks are bisected in turn.
+    3. Privacy amplification: both sides hash the whole key with the same
+       random Toeplitz matrix. The product is a convolution, computed with
+       one FFT, and the output is shortened by the estimated leak to Eve
+       and the parities disclosed.
+
+Bob's side only answers parity queries (ParityOracle), and his bits never
+change, so his block parities can be cached per permutation. Alice's side
+talks to him through an async query callable, either over the network or
+in-process. Key bits are unpacked uint8 arrays (one 0/1 per bit); full
+blocks are compared on packed bytes and bisection uses prefix parities, so
+every step is a whole-array operation.
+"""
+import hashlib
+import math
+
+import numpy as np
+
+# Abort when the estimated error rate leaves no secret key (BB84, one-way)
+QBER_ABORT = 0.11
+# Share of the sifted bits disclosed to estimate the QBER
+SAMPLE_FRACTION = 0.1
+PASSES = 4
+# QBER assumed when sizing Cascade blocks if the sample shows fewer errors
+MIN_QBER = 0.005
+# Bits removed on top of the estimated leak (finite-size security margin)
+SECURITY_MARGIN = 128
+
+_PARITY = np.array([bin(i).count('1') & 1 for i in range(256)], dtype=np.uint8)
+
+
+def binary_entropy(p):
+    if p <= 0 or p >= 1:
+        return 0.0
+    return -p * math.log2(p) - (1 - p) * math.log2(1 - p)
+
+
+def sample_mask(n, fraction=SAMPLE_FRACTION, rng=None):
+    """Boolean mask choosing about fraction of n positions for QBER estimation."""
+    rng = rng or np.random.default_rng()
+    return rng.random(n) < fraction
+
+
+def estimate_qber(mine, theirs):
+    """(QBER, upper bound) from the disclosed sample; the bound adds three standard errors."""
+    k = len(mine)
+    if not k:
+        return 0.0, 0.5
+    qber = float(np.count_nonzero(mine != theirs)) / k
+    q = max(qber, 1.0 / k)
+    return qber, min(0.5, qber + 3 * math.sqrt(q * (1 - q) / k))
+
+
+def permutation(n, seed):
+    """
+    The shuffle of one Cascade pass, i -> (a*i + b) mod n with a coprime to
+    n drawn from seed; seed 0 is the identity. Channel errors are
+    independent, so an interleaver that scatters neighbours is enough, and
+    it costs a fraction of a full random permutation.
+    """
+    if seed == 0 or n < 2:
+        return None
+    rng = np.random.default_rng(seed)
+    while True:
+        a = int(rng.integers(n // 4, 3 * n // 4 + 1)) | 1
+        if math.gcd(a, n) == 1:
+            break
+    b = int(rng.integers(0, n))
+    return (np.arange(n, dtype=np.int64) * a + b) % n
+
+
+def _prefix(bits):
+    prefix = np.zeros(len(bits) + 1, dtype=np.uint8)
+    np.bitwise_xor.accumulate(bits, out=prefix[1:])
+    return prefix
+
+
+def block_parities(bits, size):
+    """Parity of every size-bit block (size a multiple of 8), on packed bytes."""
+    packed = np.packbits(bits)
+    width = size // 8
+    pad = -len(packed) % width
+    if pad:
+        packed = np.concatenate([packed, np.zeros(pad, dtype=np.uint8)])
+    return _PARITY[np.bitwise_xor.reduce(packed.reshape(-1, width), axis=1)]
+
+
+class ParityOracle:
+    """Bob's side of Cascade: parities of ranges of his (fixed) bits."""
+
+    def __init__(self, bits):
+        self.bits = bits
+        self._prefixes = {}
+
+    def parities(self, seed, starts, ends):
+        prefix = self._prefixes.get(seed)
+        if prefix is None:
+            perm = permutation(len(self.bits), seed)
+            prefix = _prefix(self.bits if perm is None else self.bits[perm])
+            self._prefixes[seed] = prefix
+        return prefix[ends] ^ prefix[starts]
+
+
+def _first_block(qber, n):
+    # A clean sample does not mean a clean key: keep blocks finite
+    size = int(0.73 / max(qber, MIN_QBER))
+    return max(8, min(-(-size // 8) * 8, -(-n // 8) * 8))
+
+
+def _gather(bits, perm, starts, ends):
+    """Prefix parities (one row per range) of the given ranges of the permuted bits."""
+    lengths = ends - starts
+    offsets = np.arange(lengths.max())
+    valid = offsets < lengths[:, None]
+    idx = np.where(valid, starts[:, None] + offsets, starts[:, None])
+    sub = np.where(valid, bits[idx if perm is None else perm[idx]], 0).astype(np.uint8)
+    prefix = np.zeros((len(starts), len(offsets) + 1), dtype=np.uint8)
+    np.bitwise_xor.accumulate(sub, axis=1, out=prefix[:, 1:])
+    return prefix
+
+
+async def _bisect(bits, perm, seed, starts, ends, query):
+    """
+    Find and flip one differing bit in each odd-parity range, all ranges
+    at once. Returns (corrected positions, parities disclosed).
+    """
+    if not len(starts):
+        return np.empty(0, dtype=np.int64), 0
+    prefix = _gather(bits, perm, starts, ends)
+    rows = np.arange(len(starts))
+    lo, hi = np.zeros(len(starts), dtype=np.int64), ends - starts
+    disclosed = 0
+    while True:
+        active = np.flatnonzero(hi - lo > 1)
+        if not len(active):
+            break
+        r, s, e = rows[active], lo[active], hi[active]
+        mid = (s + e) // 2
+        theirs = await query(seed, starts[active] + s, starts[active] + mid)
+        disclosed += len(active)
+        left = (prefix[r, mid] ^ prefix[r, s]) != theirs
+        lo[active] = np.where(left, s, mid)
+        hi[active] = np.where(left, mid, e)
+    positions = starts + lo
+    if perm is not None:
+        positions = perm[positions]
+    bits[positions] ^= 1
+    return positions, disclosed
+
+
+async def cascade(bits, qber, query, rng=None, passes=PASSES):
+    """
+    Correct bits (in place) to match the other side, whose range parities
+    `await query(seed, starts, ends)` returns. Returns the parities disclosed.
+    """
+    n = len(bits)
+    rng = rng or np.random.default_rng()
+    size = _first_block(qber, n)
+    disclosed = 0
+    history = []        # per pass: seed, permutation, inverse, block size, their parities
+    for p in range(passes):
+        seed = 0 if p == 0 else int(rng.integers(1, 1 << 63))
+        perm = permutation(n, seed)
+        inverse = None
+        if perm is not None:
+            inverse = np.empty_like(perm)
+            inverse[perm] = np.arange(n)
+        block = size << p
+        starts = np.arange(0, n, block, dtype=np.int64)
+        ends = np.minimum(starts + block, n)
+        theirs = await query(seed, starts, ends)
+        disclosed += len(starts)
+        history.append((seed, perm, inverse, block, theirs))
+        mine = block_parities(bits if perm is None else bits[perm], block)
+        odd = np.flatnonzero(mine != theirs)
+        fixed, d = await _bisect(bits, perm, seed, starts[odd], ends[odd], query)
+        disclosed += d
+        # Cascade: re-check the blocks of every pass that hold a corrected bit
+        while fixed.size:
+            found = []
+            for seed_q, perm_q, inverse_q, block_q, theirs_q in history:
+                pos = fixed if inverse_q is None else inverse_q[fixed]
+                blocks = np.unique(pos // block_q)
+                s = blocks * block_q
+                e = np.minimum(s + block_q, n)
+                odd = _gather(bits, perm_q, s, e)[:, -1] != theirs_q[blocks]
+                f, d = await _bisect(bits, perm_q, seed_q, s[odd], e[odd], query)
+                disclosed += d
+                if f.size:
+                    found.append(f)
+            fixed = np.concatenate(found) if found else np.empty(0, dtype=np.int64)
+    return disclosed
+
+
+def secure_length(n, qber_bound, disclosed, margin=SECURITY_MARGIN):
+    """Bits left after removing Eve's estimated information and the disclosed parities."""
+    return max(0, int(n * (1 - binary_entropy(qber_bound))) - disclosed - margin)
+
+
+def toeplitz(bits, out_len, seed_bits):
+    """
+    Multiply bits (n of them) by the out_len x n Toeplitz matrix whose
+    diagonals are seed_bits (n + out_len - 1 of them), over GF(2), as an
+    FFT convolution. Also takes one block per row (2-D arrays).
+    """
+    n = bits.shape[-1]
+    # Outputs n-1 .. n+out_len-2 of the convolution do not wrap around
+    size = 1 << (n + out_len - 2).bit_length()
+    conv = np.fft.irfft(np.fft.rfft(bits.astype(np.float64), size)
+                        * np.fft.rfft(seed_bits.astype(np.float64), size), size)
+    return (np.rint(conv[..., n - 1:n - 1 + out_len]).astype(np.int64) & 1).astype(np.uint8)
+
+
+def amplify(bits, out_bits, seed):
+    """
+    Hash all of bits down to out_bits with one Toeplitz matrix drawn from
+    seed, which is public and shared by both sides. Every output bit
+    depends on every key bit, so the leak is accounted once for the whole
+    key. The float64 convolution still rounds to exact counts: for an
+    8 Mbit key its error stays around 1e-9.
+    """
+    n = len(bits)
+    if not n or not out_bits:
+        return np.empty(0, dtype=np.uint8)
+    rng = np.random.default_rng(int.from_bytes(hashlib.sha256(seed).digest(), 'big'))
+    seed_bits = rng.integers(0, 2, n + out_bits - 1, dtype=np.uint8)
+    return toeplitz(bits, out_bits, seed_bits)
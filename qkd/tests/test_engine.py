@@ -0,0 +1,54 @@
+# tests/test_engine.py
+import io
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import engine
+
+
+def test_sifted_keys_agree():
+    n = 100_003
+    bits, bases = engine.prepare(n)
+    bob_bases, results = engine.measure(bits, bases, n)
+    mask = engine.sift_mask(bases, bob_bases, n)
+    alice_key = engine.select(bits, mask, n)
+    assert np.array_equal(alice_key, engine.select(results, mask, n))
+    # About half the bases match
+    assert abs(len(alice_key) - n / 2) < 5 * np.sqrt(n)
+    # Pad bits past qubit n stay clear
+    assert bits[-1] & 0x1F == 0 and results[-1] & 0x1F == 0
+
+
+def test_sift_mask_limit_and_hex():
+    n = 64
+    alice_bases = np.zeros(8, dtype=np.uint8)
+    bob_bases = np.array([0x0F] * 8, dtype=np.uint8)
+    mask = engine.sift_mask(alice_bases, bob_bases, n, limit=10)
+    assert engine.count(mask) == 10
+    assert list(np.flatnonzero(np.unpackbits(mask))) == [0, 1, 2, 3, 8, 9, 10, 11, 16, 17]
+    assert engine.to_hex(np.array([1, 0, 1, 0, 0, 1, 0, 1], dtype=np.uint8)) == 'a5'
+
+
+def test_frames_roundtrip():
+    n = 21
+    bits, bases = engine.prepare(n)
+
+    class Sink:
+        data = b''
+
+        def sendall(self, chunk):
+            self.data += chunk
+
+    sink = Sink()
+    engine.send_frame(sink, engine.QUANTUM, engine.encode_quantum(n, bits, bases))
+    engine.send_frame(sink, engine.OK)
+    stream = io.BytesIO(sink.data)
+    kind, payload = engine.recv_frame(stream)
+    got_n, got_bits, got_bases = engine.decode_quantum(payload)
+    assert (kind, got_n) == (engine.QUANTUM, n)
+    assert np.array_equal(got_bits, bits) and np.array_equal(got_bases, bases)
+    assert engine.recv_frame(stream) == (engine.OK, b'')
@@ -0,0 +1,54 @@
+# tests/test_pool.py
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from bob import BobServer
+from pool import KeyPool, refill
+
+
+def test_pool_is_bounded_persistent_and_accounted(tmp_path):
+    path = str(tmp_path / 'pool.log')
+    pool = KeyPool(path, capacity=100)
+    assert pool.add((f"s-{i}", f"{i:064x}") for i in range(150)) == 100
+    served = [pool.take('sss') for _ in range(90)]
+    assert served[0] == ('s-0', f"{0:064x}")
+    # A second process sees the same pool, even across compactions
+    other = KeyPool(path, capacity=100)
+    assert other.take('aes') == ('s-90', f"{90:064x}")
+    assert pool.stats() == {'available': 9, 'capacity': 100, 'generated': 100,
+                            'served': {'sss': 90, 'aes': 1}}
+    for _ in range(9):
+        other.take('aes')
+    with pytest.raises(LookupError):
+        pool.take()
+    assert KeyPool(path).stats()['served'] == {'sss': 90, 'aes': 10}
+
+
+def test_refill_keeps_pool_above_watermark(tmp_path):
+    async def run():
+        bob = BobServer(str(tmp_path / 'bob'))
+        server = await asyncio.start_server(bob.handle, '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        pool = KeyPool(str(tmp_path / 'pool.log'), capacity=64)
+        stop = asyncio.Event()
+        async with server:
+            task = asyncio.create_task(refill(pool, 32, 16, '127.0.0.1', port, interval=0.01, stop=stop))
+            while await asyncio.to_thread(pool.level) < 32:
+                await asyncio.sleep(0.01)
+            taken = [await asyncio.to_thread(pool.take, 'sss') for _ in range(20)]
+            while await asyncio.to_thread(pool.level) < 32:
+                await asyncio.sleep(0.01)
+            stop.set()
+            await task
+        return taken, bob
+
+    taken, bob = asyncio.run(run())
+    assert len({key for _, key in taken}) == 20
+    with open(tmp_path / 'bob' / 'bob_keys.txt') as f:
+        bob_keys = dict(line.split() for line in f)
+    assert all(bob_keys[key_id] == key for key_id, key in taken)
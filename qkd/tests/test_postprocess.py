@@ -0,0 +1,102 @@
+# tests/test_postprocess.py
+import asyncio
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import engine
+import postprocess
+from alice import AliceSession
+from bob import BobServer
+
+
+def _channel(n, noise=0.0, eve=0.0):
+    bits, bases = engine.prepare(n)
+    bob_bases, results = engine.measure(bits, bases, n, noise=noise, eve=eve)
+    mask = engine.sift_mask(bases, bob_bases, n)
+    return engine.select(bits, mask, n), engine.select(results, mask, n)
+
+
+def test_cascade_reconciles_noisy_key():
+    alice, bob = _channel(400_000, noise=0.03)
+    qber, _ = postprocess.estimate_qber(alice, bob)
+    assert 0.02 < qber < 0.04
+    oracle = postprocess.ParityOracle(bob.copy())
+
+    async def query(seed, starts, ends):
+        return oracle.parities(seed, starts, ends)
+
+    disclosed = asyncio.run(postprocess.cascade(alice, qber, query))
+    assert np.array_equal(alice, bob)
+    # Close to the Shannon limit of h(qber) bits per key bit
+    assert disclosed < 1.5 * postprocess.binary_entropy(qber) * len(bob)
+
+
+def test_toeplitz_fft_matches_matrix_product():
+    rng = np.random.default_rng(7)
+    n, m = 300, 120
+    bits = rng.integers(0, 2, n, dtype=np.uint8)
+    seed_bits = rng.integers(0, 2, n + m - 1, dtype=np.uint8)
+    matrix = np.array([[seed_bits[i - j + n - 1] for j in range(n)] for i in range(m)])
+    assert np.array_equal(postprocess.toeplitz(bits, m, seed_bits), matrix @ bits % 2)
+
+    key = rng.integers(0, 2, 200_001, dtype=np.uint8)
+    out = postprocess.amplify(key, 50_000, b'\x01' * 32)
+    assert len(out) == 50_000
+    assert np.array_equal(out, postprocess.amplify(key, 50_000, b'\x01' * 32))
+    assert abs(int(out.sum()) - 25_000) < 1_000
+    # One matrix over the whole key: flipping any key bit, even the last one,
+    # changes about half of the output
+    for i in (0, 100_000, 200_000):
+        key[i] ^= 1
+        changed = int(np.count_nonzero(out != postprocess.amplify(key, 50_000, b'\x01' * 32)))
+        key[i] ^= 1
+        assert abs(changed - 25_000) < 1_000
+
+
+def test_eavesdropper_raises_qber():
+    alice, bob = _channel(200_000, eve=1.0)
+    qber, bound = postprocess.estimate_qber(alice, bob)
+    assert abs(qber - 0.25) < 0.01
+    assert qber > postprocess.QBER_ABORT
+    # Even an ideal reconciliation would disclose h(qber) bits per key bit
+    leak = int(postprocess.binary_entropy(qber) * len(bob))
+    assert postprocess.secure_length(len(bob), bound, leak) == 0
+
+
+def _serve(tmp_path, noise=0.0, eve=0.0):
+    async def start():
+        bob = BobServer(str(tmp_path), noise=noise, eve=eve)
+        server = await asyncio.start_server(bob.handle, '127.0.0.1', 0)
+        return server, server.sockets[0].getsockname()[1]
+    return start
+
+
+def test_distilled_session_over_noisy_channel(tmp_path):
+    async def run():
+        server, port = await _serve(tmp_path, noise=0.04)()
+        async with server:
+            async with AliceSession('127.0.0.1', port, distill=True) as session:
+                keys = await session.keys(40)
+                return keys, session.qber
+
+    keys, qber = asyncio.run(run())
+    assert len(keys) == 40 and 0.02 < qber < 0.06
+    with open(tmp_path / 'bob_keys.txt') as f:
+        assert dict(keys) == dict(line.split() for line in f)
+
+
+def test_distilled_session_aborts_on_eavesdropper(tmp_path):
+    async def run():
+        server, port = await _serve(tmp_path, eve=1.0)()
+        async with server:
+            async with AliceSession('127.0.0.1', port, distill=True) as session:
+                await session.keys(1)
+
+    with pytest.raises(RuntimeError, match="QBER"):
+        asyncio.run(run())
+    assert not os.path.exists(tmp_path / 'bob_keys.txt')
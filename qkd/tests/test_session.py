@@ -0,0 +1,98 @@
+# tests/test_session.py
+import asyncio
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import engine
+from alice import AliceSession
+from bob import BobServer
+
+
+def test_concurrent_sessions_share_keys(tmp_path):
+    async def run():
+        bob = BobServer(str(tmp_path))
+        server = await asyncio.start_server(bob.handle, '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+
+        async def client(rounds):
+            async with AliceSession('127.0.0.1', port) as session:
+                keys = []
+                for _ in range(rounds):
+                    keys += await session.keys(50)
+                return keys
+
+        async with server:
+            results = await asyncio.gather(client(2), client(3))
+        return results, bob
+
+    (first, second), bob = asyncio.run(run())
+    assert len(first) == 100 and len(second) == 150
+    assert not bob.sessions  # BYE drops the session state
+    with open(tmp_path / 'bob_keys.txt') as f:
+        bob_keys = dict(line.split() for line in f)
+    assert dict(first + second) == bob_keys
+    assert all(len(key) == 64 for key in bob_keys.values())
+
+
+def test_bob_drops_connection_on_malformed_frame(tmp_path, caplog):
+    async def run():
+        bob = BobServer(str(tmp_path))
+        server = await asyncio.start_server(bob.handle, '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            engine.write_frame(writer, engine.HELLO, bytes(engine.SESSION_ID_SIZE))
+            await engine.read_frame(reader)
+            # Too short to hold the qubit count
+            engine.write_frame(writer, engine.QUANTUM, b"\x01\x02")
+            await writer.drain()
+            rest = await reader.read()
+            writer.close()
+        return rest
+
+    with caplog.at_level(logging.INFO):
+        assert asyncio.run(run()) == b""
+    assert "malformed frame" in caplog.text
+    assert "Unhandled exception" not in caplog.text
+
+
+def test_only_the_session_owner_can_resume_it(tmp_path):
+    async def hello(port, payload):
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        engine.write_frame(writer, engine.HELLO, payload)
+        await writer.drain()
+        reply = await engine.read_frame(reader)
+        writer.close()
+        return reply
+
+    async def run():
+        bob = BobServer(str(tmp_path))
+        server = await asyncio.start_server(bob.handle, '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            owner = AliceSession('127.0.0.1', port)
+            await owner.open()
+            first = await owner.keys(10)
+            # Ids are public (they are in every key id); the token is not
+            sid = owner.session_id
+            replies = [await hello(port, sid),
+                       await hello(port, sid + bytes(engine.RESUME_TOKEN_SIZE)),
+                       await hello(port, b"\x01" * engine.SESSION_ID_SIZE)]
+            # The owner drops the connection and resumes on a new one
+            owner._writer.close()
+            resumed = AliceSession('127.0.0.1', port)
+            resumed.session_id, resumed.resume_token = sid, owner.resume_token
+            resumed.keys_issued = owner.keys_issued
+            await resumed.open()
+            second = await resumed.keys(10)
+            await resumed.close()
+        return replies, resumed.session_id == sid, first + second
+
+    replies, same, keys = asyncio.run(run())
+    assert all(kind == engine.ERROR for kind, _ in replies)
+    assert same
+    with open(tmp_path / 'bob_keys.txt') as f:
+        assert dict(line.split() for line in f) == dict(keys)
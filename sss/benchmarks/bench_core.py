@@ -0,0 +1,195 @@
+"""
+bench_core.py
+
+Micro-benchmarks for the SSS core: _modinv, _lagrange_interpolate,
+split_secret/split_secrets and recover_secret/recover_secrets/decode_secret,
+swept over threshold, num_shares, batch size and the number of shares
+handed to recovery. Each case is timed over --repeats samples; a sample
+runs the operation enough times to last about --sample-time seconds.
+
+Rows use the `experiment,metric,seconds` schema of statistics/: experiment
+is the sample number, metric the case and seconds the time per operation
+in that sample. Case names carry the sweep point: split_secrets_t3_n5_b1000
+is threshold 3, 5 shares, batches of 1000, and k is the number of shares
+given to recovery. A summary with ops/sec, the median and spread of the
+sample means and peak traced memory per case goes to stderr.
+
+A sample is the mean over many calls, so the p90/p99 columns are
+percentiles of --repeats sample means, not of single-operation latencies
+(with 20 repeats, p99 is simply the slowest sample). They show run-to-run
+noise, not tail latency.
+
+With --baseline, the median sample mean of every case is compared with a
+previous run and the exit status is 1 if any case got slower by more than
+--tolerance.
+
+Usage (from sss/):
+    python3 -m benchmarks.bench_core --out core.csv
+    python3 -m benchmarks.bench_core --thresholds 3 --num-shares 5 --baseline core.csv
+"""
+import argparse
+import csv
+import os
+import random
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+
+SSS_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, SSS_ROOT)
+
+from src.logic.shamir import (  # noqa: E402
+    PRIME, split_secret, split_secrets, recover_secret, recover_secrets, decode_secret,
+    _lagrange_interpolate, _modinv,
+)
+
+# Percentiles of the per-sample means, reported as spread next to the median
+SPREAD_PERCENTILES = (90, 99)
+
+
+def _ints(list_arg):
+    return [int(v) for v in list_arg.split(',') if v]
+
+
+def _hex_keys(count, rng):
+    return [format(rng.getrandbits(256), '064x') for _ in range(count)]
+
+
+def cases(thresholds, num_shares, batches, rng):
+    """Yield (metric, ops per call, callable) for every point of the sweep."""
+    values = [rng.randrange(1, PRIME) for _ in range(64)]
+    yield '_modinv', len(values), lambda: [_modinv(v) for v in values]
+    key = _hex_keys(1, rng)[0]
+    for t in thresholds:
+        y_s = [rng.randrange(PRIME) for _ in range(t)]
+        yield f'_lagrange_interpolate_t{t}', 1, lambda t=t, y_s=y_s: \
+            _lagrange_interpolate(0, list(range(1, t + 1)), y_s)
+        for n in num_shares:
+            if t > n:
+                continue
+            shares = split_secret(key, t, n)
+            yield f'split_secret_t{t}_n{n}', 1, lambda t=t, n=n: split_secret(key, t, n)
+            # Share subsets: exactly t (Lagrange), or more (checked by Berlekamp-Welch)
+            for k in sorted({t, min(n, t + 2), n}):
+                subset = shares[:k]
+                if k == t:
+                    yield f'recover_secret_t{t}_k{k}', 1, \
+                        lambda t=t, subset=subset: recover_secret(subset, t)
+                else:
+                    yield f'decode_secret_t{t}_k{k}', 1, \
+                        lambda t=t, subset=subset: decode_secret(subset, t)
+            for b in batches:
+                keys = _hex_keys(b, rng)
+                batch = split_secrets(keys, t, n)
+                yield f'split_secrets_t{t}_n{n}_b{b}', b, \
+                    lambda t=t, n=n, keys=keys: split_secrets(keys, t, n)
+                yield f'recover_secrets_t{t}_n{n}_b{b}', b, \
+                    lambda t=t, batch=batch: recover_secrets(batch, t)
+
+
+def _calibrate(func, sample_time):
+    """Calls per sample so that one sample lasts about sample_time."""
+    calls = 1
+    while True:
+        t0 = time.perf_counter()
+        for _ in range(calls):
+            func()
+        elapsed = time.perf_counter() - t0
+        if elapsed >= sample_time / 4 or calls >= 1 << 20:
+            return max(1, int(calls * sample_time / max(elapsed, 1e-9)))
+        calls *= 4
+
+
+def _peak_memory(func):
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def percentile(samples, q):
+    """Nearest-rank percentile of samples (0 < q <= 100)."""
+    ordered = sorted(samples)
+    rank = max(1, -(-q * len(ordered) // 100))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def run(thresholds, num_shares, batches, repeats, sample_time, seed=1):
+    """Returns (rows, summary): CSV rows and {metric: stats} per case."""
+    rng = random.Random(seed)
+    rows, summary = [], {}
+    for metric, ops, func in cases(thresholds, num_shares, batches, rng):
+        calls = _calibrate(func, sample_time)
+        samples = []
+        for exp in range(1, repeats + 1):
+            t0 = time.perf_counter()
+            for _ in range(calls):
+                func()
+            per_op = (time.perf_counter() - t0) / (calls * ops)
+            samples.append(per_op)
+            rows.append((exp, metric, per_op))
+        median = percentile(samples, 50)
+        stats = {'ops_per_sec': 1.0 / median, 'median': median, 'peak_bytes': _peak_memory(func)}
+        stats.update({f'mean_p{q}': percentile(samples, q) for q in SPREAD_PERCENTILES})
+        summary[metric] = stats
+    return rows, summary
+
+
+def print_summary(summary, out=sys.stderr):
+    head = (f"{'case':<40} {'ops/sec':>12} {'median (us)':>11}"
+            + ''.join(f" {f'mean p{q}':>11}" for q in SPREAD_PERCENTILES))
+    print(head + f" {'peak KiB':>10}", file=out)
+    for metric, s in summary.items():
+        cells = f" {s['median'] * 1e6:>11.2f}" + ''.join(
+            f" {s[f'mean_p{q}'] * 1e6:>11.2f}" for q in SPREAD_PERCENTILES)
+        print(f"{metric:<40} {s['ops_per_sec']:>12.0f}{cells} {s['peak_bytes'] / 1024:>10.1f}",
+              file=out)
+
+
+def load_medians(path):
+    """Median seconds per metric of an experiment,metric,seconds CSV."""
+    samples = defaultdict(list)
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f):
+            samples[row['metric']].append(float(row['seconds']))
+    return {metric: percentile(values, 50) for metric, values in samples.items()}
+
+
+def regressions(summary, baseline, tolerance):
+    """(metric, baseline s, current s) for every case slower than baseline * (1 + tolerance)."""
+    return [(metric, baseline[metric], s['median']) for metric, s in summary.items()
+            if metric in baseline and s['median'] > baseline[metric] * (1 + tolerance)]
+
+
+if __name__ == '__main__':
+    p = argparse.ArgumentParser(description="SSS core micro-benchmarks")
+    p.add_argument('--thresholds', type=_ints, default=[2, 3, 5, 10])
+    p.add_argument('--num-shares', type=_ints, default=[5, 10, 20])
+    p.add_argument('--batches', type=_ints, default=[100, 1000], help='Batch sizes for *_secrets')
+    p.add_argument('--repeats', type=int, default=20, help='Samples per case')
+    p.add_argument('--sample-time', type=float, default=0.02, help='Target seconds per sample')
+    p.add_argument('--out', default=None, help='CSV file to write (default: stdout)')
+    p.add_argument('--baseline', default=None, help='Earlier CSV to compare medians with')
+    p.add_argument('--tolerance', type=float, default=0.25, help='Allowed slow-down vs baseline')
+    args = p.parse_args()
+
+    baseline = load_medians(args.baseline) if args.baseline else None
+    rows, summary = run(args.thresholds, args.num_shares, args.batches, args.repeats,
+                        args.sample_time)
+    out = open(args.out, 'w', newline='') if args.out else sys.stdout
+    writer = csv.writer(out)
+    writer.writerow(['experiment', 'metric', 'seconds'])
+    for exp, metric, seconds in rows:
+        writer.writerow([exp, metric, f"{seconds:.9f}"])
+    if args.out:
+        out.close()
+    print_summary(summary)
+    if baseline is not None:
+        slower = regressions(summary, baseline, args.tolerance)
+        for metric, before, now in slower:
+            print(f"REGRESSION {metric}: {before * 1e6:.2f} us -> {now * 1e6:.2f} us",
+                  file=sys.stderr)
+        sys.exit(1 if slower else 0)
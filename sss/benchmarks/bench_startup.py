@@ -0,0 +1,117 @@
+"""
+bench_startup.py
+
+Start-up benchmark for the SSS package: compares a cold CLI invocation (new
+interpreter per split, as main.sh does) with a request to the resident
+service. Rows use the `experiment,metric,seconds` schema of statistics/.
+
+With --check it also fails (exit status 1) on a start-up regression: when
+`import src.cli` loads one of LAZY_MODULES, or its median cost over a bare
+interpreter exceeds --max-import-ms.
+
+Usage (from sss/):
+    python3 -m benchmarks.bench_startup --runs 10 --out startup.csv
+    python3 -m benchmarks.bench_startup --runs 10 --check
+"""
+import argparse
+import csv
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import http.client
+
+SSS_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, SSS_ROOT)
+
+HEX_KEY = "8d11e51fd3fd2773611133ab0f2d22938d1092f4f21f1b0b3e1dcb8cda6e4f4b"
+
+# Modules only some commands need; importing src.cli must not load them
+LAZY_MODULES = (
+    'concurrent.futures', 'dataclasses', 'json', 'src.logic.container', 'src.logic.envelope',
+    'src.logic.refresh', 'src.service',
+)
+# Default budget for the median cost of `import src.cli` over `python -c pass`
+# (about 12 ms with cached bytecode before the container and envelope code)
+MAX_IMPORT_MS = 25.0
+
+
+def _time_cmd(cmd):
+    t0 = time.perf_counter()
+    subprocess.run(cmd, cwd=SSS_ROOT, check=True, capture_output=True)
+    return time.perf_counter() - t0
+
+
+def run(runs):
+    from src.service import SSSService, make_server
+
+    service = SSSService(workers=1)
+    server = make_server(service, port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    conn = http.client.HTTPConnection('127.0.0.1', server.server_address[1])
+    body = json.dumps({'secret': HEX_KEY, 'threshold': 3, 'num_shares': 5})
+
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        inbox, outbox = os.path.join(tmp, 'inbox'), os.path.join(tmp, 'outbox')
+        os.makedirs(inbox)
+        with open(os.path.join(inbox, 'key.txt'), 'w') as f:
+            f.write(HEX_KEY)
+        for exp in range(1, runs + 1):
+            rows.append((exp, 'python_bare', _time_cmd([sys.executable, '-c', 'pass'])))
+            rows.append((exp, 'import_src_cli', _time_cmd([sys.executable, '-c', 'import src.cli'])))
+            rows.append((exp, 'cli_split_cold', _time_cmd(
+                [sys.executable, '-m', 'src.cli', 'split', '--inbox', inbox, '--outbox', outbox,
+                 '--threshold', '3', '--num-shares', '5'])))
+            t0 = time.perf_counter()
+            conn.request('POST', '/split', body)
+            conn.getresponse().read()
+            rows.append((exp, 'service_split', time.perf_counter() - t0))
+    conn.close()
+    server.shutdown()
+    server.server_close()
+    service.close()
+    return rows
+
+
+def check(rows, max_import_ms=MAX_IMPORT_MS):
+    """Start-up regressions found in rows (and in a fresh `import src.cli`), as messages."""
+    problems = []
+    probe = (f"import sys, src.cli; print(' '.join(m for m in {LAZY_MODULES!r} "
+             f"if m in sys.modules))")
+    loaded = subprocess.run([sys.executable, '-c', probe], cwd=SSS_ROOT, check=True,
+                            capture_output=True, text=True).stdout.split()
+    if loaded:
+        problems.append(f"import src.cli loads {', '.join(loaded)}")
+    bare = sorted(s for _, metric, s in rows if metric == 'python_bare')
+    cli = sorted(s for _, metric, s in rows if metric == 'import_src_cli')
+    overhead = (cli[len(cli) // 2] - bare[len(bare) // 2]) * 1000
+    if overhead > max_import_ms:
+        problems.append(f"import src.cli costs {overhead:.1f} ms, budget {max_import_ms:.1f} ms")
+    return problems
+
+
+if __name__ == '__main__':
+    p = argparse.ArgumentParser(description="SSS cold start vs resident service benchmark")
+    p.add_argument('--runs', type=int, default=10, help='Number of experiments')
+    p.add_argument('--out', default=None, help='CSV file to write (default: stdout)')
+    p.add_argument('--check', action='store_true', help='Exit with status 1 on a start-up regression')
+    p.add_argument('--max-import-ms', type=float, default=MAX_IMPORT_MS,
+                   help='Median import src.cli budget over a bare interpreter, for --check')
+    args = p.parse_args()
+    rows = run(args.runs)
+    out = open(args.out, 'w', newline='') if args.out else sys.stdout
+    writer = csv.writer(out)
+    writer.writerow(['experiment', 'metric', 'seconds'])
+    for exp, metric, seconds in rows:
+        writer.writerow([exp, metric, f"{seconds:.6f}"])
+    if args.out:
+        out.close()
+    if args.check:
+        problems = check(rows, args.max_import_ms)
+        for problem in problems:
+            print(f"[regression] {problem}", file=sys.stderr)
+        sys.exit(1 if problems else 0)
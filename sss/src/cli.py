@@ -2,54 +2,517 @@ import argparse
 import sys
 import os
 import logging
-from src.inbox.io import get_hex_files
-from src.logic.shamir import split_secret, recover_secret
+from contextlib import ExitStack
+from src.inbox.io import get_hex_files, get_container_files
+from src.logic.shamir import (
+    LEGACY_PRIME, PRIME, ShareBatch, validate_secret, split_secrets, recover_secrets,
+    decode_secret, verify_shares, format_commitments, parse_commitments,
+)
 from src.outbox.io import save_text
+# The container, envelope and refresh modules are imported by the commands
+# that use them, so that every other command starts faster
 
 logging.basicConfig(level=logging.INFO, format='[%(levelname)s] %(message)s')
 
+# Number of secrets handed to a worker at a time
+CHUNK_SIZE = 512
+
+
+def _read(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read().strip()
+
+
+def _chunks(items, size=CHUNK_SIZE):
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def _run_chunks(func, chunks, workers):
+    """Apply func to every chunk, in a process pool if workers > 1."""
+    if workers <= 1 or len(chunks) <= 1:
+        return [func(*chunk) for chunk in chunks]
+    # Imported lazily: multiprocessing dominates the CLI's start-up time
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(func, *zip(*chunks)))
+
+
+def _split_batch(paths, threshold, num_shares, verifiable=False):
+    """
+    Split every secret file in paths. Returns the names of the split secrets,
+    their ShareBatch and (name, error) for every file that was skipped.
+    """
+    names = [os.path.basename(p) for p in paths]
+    secrets = [_read(p) for p in paths]
+    try:
+        return names, split_secrets(secrets, threshold, num_shares, verifiable), []
+    except ValueError:
+        pass
+    # At least one file is invalid: split the valid ones, report the rest
+    valid, skipped = [], []
+    for name, secret in zip(names, secrets):
+        try:
+            validate_secret(secret)
+            valid.append((name, secret))
+        except ValueError as e:
+            skipped.append((name, str(e)))
+    batch = split_secrets([secret for _, secret in valid], threshold, num_shares, verifiable)
+    return [name for name, _ in valid], batch, skipped
+
+
+def _split_chunk(paths, threshold, num_shares, outbox, verifiable=False):
+    """
+    Split every secret file in paths to text shares, plus a commit_{name}
+    file of Feldman commitments if verifiable; returns (name, error) per file.
+    """
+    names, batch, skipped = _split_batch(paths, threshold, num_shares, verifiable)
+    for s, name in enumerate(names):
+        for idx, share in batch.shares(s):
+            save_text(share, f"share_{idx}_{name}", outbox)
+        if verifiable:
+            save_text(format_commitments(batch.commitments[s]), f"commit_{name}", outbox)
+    return [(name, None) for name in names] + skipped
+
+
+def _split_chunk_columns(paths, threshold, num_shares):
+    names, batch, skipped = _split_batch(paths, threshold, num_shares)
+    return names, batch.columns, skipped
+
+
+def _verify_groups(groups, commitments):
+    """
+    Read the shares of every group and drop those that fail their secret's
+    commitments, all secrets in one batch. Returns (name, shares, bad indices) per group.
+    """
+    read = [(name, [(idx, _read(path)) for idx, path in entries]) for name, entries in groups]
+    items, owners = [], []
+    for g, (name, shares) in enumerate(read):
+        if name in commitments:
+            items.extend((share, commitments[name]) for share in shares)
+            owners.extend((g, i) for i in range(len(shares)))
+    failed = {}
+    for k in verify_shares(items):
+        g, i = owners[k]
+        failed.setdefault(g, set()).add(i)
+    return [(name, [s for i, s in enumerate(shares) if i not in failed.get(g, ())],
+             sorted(shares[i][0] for i in failed.get(g, ())))
+            for g, (name, shares) in enumerate(read)]
+
+
+def _combine_chunk(groups, threshold, outbox, single, commitments=None, prime=PRIME):
+    """
+    Recover every secret in groups, a list of (name, [(idx, path), ...]),
+    from shares modulo prime. Shares of secrets in commitments
+    ({name: [C_0, ...]}) are verified first.
+    Returns (name, bad share indices, error) per secret.
+    """
+    results = []
+    exact, exact_names, exact_failed = [], [], []
+    for name, shares, failed in _verify_groups(groups, commitments or {}):
+        if len(shares) < threshold:
+            results.append((name, failed, f"Need {threshold} shares, found {len(shares)}"))
+            continue
+        if len(shares) == threshold:
+            exact.append(shares)
+            exact_names.append(name)
+            exact_failed.append(failed)
+            continue
+        try:
+            recovered, bad = decode_secret(shares, threshold, prime)
+        except ValueError as e:
+            results.append((name, failed, str(e)))
+            continue
+        save_text(recovered, _recovered_name(name, single), outbox)
+        results.append((name, sorted(failed + bad), None))
+    try:
+        recovered_all = recover_secrets(exact, threshold, prime)
+    except ValueError as e:
+        return results + [(name, failed, str(e)) for name, failed in zip(exact_names, exact_failed)]
+    for name, failed, recovered in zip(exact_names, exact_failed, recovered_all):
+        save_text(recovered, _recovered_name(name, single), outbox)
+        results.append((name, failed, None))
+    return results
+
+
+def _recovered_name(name, single):
+    # A lone secret keeps the historical recovered.txt name used by main.sh
+    return "recovered.txt" if single else f"recovered_{name}"
+
+
+def _split_containers(args, paths):
+    """Split all secrets and write one share_{x}.sssc container per x-coordinate."""
+    from src.outbox.io import save_container
+    chunks = [(chunk, args.threshold, args.num_shares) for chunk in _chunks(paths)]
+    ids, columns = [], [[] for _ in range(args.num_shares)]
+    for names, chunk_columns, skipped in _run_chunks(_split_chunk_columns, chunks, args.workers):
+        for name, error in skipped:
+            logging.warning(f"Skipping {name}: {error}")
+        ids.extend(names)
+        for col, part in zip(columns, chunk_columns):
+            col.extend(part)
+    if not ids:
+        return
+    for j, col in enumerate(columns):
+        x = j + 1
+        save_container(ids, args.threshold, [x], [col], f"share_{x}.sssc", args.outbox)
+    logging.info(f"{args.num_shares} shares generated for {len(ids)} secrets")
+
+
+def _combine_containers(args, paths):
+    """Recover every secret held in the share containers found in the inbox."""
+    from src.inbox.io import open_container
+    with ExitStack() as stack:
+        opened = []
+        for path in paths:
+            try:
+                view = stack.enter_context(open_container(path))
+                view.ids()  # Checks the whole index before any share is used
+            except ValueError as e:
+                logging.warning(f"Skipping {os.path.basename(path)}: {e}")
+                continue
+            opened.append((path, view))
+        views = [view for _, view in opened]
+        for path, view in opened:
+            if view.threshold != args.threshold:
+                logging.error(f"{os.path.basename(path)} was split with threshold "
+                              f"{view.threshold}, not {args.threshold}")
+                return
+        moduli = {view.modulus for view in views}
+        if len(moduli) > 1:
+            # Shares of different fields never combine to the secret
+            logging.error(f"Containers hold shares of {len(moduli)} different fields: "
+                          + ", ".join(format(m, 'x') for m in sorted(moduli)))
+            return
+        prime = moduli.pop() if moduli else PRIME
+        # Take each x-coordinate from the first container that holds it
+        sources = {}
+        for view in views:
+            for j, x in enumerate(view.x_s):
+                sources.setdefault(x, (view, j))
+        if len(sources) < args.threshold:
+            logging.error(f"Need {args.threshold} shares, found {len(sources)}")
+            return
+        all_ids = [view.ids() for view in views]
+        if all(view_ids == all_ids[0] for view_ids in all_ids[1:]):
+            # Same secrets in the same order: recover column-wise
+            ids = all_ids[0]
+            x_s = sorted(sources)[:args.threshold]
+            batch = ShareBatch(threshold=args.threshold, x_s=x_s,
+                               columns=[view.column(j) for view, j in (sources[x] for x in x_s)])
+            recovered = recover_secrets(batch, args.threshold, prime)
+        else:
+            # Gather each secret's shares from every container that holds it
+            held = [set(view_ids) for view_ids in all_ids]
+            ids, per_secret = [], []
+            for secret_id in sorted(set().union(*held)):
+                shares = {}
+                for view, view_ids in zip(views, held):
+                    if secret_id in view_ids:
+                        for x, y in zip(view.x_s, view.values(secret_id)):
+                            shares.setdefault(x, format(y, 'x'))
+                if len(shares) < args.threshold:
+                    logging.error(f"Cannot recover {secret_id}: need {args.threshold} shares, "
+                                  f"found {len(shares)}")
+                    continue
+                ids.append(secret_id)
+                per_secret.append(sorted(shares.items())[:args.threshold])
+            recovered = recover_secrets(per_secret, args.threshold, prime)
+    single = len(ids) == 1
+    for name, secret in zip(ids, recovered):
+        save_text(secret, _recovered_name(name, single), args.outbox)
+    logging.info(f"{len(ids)} secrets recovered successfully.")
+
 
 def cmd_split(args):
     paths = get_hex_files(args.inbox)
     if not paths:
         logging.error(f"Inbox empty: {args.inbox}")
         return
-    for path in paths:
-        name = os.path.basename(path)
-        with open(path, 'r', encoding='utf-8') as f:
-            secret = f.read().strip()
-        try:
-            shares = split_secret(secret, args.threshold, args.num_shares)
-            logging.info(f"{len(shares)} shares generated for {name}")
-        except ValueError as e:
-            logging.warning(f"Skipping {name}: {e}")
-            continue
-        for idx, share in shares:
-            save_text(share, f"share_{idx}_{name}", args.outbox)
+    verifiable = getattr(args, 'verifiable', False)
+    if args.format == 'container':
+        if verifiable:
+            logging.error("--verifiable writes commit_{name} files and needs --format text")
+            return
+        _split_containers(args, paths)
+        return
+    chunks = [(chunk, args.threshold, args.num_shares, args.outbox, verifiable)
+              for chunk in _chunks(paths)]
+    for results in _run_chunks(_split_chunk, chunks, args.workers):
+        for name, error in results:
+            if error:
+                logging.warning(f"Skipping {name}: {error}")
+            else:
+                logging.info(f"{args.num_shares} shares generated for {name}")
+
+
+def _share_key(name):
+    """
+    (index, secret name) of a share_{idx}_{secret name} file, used to group
+    shares by the secret they belong to; None (with a warning for malformed
+    share names) for other files.
+    """
+    if not name.startswith('share_'):
+        return None
+    parts = name.split('_', 2)
+    if len(parts) < 3 or not parts[1].isdigit():
+        logging.warning(f"Skipping {name}: unexpected share file name")
+        return None
+    return int(parts[1]), parts[2]
 
 
 def cmd_combine(args):
+    if args.format == 'container':
+        paths = get_container_files(args.inbox)
+        if not paths:
+            logging.error(f"Need {args.threshold} shares, found 0")
+            return
+        _combine_containers(args, paths)
+        return
+    legacy = getattr(args, 'legacy_field', False)
     paths = get_hex_files(args.inbox)
-    shares = []
+    groups, commitments, unverifiable = {}, {}, set()
     for path in paths:
         name = os.path.basename(path)
-        if not name.startswith('share_'):
+        if name.startswith('commit_'):
+            secret = name[len('commit_'):]
+            try:
+                if legacy:
+                    raise ValueError("commitments cannot verify shares of the legacy field")
+                commitments[secret] = parse_commitments(_read(path))
+            except ValueError as e:
+                # Recovering without the checks the commitments ask for would hide the mismatch
+                logging.error(f"Skipping {secret}: {name}: {e}")
+                unverifiable.add(secret)
+            continue
+        key = _share_key(name)
+        if key is not None:
+            groups.setdefault(key[1], []).append((key[0], path))
+    for secret in unverifiable:
+        groups.pop(secret, None)
+    if not groups:
+        logging.error(f"Need {args.threshold} shares, found 0")
+        return
+    single = len(groups) == 1
+    items = sorted(groups.items())
+    chunks = [(chunk, args.threshold, args.outbox, single,
+               {name: commitments[name] for name, _ in chunk if name in commitments},
+               LEGACY_PRIME if legacy else PRIME)
+              for chunk in _chunks(items)]
+    for results in _run_chunks(_combine_chunk, chunks, args.workers):
+        for name, bad, error in results:
+            if error:
+                logging.error(f"Recovery error for {name}: {error}")
+                continue
+            if bad:
+                logging.warning(f"Corrupted shares {bad} ignored for {name}")
+            logging.info(f"Secret {name} recovered successfully.")
+
+
+def _refresh_chunk(items, threshold, apply, commit_paths=None):
+    """
+    Delta record entries (encoded, without a header) for the shares of
+    every (secret name, [(idx, path)]) in items, plus commitment factors
+    for the secrets in commit_paths ({name: path of its commit_ file}).
+    With apply, the share and commit_ files are rewritten with the deltas
+    applied. Returns (entries, count, errors).
+    """
+    from src.logic.refresh import (
+        apply_commitment_delta, apply_delta, commitment_deltas, encode_delta_entries,
+        refresh_deltas,
+    )
+    commit_paths = commit_paths or {}
+    x_s = sorted({idx for _, shares in items for idx, _ in shares})
+    column = {x: j for j, x in enumerate(x_s)}
+    columns, levels = refresh_deltas(len(items), threshold, x_s, coeffs=True)
+    entries, errors, updates = [], [], []
+    for s, (name, shares) in enumerate(items):
+        changes = [(path, columns[column[idx]][s], apply_delta) for idx, path in shares]
+        if name in commit_paths:
+            changes.append((commit_paths[name], commitment_deltas(levels, s), apply_commitment_delta))
+        if apply:
+            # Check the whole secret first, so it is refreshed completely or not at all
+            try:
+                refreshed = [apply_change(_read(path), delta) for path, delta, apply_change in changes]
+            except ValueError as e:
+                errors.append((name, str(e)))
+                continue
+            updates.extend(zip((path for path, _, _ in changes), refreshed))
+        entries.extend((os.path.basename(path), delta) for path, delta, _ in changes)
+    for path, text in updates:
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+    return encode_delta_entries(entries), len(entries), errors
+
+
+def cmd_refresh(args):
+    """
+    Write one delta record that refreshes every share in the inbox (only
+    the share file names are needed), and the Feldman commitments of the
+    secrets that have a commit_ file there. With --apply the inbox files
+    are refreshed in place too.
+    """
+    from src.logic.refresh import encode_delta_header, new_record_id
+    groups, commit_paths = {}, {}
+    for path in get_hex_files(args.inbox):
+        name = os.path.basename(path)
+        if name.startswith('commit_'):
+            commit_paths[name[len('commit_'):]] = path
             continue
-        idx = int(name.split('_')[1])
-        with open(path, 'r', encoding='utf-8') as f:
-            share = f.read().strip()
-        shares.append((idx, share))
-        if len(shares) >= args.threshold:
-            break
-    if len(shares) < args.threshold:
-        logging.error(f"Need {args.threshold} shares, found {len(shares)}")
+        key = _share_key(name)
+        if key is not None:
+            groups.setdefault(key[1], []).append((key[0], path))
+    if not groups:
+        logging.error(f"No share files in {args.inbox}")
+        return
+    items = sorted(groups.items())
+    chunks = [(chunk, args.threshold, args.apply,
+               {name: commit_paths[name] for name, _ in chunk if name in commit_paths})
+              for chunk in _chunks(items)]
+    results = _run_chunks(_refresh_chunk, chunks, args.workers)
+    for _, _, errors in results:
+        for name, error in errors:
+            logging.warning(f"Skipping {name}: {error}")
+    record_id = new_record_id()
+    os.makedirs(args.outbox, exist_ok=True)
+    path = os.path.join(args.outbox, f"deltas_{record_id.hex()[:16]}.sssd")
+    total = sum(count for _, count, _ in results)
+    with open(path, 'wb') as f:
+        f.write(encode_delta_header(total, record_id))
+        for entries, _, _ in results:
+            f.write(entries)
+    logging.info(f"Delta record {path} refreshes {total} files of {len(items)} secrets"
+                 + (" (inbox files refreshed)" if args.apply else ""))
+
+
+def _key_name(file_id):
+    return f"key_{file_id}.txt"
+
+
+def cmd_envelope(args):
+    """Split one master key once and write a manifest covering every file in --files."""
+    from src.logic.envelope import create_envelope, open_envelope
+    if not os.path.isdir(args.files):
+        logging.error(f"No such directory: {args.files}")
         return
+    file_ids = sorted(f for f in os.listdir(args.files)
+                      if os.path.isfile(os.path.join(args.files, f)))
     try:
-        recovered = recover_secret(shares, args.threshold)
-        logging.info("Secret recovered successfully.")
-        save_text(recovered, "recovered.txt", args.outbox)
-    except ValueError as e:
+        manifest, shares = create_envelope(_read(args.key), file_ids, args.threshold,
+                                           args.num_shares, master=os.path.basename(args.key))
+    except (OSError, ValueError) as e:
+        logging.error(f"Cannot split master key {args.key}: {e}")
+        return
+    for idx, share in shares:
+        save_text(share, f"share_{idx}_{manifest.master}", args.outbox)
+    save_text(manifest.to_json(), args.manifest_name, args.outbox)
+    if args.keys_out:
+        envelope = open_envelope(manifest, shares[:args.threshold])
+        for file_id, key in envelope.data_keys().items():
+            save_text(key, _key_name(file_id), args.keys_out)
+    logging.info(f"{args.num_shares} shares of {manifest.master} protect {len(file_ids)} files")
+
+
+def cmd_derive(args):
+    """Recover the master key from the shares in the inbox and write per-file data keys."""
+    from src.logic.envelope import Manifest, open_envelope
+    try:
+        manifest = Manifest.from_json(_read(args.manifest))
+    except (OSError, ValueError) as e:
+        logging.error(f"Cannot read manifest {args.manifest}: {e}")
+        return
+    prefix, suffix = "share_", f"_{manifest.master}"
+    shares = []
+    for path in get_hex_files(args.inbox):
+        name = os.path.basename(path)
+        idx = name[len(prefix):-len(suffix)]
+        if name.startswith(prefix) and name.endswith(suffix) and idx.isdigit():
+            shares.append((int(idx), _read(path)))
+    if len(shares) < manifest.threshold:
+        logging.error(f"Need {manifest.threshold} shares, found {len(shares)}")
+        return
+    try:
+        envelope = open_envelope(manifest, sorted(shares))
+        keys = envelope.data_keys(args.file or None)
+    except (KeyError, ValueError) as e:
         logging.error(f"Recovery error: {e}")
+        return
+    for file_id, key in keys.items():
+        save_text(key, _key_name(file_id), args.outbox)
+    logging.info(f"{len(keys)} data keys derived from {manifest.master}")
+
+
+def _byte_share_name(x, name):
+    return f"share_{x}_{name}.gf256"
+
+
+def cmd_split_files(args):
+    """Split every file in --files (any content or size) into GF(2^8) share streams."""
+    from src.logic.gf256 import split_stream
+    if not os.path.isdir(args.files):
+        logging.error(f"No such directory: {args.files}")
+        return
+    names = sorted(f for f in os.listdir(args.files) if os.path.isfile(os.path.join(args.files, f)))
+    os.makedirs(args.outbox, exist_ok=True)
+    for name in names:
+        outs = [os.path.join(args.outbox, _byte_share_name(x, name))
+                for x in range(1, args.num_shares + 1)]
+        try:
+            with ExitStack() as stack:
+                src = stack.enter_context(open(os.path.join(args.files, name), 'rb'))
+                dsts = [stack.enter_context(open(out, 'wb')) for out in outs]
+                size = split_stream(src, dsts, args.threshold)
+        except ValueError as e:
+            # Invalid parameters: the same for every file
+            for out in outs:
+                os.remove(out)
+            logging.error(f"Cannot split {name}: {e}")
+            return
+        logging.info(f"{args.num_shares} shares generated for {name} ({size} bytes)")
+
+
+def cmd_combine_files(args):
+    """Recover every file whose share_{x}_{name}.gf256 streams are in the inbox."""
+    from src.logic.gf256 import combine_stream
+    groups = {}
+    if os.path.isdir(args.inbox):
+        for f in sorted(os.listdir(args.inbox)):
+            key = _share_key(f[:-len('.gf256')]) if f.endswith('.gf256') else None
+            if key is not None:
+                groups.setdefault(key[1], []).append(os.path.join(args.inbox, f))
+    if not groups:
+        logging.error(f"No .gf256 share streams in {args.inbox}")
+        return
+    os.makedirs(args.outbox, exist_ok=True)
+    for name, paths in sorted(groups.items()):
+        out = os.path.join(args.outbox, name)
+        try:
+            with ExitStack() as stack:
+                srcs = [stack.enter_context(open(path, 'rb')) for path in paths]
+                dst = stack.enter_context(open(out, 'wb'))
+                size = combine_stream(srcs, dst)
+        except ValueError as e:
+            os.remove(out)
+            logging.error(f"Recovery error for {name}: {e}")
+            continue
+        logging.info(f"{name} recovered from {len(paths)} shares ({size} bytes)")
+
+
+def cmd_serve(args):
+    # Imported lazily so split/combine do not pay for the HTTP server modules
+    from src.service import serve
+    token = os.environ.get('SSS_SERVICE_TOKEN')
+    if args.token_file:
+        try:
+            token = _read(args.token_file)
+        except OSError as e:
+            logging.error(f"Cannot read token file {args.token_file}: {e}")
+            return
+    try:
+        serve(host=args.host, port=args.port, socket_path=args.socket, workers=args.workers,
+              token=token, allow_remote=args.allow_remote)
+    except ValueError as e:
+        logging.error(str(e))
+        sys.exit(1)
 
 
 if __name__ == '__main__':
@@ -62,17 +525,80 @@ if __name__ == '__main__':
     sp.add_argument('--outbox', default='data/outbox', help='Directory to write shares')
     sp.add_argument('--threshold', type=int, required=True, help='Min shares to reconstruct')
     sp.add_argument('--num-shares', type=int, required=True, help='Total number of shares to generate')
+    sp.add_argument('--workers', type=int, default=1, help='Worker processes for large inboxes')
+    sp.add_argument('--format', choices=['text', 'container'], default='text',
+                    help='One hex file per share, or one packed .sssc container per share index')
+    sp.add_argument('--verifiable', action='store_true',
+                    help='Also write Feldman commitments (commit_{name}); combine then checks every share')
     sp.set_defaults(func=cmd_split)
 
     # combine command
-    cb = sub.add_parser('combine', help='Combine shares to recover secret')
+    cb = sub.add_parser('combine', help='Combine shares to recover every secret in the inbox')
     cb.add_argument('--inbox', default='data/inbox', help='Directory with share files')
-    cb.add_argument('--outbox', default='data/outbox', help='Directory to write recovered secret')
+    cb.add_argument('--outbox', default='data/outbox', help='Directory to write recovered secrets')
     cb.add_argument('--threshold', type=int, required=True, help='Threshold used for splitting')
+    cb.add_argument('--workers', type=int, default=1, help='Worker processes for large inboxes')
+    cb.add_argument('--format', choices=['text', 'container'], default='text',
+                    help='Read hex share files or packed .sssc containers')
+    cb.add_argument('--legacy-field', action='store_true',
+                    help='Combine text shares split modulo 2^257 - 1 (before the prime field); '
+                         'containers name their own field')
     cb.set_defaults(func=cmd_combine)
 
+    # envelope mode: one split master key, per-file derived data keys
+    ev = sub.add_parser('envelope', help='Split one master key for a whole directory of files')
+    ev.add_argument('--key', default='data/inbox/alice_raw_key.txt', help='64-hex master key file')
+    ev.add_argument('--files', required=True, help='Directory of files to protect')
+    ev.add_argument('--outbox', default='data/outbox', help='Directory to write shares and manifest')
+    ev.add_argument('--manifest-name', default='manifest.json', help='Manifest file name in the outbox')
+    ev.add_argument('--keys-out', default=None, help='Also write key_<file>.txt data keys here')
+    ev.add_argument('--threshold', type=int, required=True, help='Min shares to reconstruct')
+    ev.add_argument('--num-shares', type=int, required=True, help='Total number of shares to generate')
+    ev.set_defaults(func=cmd_envelope)
+
+    dv = sub.add_parser('derive', help='Recover the master key and derive per-file data keys')
+    dv.add_argument('--inbox', default='data/inbox', help='Directory with the master key shares')
+    dv.add_argument('--manifest', default='data/inbox/manifest.json', help='Envelope manifest')
+    dv.add_argument('--outbox', default='data/outbox', help='Directory to write key_<file>.txt')
+    dv.add_argument('--file', action='append', help='Only derive this file\'s key (repeatable)')
+    dv.set_defaults(func=cmd_derive)
+
+    # proactive refresh: re-randomise stored shares without recovering the secrets
+    rf = sub.add_parser('refresh', help='Write a delta record that refreshes shares in place')
+    rf.add_argument('--inbox', default='data/inbox', help='Directory with the share files to refresh')
+    rf.add_argument('--outbox', default='data/outbox', help='Directory to write the delta record')
+    rf.add_argument('--threshold', type=int, required=True, help='Threshold used for splitting')
+    rf.add_argument('--apply', action='store_true', help='Also refresh the share files in the inbox')
+    rf.add_argument('--workers', type=int, default=1, help='Worker processes for large inboxes')
+    rf.set_defaults(func=cmd_refresh)
+
+    # arbitrary files (e.g. data_at_rest), shared byte by byte over GF(2^8); needs numpy
+    sf = sub.add_parser('split-files', help='Split every file in a directory into byte share streams')
+    sf.add_argument('--files', required=True, help='Directory of files to split')
+    sf.add_argument('--outbox', default='data/outbox', help='Directory to write share_{x}_{file}.gf256')
+    sf.add_argument('--threshold', type=int, required=True, help='Min shares to reconstruct')
+    sf.add_argument('--num-shares', type=int, required=True, help='Total number of shares to generate')
+    sf.set_defaults(func=cmd_split_files)
+
+    cf = sub.add_parser('combine-files', help='Recover files from their byte share streams')
+    cf.add_argument('--inbox', default='data/inbox', help='Directory with share_{x}_{file}.gf256')
+    cf.add_argument('--outbox', default='data/outbox', help='Directory to write the recovered files')
+    cf.set_defaults(func=cmd_combine_files)
+
+    # serve command
+    sv = sub.add_parser('serve', help='Run a resident split/recover service')
+    sv.add_argument('--host', default='127.0.0.1', help='Address to listen on')
+    sv.add_argument('--port', type=int, default=8700, help='TCP port to listen on')
+    sv.add_argument('--socket', default=None, help='Listen on this Unix socket instead of TCP')
+    sv.add_argument('--workers', type=int, default=1, help='Persistent worker processes for batches')
+    sv.add_argument('--token-file', default=None,
+                    help='Require this bearer token (default: $SSS_SERVICE_TOKEN, if set)')
+    sv.add_argument('--allow-remote', action='store_true',
+                    help='Allow a non-loopback --host; a token is then required')
+    sv.set_defaults(func=cmd_serve)
+
     args = parser.parse_args()
     if not hasattr(args, 'func'):
         parser.print_help()
         sys.exit(1)
-    args.func(args)
\ No newline at end of file
+    args.func(args)
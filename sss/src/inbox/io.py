@@ -1,12 +1,45 @@
 import os
-from typing import List
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Iterator, List
+
+if TYPE_CHECKING:
+    from src.logic.container import ContainerView
 
 def get_hex_files(inbox_dir: str = "data/inbox") -> List[str]:
     """
     Scan data/inbox and return paths to all .txt files containing 64-hex secrets.
     """
-    if not os.path.isdir(inbox_dir):
-        os.makedirs(inbox_dir)
+    os.makedirs(inbox_dir, exist_ok=True)
     return [os.path.join(inbox_dir, f)
             for f in sorted(os.listdir(inbox_dir))
-            if f.lower().endswith('.txt')]
\ No newline at end of file
+            if f.lower().endswith('.txt')]
+
+def get_container_files(inbox_dir: str = "data/inbox") -> List[str]:
+    """
+    Scan data/inbox and return paths to all .sssc share containers.
+    """
+    os.makedirs(inbox_dir, exist_ok=True)
+    return [os.path.join(inbox_dir, f)
+            for f in sorted(os.listdir(inbox_dir))
+            if f.lower().endswith('.sssc')]
+
+@contextmanager
+def open_container(path: str) -> Iterator["ContainerView"]:
+    """
+    Memory-map a share container and yield a zero-copy ContainerView of it.
+    """
+    # Imported here so that reading text shares does not load the container code
+    import mmap
+    from src.logic.container import ContainerView
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            raise ValueError(f"Empty share container: {path}")
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        view = ContainerView(mm)
+        try:
+            yield view
+        finally:
+            view.release()
+    finally:
+        mm.close()
\ No newline at end of file
@@ -0,0 +1,180 @@
+"""
+container.py
+
+This module defines a packed binary container for Shamir shares, used as an
+alternative to writing one hex text file per share. A container holds the
+shares of many secrets for one or more x-coordinates (typically one
+container per x, i.e. per storage server).
+
+Layout (all integers little-endian):
+    header      magic b"SSSC", version u8, value size u8, threshold u16,
+                number of x-coordinates u16, number of secrets u32,
+                size of the id blob u32
+    modulus     field modulus of the shares (value size bytes)
+    x-coords    one u16 per x-coordinate
+    index       per secret (sorted by id): id offset u32, id length u16,
+                record offset u64 (absolute position in the file)
+    ids         UTF-8 secret ids, concatenated
+    records     per secret, one fixed-width 257-bit value (33 bytes) per
+                x-coordinate, in x-coordinate order
+
+Records have a fixed width, so a ContainerView over an mmap can hand out
+zero-copy memoryview slices and whole columns without parsing hex.
+
+Version 1 containers have no modulus field: they were written while shares
+were computed modulo LEGACY_PRIME, and are read as such.
+
+Example:
+    >>> from src.logic.container import encode_container, ContainerView
+    >>> blob = encode_container(["k1"], threshold=2, x_s=[1], columns=[[42]])
+    >>> assert ContainerView(blob).values("k1") == [42]
+"""
+import struct
+from typing import List, Sequence, Tuple
+
+from src.logic.shamir import LEGACY_PRIME, PRIME
+
+MAGIC = b"SSSC"
+VERSION = 2
+VALUE_SIZE = 33
+
+_HEADER = struct.Struct('<4sBBHHII')
+_X = struct.Struct('<H')
+_INDEX = struct.Struct('<IHQ')
+
+
+def encode_container(ids: Sequence[str], threshold: int, x_s: Sequence[int],
+                     columns: Sequence[Sequence[int]], modulus: int = PRIME) -> bytes:
+    """
+    Pack shares into a container. columns[j][s] is the y-value of secret
+    ids[s] at x-coordinate x_s[j], modulo modulus. Raises ValueError for
+    invalid inputs.
+    """
+    if len(columns) != len(x_s):
+        raise ValueError("Need exactly one column per x-coordinate.")
+    if any(len(col) != len(ids) for col in columns):
+        raise ValueError("Every column needs one value per secret id.")
+    if len(set(ids)) != len(ids):
+        raise ValueError("Secret ids must be unique.")
+
+    order = sorted(range(len(ids)), key=lambda s: ids[s])
+    encoded = [ids[s].encode('utf-8') for s in order]
+    names = b"".join(encoded)
+    record_size = len(x_s) * VALUE_SIZE
+    records_start = (_HEADER.size + VALUE_SIZE + len(x_s) * _X.size
+                     + len(ids) * _INDEX.size + len(names))
+
+    out = bytearray(_HEADER.pack(MAGIC, VERSION, VALUE_SIZE, threshold,
+                                 len(x_s), len(ids), len(names)))
+    out += modulus.to_bytes(VALUE_SIZE, 'little')
+    for x in x_s:
+        out += _X.pack(x)
+    name_off = 0
+    for rank, name in enumerate(encoded):
+        out += _INDEX.pack(name_off, len(name), records_start + rank * record_size)
+        name_off += len(name)
+    out += names
+    for s in order:
+        for col in columns:
+            out += col[s].to_bytes(VALUE_SIZE, 'little')
+    return bytes(out)
+
+
+class ContainerView:
+    """
+    Read-only view of an encoded container held in any buffer (bytes, mmap).
+    modulus is the field modulus of its shares. Raises ValueError if the
+    buffer is not a valid container.
+    """
+
+    def __init__(self, buffer):
+        self._buf = memoryview(buffer)
+        try:
+            self._parse_header()
+        except ValueError:
+            # An exported memoryview would keep an mmap from being closed
+            self._buf.release()
+            raise
+
+    def _parse_header(self) -> None:
+        if len(self._buf) < _HEADER.size:
+            raise ValueError("Truncated share container.")
+        magic, version, value_size, threshold, num_x, count, names_size = \
+            _HEADER.unpack_from(self._buf, 0)
+        if magic != MAGIC or version not in (1, VERSION) or value_size != VALUE_SIZE:
+            raise ValueError("Not a share container or unsupported version.")
+        self.threshold = threshold
+        off = _HEADER.size
+        if version == 1:
+            self.modulus = LEGACY_PRIME
+        else:
+            if off + VALUE_SIZE > len(self._buf):
+                raise ValueError("Truncated share container.")
+            self.modulus = int.from_bytes(self._buf[off:off + VALUE_SIZE], 'little')
+            off += VALUE_SIZE
+        self._index_start = off + num_x * _X.size
+        self._names_start = self._index_start + count * _INDEX.size
+        self._count = count
+        self._record_size = num_x * VALUE_SIZE
+        self._records_start = self._names_start + names_size
+        if self._records_start + count * self._record_size > len(self._buf):
+            raise ValueError("Truncated share container.")
+        self.x_s = [_X.unpack_from(self._buf, off + j * _X.size)[0] for j in range(num_x)]
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _entry(self, rank: int) -> Tuple[str, int]:
+        name_off, name_len, record_off = _INDEX.unpack_from(
+            self._buf, self._index_start + rank * _INDEX.size)
+        start = self._names_start + name_off
+        if (start + name_len > self._records_start
+                or record_off < self._records_start
+                or record_off + self._record_size > len(self._buf)):
+            raise ValueError("Corrupt share container index.")
+        return bytes(self._buf[start:start + name_len]).decode('utf-8'), record_off
+
+    def ids(self) -> List[str]:
+        """All secret ids, in sorted (record) order."""
+        return [self._entry(rank)[0] for rank in range(self._count)]
+
+    def _offset(self, secret_id: str) -> int:
+        # The index is sorted by id, so binary-search it instead of loading it
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            name, record_off = self._entry(mid)
+            if name == secret_id:
+                return record_off
+            if name < secret_id:
+                lo = mid + 1
+            else:
+                hi = mid
+        raise KeyError(f"No shares for {secret_id!r} in container.")
+
+    def raw(self, secret_id: str) -> memoryview:
+        """Zero-copy slice holding the packed values of one secret."""
+        off = self._offset(secret_id)
+        return self._buf[off:off + self._record_size]
+
+    def values(self, secret_id: str) -> List[int]:
+        """y-values of one secret, one per x-coordinate."""
+        rec = self.raw(secret_id)
+        return [int.from_bytes(rec[j:j + VALUE_SIZE], 'little')
+                for j in range(0, self._record_size, VALUE_SIZE)]
+
+    def shares(self, secret_id: str) -> List[Tuple[int, str]]:
+        """Shares of one secret in split_secret()'s (x, hex_y) form."""
+        return [(x, format(y, 'x')) for x, y in zip(self.x_s, self.values(secret_id))]
+
+    def column(self, j: int) -> List[int]:
+        """y-values at x_s[j] for every secret, in ids() order."""
+        records = self._buf[self._records_start:]
+        size = self._record_size
+        base = j * VALUE_SIZE
+        return [int.from_bytes(records[s * size + base:s * size + base + VALUE_SIZE], 'little')
+                for s in range(self._count)]
+
+    def release(self) -> None:
+        """Release the underlying buffer (needed before closing an mmap)."""
+        self._buf.release()
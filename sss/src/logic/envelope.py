@@ -0,0 +1,175 @@
+"""
+envelope.py
+
+Envelope mode: one QKD master key protects any number of files. The master
+key is split once with split_secret(); every file gets its own 256-bit data
+key derived from the master key with HKDF-SHA256 (RFC 5869), using the
+file's derivation label as HKDF info. Protecting a directory therefore
+costs one split, one share distribution and one recovery, however many
+files it holds.
+
+The manifest is the only per-file state. It is not secret (it holds no key
+material) and travels with the encrypted files:
+    {"version": 2, "master": "alice_raw_key.txt", "threshold": 3,
+     "num_shares": 5, "modulus": "<hex>", "salt": "<32 hex>", "check": "<16 hex>",
+     "files": {"file.pdf": "file.pdf#1", "notes.txt": "notes.txt#2"}}
+A label is "<file id>#<generation>"; re-keying a file bumps its generation,
+so a file never gets a previously used key back, and the part after the
+last "#" keeps labels of different file ids distinct. "check"
+is a key check value that tells a wrong master key from a right one.
+"modulus" is the field of the master key's shares; version 1 manifests,
+which have none, were written when shares were split modulo LEGACY_PRIME.
+
+Example:
+    >>> from src.logic.envelope import create_envelope, open_envelope
+    >>> hex_key = "8d11e51fd3fd2773611133ab0f2d22938d1092f4f21f1b0b3e1dcb8cda6e4f4b"
+    >>> manifest, shares = create_envelope(hex_key, ["a.txt", "b.txt"], 3, 5)
+    >>> envelope = open_envelope(manifest, shares[:3])
+    >>> assert envelope.data_key("a.txt") != envelope.data_key("b.txt")
+"""
+import hashlib
+import hmac
+import json
+import os
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from src.logic.shamir import (
+    LEGACY_PRIME, PRIME, split_secret, decode_secret, recover_secret, validate_secret,
+)
+
+VERSION = 2
+SALT_BYTES = 16
+DATA_KEY_BYTES = 32
+
+_INFO_PREFIX = b"sss-envelope/v1/"
+_CHECK_INFO = b"sss-envelope/v1/check"
+_HASH_LEN = hashlib.sha256().digest_size
+
+
+def hkdf_extract(salt: bytes, ikm: bytes) -> bytes:
+    """HKDF-Extract with SHA-256: the pseudorandom key for hkdf_expand()."""
+    return hmac.new(salt or bytes(_HASH_LEN), ikm, hashlib.sha256).digest()
+
+
+def hkdf_expand(prk: bytes, info: bytes, length: int = DATA_KEY_BYTES) -> bytes:
+    """HKDF-Expand with SHA-256. Raises ValueError for lengths above 255 blocks."""
+    if length > 255 * _HASH_LEN:
+        raise ValueError("HKDF cannot expand to more than 8160 bytes.")
+    out, block = b"", b""
+    counter = 1
+    while len(out) < length:
+        block = hmac.new(prk, block + info + bytes([counter]), hashlib.sha256).digest()
+        out += block
+        counter += 1
+    return out[:length]
+
+
+def _check_value(prk: bytes) -> str:
+    return hkdf_expand(prk, _CHECK_INFO, 8).hex()
+
+
+@dataclass
+class Manifest:
+    """Maps file ids to derivation labels; see the module docstring for the JSON form."""
+    master: str
+    threshold: int
+    num_shares: int
+    salt: str
+    check: str
+    files: Dict[str, str] = field(default_factory=dict)
+    modulus: int = PRIME
+
+    def add(self, file_id: str) -> str:
+        """Label of file_id, assigning its first label if it has none yet."""
+        if file_id not in self.files:
+            self.files[file_id] = f"{file_id}#1"
+        return self.files[file_id]
+
+    def rekey(self, file_id: str) -> str:
+        """Give file_id a fresh label (and so a fresh data key); returns it."""
+        label = self.files.get(file_id)
+        if label is None:
+            return self.add(file_id)
+        generation = int(label.rpartition('#')[2]) + 1
+        self.files[file_id] = f"{file_id}#{generation}"
+        return self.files[file_id]
+
+    def to_json(self) -> str:
+        return json.dumps({'version': VERSION, 'master': self.master,
+                           'threshold': self.threshold, 'num_shares': self.num_shares,
+                           'modulus': format(self.modulus, 'x'), 'salt': self.salt, 'check': self.check,
+                           'files': dict(sorted(self.files.items()))}, indent=1)
+
+    @classmethod
+    def from_json(cls, text: str) -> 'Manifest':
+        """Parse a manifest. Raises ValueError if it is malformed."""
+        try:
+            data = json.loads(text)
+            version = data.get('version')
+            if version not in (1, VERSION):
+                raise ValueError(f"Unsupported manifest version {version!r}.")
+            modulus = LEGACY_PRIME if version == 1 else int(data['modulus'], 16)
+            return cls(master=str(data['master']), threshold=int(data['threshold']),
+                       num_shares=int(data['num_shares']), salt=str(data['salt']),
+                       check=str(data['check']), files=dict(data.get('files', {})),
+                       modulus=modulus)
+        except (KeyError, TypeError, AttributeError) as e:
+            raise ValueError(f"Malformed manifest: {e}") from None
+
+
+class Envelope:
+    """
+    Data keys of one manifest, given the recovered master key. HKDF-Extract
+    runs once here; each data key is then one HKDF-Expand block.
+    """
+
+    def __init__(self, manifest: Manifest, master_hex: str):
+        validate_secret(master_hex)
+        self.manifest = manifest
+        self._prk = hkdf_extract(bytes.fromhex(manifest.salt), bytes.fromhex(master_hex))
+        if not hmac.compare_digest(_check_value(self._prk), manifest.check):
+            raise ValueError("Master key does not match the manifest.")
+
+    def data_key(self, file_id: str) -> str:
+        """64-hex data key of a file in the manifest. Raises KeyError otherwise."""
+        try:
+            label = self.manifest.files[file_id]
+        except KeyError:
+            raise KeyError(f"{file_id!r} is not in the manifest.") from None
+        return hkdf_expand(self._prk, _INFO_PREFIX + label.encode('utf-8')).hex()
+
+    def data_keys(self, file_ids: Optional[Iterable[str]] = None) -> Dict[str, str]:
+        """Data keys of the given files (default: every file in the manifest)."""
+        ids = self.manifest.files if file_ids is None else file_ids
+        return {file_id: self.data_key(file_id) for file_id in ids}
+
+
+def create_envelope(master_hex: str, file_ids: Sequence[str], threshold: int, num_shares: int,
+                    master: str = "master") -> Tuple[Manifest, List[Tuple[int, str]]]:
+    """
+    Split master_hex once and build a manifest covering file_ids.
+    Returns the manifest and the master key's shares in split_secret()'s form.
+    Raises ValueError for invalid inputs.
+    """
+    shares = split_secret(master_hex, threshold, num_shares)
+    salt = os.urandom(SALT_BYTES)
+    prk = hkdf_extract(salt, bytes.fromhex(master_hex))
+    manifest = Manifest(master=master, threshold=threshold, num_shares=num_shares,
+                        salt=salt.hex(), check=_check_value(prk))
+    for file_id in file_ids:
+        manifest.add(file_id)
+    return manifest, shares
+
+
+def open_envelope(manifest: Manifest, shares: List[Tuple[int, str]]) -> Envelope:
+    """
+    Recover the master key from shares and return the manifest's Envelope.
+    Extra shares are checked (and corrupted ones corrected) with decode_secret().
+    Raises ValueError if the shares do not yield the manifest's master key.
+    """
+    if len(shares) > manifest.threshold:
+        master_hex, _ = decode_secret(shares, manifest.threshold, manifest.modulus)
+    else:
+        master_hex = recover_secret(shares, manifest.threshold, manifest.modulus)
+    return Envelope(manifest, master_hex)
@@ -0,0 +1,204 @@
+"""
+refresh.py
+
+Proactive share refresh: shares are re-randomised in place, without ever
+recovering the secrets. For every secret a fresh polynomial d(x) of degree
+threshold - 1 with d(0) = 0 is drawn, and each share (x, y) becomes
+(x, y + d(x)). The secret f(0) + d(0) = f(0) is unchanged, while shares
+from before and after a refresh no longer combine, so shares leaked in
+one epoch are useless together with shares leaked in the next.
+
+A refresh only needs the secrets' names and share x-coordinates. Deltas
+are generated for many secrets at once: coefficients come from one CSPRNG
+read, stored coefficient-major, and Horner's rule runs one list
+comprehension per coefficient over every secret at each x.
+
+Deltas travel as a compact delta record, one per refresh (or per
+request), naming the files they apply to:
+    header      magic b"SSSD", version u8, value size u8, entry count u32,
+                record id (16 bytes)
+    modulus     value size bytes
+    group       group size u16, commitment group modulus (group size bytes)
+    entries     name length u16, factor count u8, file name (UTF-8), then
+                a share delta (value size bytes) if the factor count is 0,
+                else that many commitment factors (group size bytes each)
+All integers are little-endian. A share file's delta is added to its value
+modulo the modulus; a commit_ file's factors G^d_j multiply its Feldman
+commitments modulo the group modulus, so verifiable shares still verify
+after the refresh. The record id lets a holder recognise and skip a
+record it has already applied. The infrastructure reads records through
+infrastructure/storage_server/deltas.py; the sss container only mounts
+sss/, so the layout is restated here, and an infrastructure test decodes
+records written by this module to keep the two in step.
+
+Example:
+    >>> from src.logic.shamir import split_secrets, recover_secrets
+    >>> from src.logic.refresh import refresh_batch
+    >>> hex_key = "8d11e51fd3fd2773611133ab0f2d22938d1092f4f21f1b0b3e1dcb8cda6e4f4b"
+    >>> batch = split_secrets([hex_key] * 1000, threshold=3, num_shares=5)
+    >>> fresh = refresh_batch(batch)
+    >>> assert recover_secrets(fresh, threshold=3) == [hex_key] * 1000
+"""
+import os
+import struct
+from typing import Iterable, List, Sequence, Tuple, Union
+
+from src.logic.shamir import (
+    PRIME, VSS_P, ShareBatch, _random_coeffs, commit, format_commitments, parse_commitments,
+)
+
+MAGIC = b"SSSD"
+VERSION = 1
+VALUE_SIZE = 33
+RECORD_ID_BYTES = 16
+GROUP_SIZE = (VSS_P.bit_length() + 7) // 8
+
+_HEADER = struct.Struct('<4sBBI16s')
+_GROUP = struct.Struct('<H')
+_ENTRY = struct.Struct('<HB')
+
+# A share delta, or the commitment factors of a commit_ file
+Delta = Union[int, List[int]]
+
+
+def refresh_deltas(count: int, threshold: int, x_s: Sequence[int],
+                   coeffs: bool = False):
+    """
+    Deltas of count fresh zero-constant polynomials of degree threshold - 1:
+    columns[j][s] is the delta of secret s at x_s[j]. With coeffs=True also
+    returns levels, where levels[k][s] is the coefficient of x^(degree - k)
+    of secret s. A threshold of 1 has nothing to re-randomise (all zeros).
+    """
+    if threshold < 1:
+        raise ValueError("threshold must be a positive integer.")
+    degree = threshold - 1
+    rand = _random_coeffs(count * degree)
+    levels = [rand[k * count:(k + 1) * count] for k in range(degree)]
+    p = PRIME
+    columns: List[List[int]] = []
+    for x in x_s:
+        if not degree:
+            columns.append([0] * count)
+            continue
+        acc = levels[0]
+        for level in levels[1:]:
+            # x is small, so the reduction can wait until the end
+            acc = [a * x + c for a, c in zip(acc, level)]
+        columns.append([a * x % p for a in acc])
+    return (columns, levels) if coeffs else columns
+
+
+def refresh_batch(batch: ShareBatch) -> ShareBatch:
+    """
+    A refreshed copy of batch: same secrets, new shares. Feldman
+    commitments, if present, are updated with the commitments to the
+    delta polynomials, so the refreshed shares still verify.
+    """
+    columns, levels = refresh_deltas(len(batch), batch.threshold, batch.x_s, coeffs=True)
+    p = PRIME
+    new_columns = [[(y + d) % p for y, d in zip(col, delta)]
+                   for col, delta in zip(batch.columns, columns)]
+    commitments = None
+    if batch.commitments is not None:
+        commitments = []
+        for s, old in enumerate(batch.commitments):
+            update = commitment_deltas(levels, s)
+            commitments.append([c * u % VSS_P for c, u in zip(old, update)])
+    return ShareBatch(threshold=batch.threshold, x_s=list(batch.x_s), columns=new_columns,
+                      commitments=commitments)
+
+
+def commitment_deltas(levels: Sequence[Sequence[int]], s: int) -> List[int]:
+    """
+    Factors G^d_j for the commitments of secret s, from refresh_deltas'
+    levels; the first is 1, since d(0) = 0.
+    """
+    return commit([0] + [level[s] for level in reversed(levels)])
+
+
+def apply_delta(hex_y: str, delta: int) -> str:
+    """A share's hex y-value with delta added."""
+    return format((int(hex_y, 16) + delta) % PRIME, 'x')
+
+
+def apply_commitment_delta(text: str, factors: Sequence[int]) -> str:
+    """The commitments of a commit_ file multiplied by factors. Raises ValueError on a mismatch."""
+    old = parse_commitments(text)
+    if len(old) != len(factors):
+        raise ValueError(f"{len(old)} commitments, but {len(factors)} factors.")
+    return format_commitments([c * f % VSS_P for c, f in zip(old, factors)])
+
+
+def new_record_id() -> bytes:
+    return os.urandom(RECORD_ID_BYTES)
+
+
+def encode_delta_header(count: int, record_id: bytes, modulus: int = PRIME,
+                        group: int = VSS_P) -> bytes:
+    """Header, modulus and group modulus of a delta record with count entries."""
+    return (_HEADER.pack(MAGIC, VERSION, VALUE_SIZE, count, record_id)
+            + modulus.to_bytes(VALUE_SIZE, 'little')
+            + _GROUP.pack(GROUP_SIZE) + group.to_bytes(GROUP_SIZE, 'little'))
+
+
+def encode_delta_entries(entries: Iterable[Tuple[str, Delta]]) -> bytes:
+    """
+    (file name, delta) entries of a delta record, without its header: an
+    int delta for a share file, a list of factors for a commit_ file.
+    """
+    parts = []
+    for name, delta in entries:
+        raw = name.encode('utf-8')
+        if isinstance(delta, int):
+            parts.append(_ENTRY.pack(len(raw), 0) + raw + delta.to_bytes(VALUE_SIZE, 'little'))
+        else:
+            parts.append(_ENTRY.pack(len(raw), len(delta)) + raw
+                         + b''.join(f.to_bytes(GROUP_SIZE, 'little') for f in delta))
+    return b''.join(parts)
+
+
+def encode_deltas(entries: Sequence[Tuple[str, Delta]], record_id: bytes = None) -> bytes:
+    """A complete delta record; a random record id is drawn if none is given."""
+    return (encode_delta_header(len(entries), record_id or new_record_id())
+            + encode_delta_entries(entries))
+
+
+def decode_deltas(blob: bytes) -> Tuple[bytes, int, int, List[Tuple[str, Delta]]]:
+    """
+    (record id, modulus, group modulus, entries) of a delta record. Raises
+    ValueError if it is malformed.
+    """
+    if len(blob) < _HEADER.size:
+        raise ValueError("Truncated delta record header.")
+    magic, version, size, count, record_id = _HEADER.unpack_from(blob)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Not a version 1 delta record.")
+    off = _HEADER.size + size
+    if off + _GROUP.size > len(blob):
+        raise ValueError("Truncated delta record header.")
+    modulus = int.from_bytes(blob[_HEADER.size:off], 'little')
+    (group_size,) = _GROUP.unpack_from(blob, off)
+    off += _GROUP.size
+    group = int.from_bytes(blob[off:off + group_size], 'little')
+    off += group_size
+    entries = []
+    for _ in range(count):
+        if off + _ENTRY.size > len(blob):
+            raise ValueError("Truncated delta record.")
+        name_len, factors = _ENTRY.unpack_from(blob, off)
+        if factors and not group_size:
+            raise ValueError("Commitment factors without a group modulus.")
+        off += _ENTRY.size + name_len
+        end = off + (factors * group_size if factors else size)
+        if end > len(blob):
+            raise ValueError("Truncated delta record.")
+        name = blob[off - name_len:off].decode('utf-8')
+        if factors:
+            entries.append((name, [int.from_bytes(blob[i:i + group_size], 'little')
+                                   for i in range(off, end, group_size)]))
+        else:
+            entries.append((name, int.from_bytes(blob[off:end], 'little')))
+        off = end
+    if off != len(blob):
+        raise ValueError("Trailing bytes after the delta record entries.")
+    return record_id, modulus, group, entries
@@ -11,13 +11,53 @@ Example:
     >>> shares = split_secret(hex_key, threshold=3, num_shares=5)
     >>> recovered = recover_secret(shares, threshold=3)
     >>> assert recovered == hex_key
+
+For bulk workloads, split_secrets() splits many secrets in one call and
+returns a columnar ShareBatch:
+    >>> batch = split_secrets([hex_key] * 1000, threshold=3, num_shares=5)
+    >>> first = batch.shares(0)  # same (x, hex_y) tuples as split_secret()
+    >>> assert recover_secrets(batch, threshold=3) == [hex_key] * 1000
+
+When more than threshold shares are available, decode_secret() treats them
+as a Reed-Solomon codeword and corrects up to (n - threshold) // 2 bad ones:
+    >>> shares[0] = (1, "1234")
+    >>> recovered, bad = decode_secret(shares, threshold=3)
+    >>> assert recovered == hex_key and bad == [1]
+
+With verifiable=True, split_secrets() also returns Feldman commitments to
+every polynomial, and verify_shares() checks any number of received shares
+against them in one batched pass, before any recovery is attempted:
+    >>> batch = split_secrets([hex_key] * 1000, threshold=3, num_shares=5, verifiable=True)
+    >>> items = [(batch.shares(s)[0], batch.commitments[s]) for s in range(1000)]
+    >>> assert verify_shares(items) == []
+
+Shares used to be computed modulo LEGACY_PRIME = 2^257 - 1, which is not
+prime. Such shares still combine, but only in that ring: pass
+prime=LEGACY_PRIME to the recovery functions (`sss combine --legacy-field`).
+Share containers and commitment files name their modulus, so shares from
+the two fields are never mixed silently; a legacy share can only be told
+apart from a text file on its own when its value does not fit the field,
+which recovery reports as an error. Legacy shares are meant to be combined
+and split again, not refreshed.
 """
-import random
-import itertools
-from typing import List, Tuple
+import os
+import re
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+# Prime p > 2^256 for operations in GF(p): the largest prime below 2^257
+PRIME = 2**257 - 93
+# Modulus of shares written before PRIME; see the module docstring
+LEGACY_PRIME = 2**257 - 1
+
+# Coefficients are drawn from 257-bit little-endian chunks of os.urandom output
+_COEF_BYTES = 33
+_COEF_MASK = (1 << 257) - 1
+
+_HEX64 = re.compile(r'[0-9a-fA-F]{64}')
 
-# Prime p > 2^256 for operations in GF(p)
-PRIME = 2**257 - 1
+# Number of distinct share x-sets whose Lagrange weights are kept in memory
+_WEIGHT_CACHE_SIZE = 256
 
 
 def _modinv(a: int, p: int = PRIME) -> int:
@@ -30,6 +70,41 @@ def _modinv(a: int, p: int = PRIME) -> int:
     return lm % p
 
 
+def _batch_modinv(values: Sequence[int], p: int = PRIME) -> List[int]:
+    """Invert every value modulo p with a single _modinv (Montgomery's trick)."""
+    prefix: List[int] = []
+    acc = 1
+    for v in values:
+        prefix.append(acc)
+        acc = acc * v % p
+    inv = _modinv(acc, p)
+    out = [0] * len(values)
+    for i in range(len(values) - 1, -1, -1):
+        out[i] = inv * prefix[i] % p
+        inv = inv * values[i] % p
+    return out
+
+
+@lru_cache(maxsize=_WEIGHT_CACHE_SIZE)
+def _lagrange_weights(x_s: Tuple[int, ...], p: int = PRIME) -> Tuple[int, ...]:
+    """
+    Lagrange basis weights at x=0 for the given x-coordinates, so that
+    f(0) = sum(w_i * y_i) mod p. Cached per distinct x-set.
+    """
+    if len(set(x_s)) != len(x_s):
+        raise ValueError("Share x-coordinates must be distinct.")
+    nums, dens = [], []
+    for i, xi in enumerate(x_s):
+        num, den = 1, 1
+        for j, xj in enumerate(x_s):
+            if i != j:
+                num = num * -xj % p
+                den = den * (xi - xj) % p
+        nums.append(num)
+        dens.append(den)
+    return tuple(n * d % p for n, d in zip(nums, _batch_modinv(dens, p)))
+
+
 def _lagrange_interpolate(x: int, x_s: List[int], y_s: List[int], p: int = PRIME) -> int:
     """Lagrange interpolate and evaluate polynomial at x."""
     total = 0
@@ -44,42 +119,445 @@ def _lagrange_interpolate(x: int, x_s: List[int], y_s: List[int], p: int = PRIME
     return total
 
 
+def _random_coeffs(count: int) -> List[int]:
+    """Draw count uniform elements of GF(p) from the OS CSPRNG in one read."""
+    coeffs: List[int] = []
+    while len(coeffs) < count:
+        missing = count - len(coeffs)
+        buf = os.urandom(missing * _COEF_BYTES)
+        for off in range(0, len(buf), _COEF_BYTES):
+            c = int.from_bytes(buf[off:off + _COEF_BYTES], 'little') & _COEF_MASK
+            # The mask yields [0, 2^257 - 1]; reject the 93 values >= PRIME.
+            if c < PRIME:
+                coeffs.append(c)
+    return coeffs
+
+
+def _check_params(threshold: int, num_shares: int) -> None:
+    if threshold < 1 or num_shares < 1:
+        raise ValueError("threshold and num_shares must be positive integers.")
+    if threshold > num_shares:
+        raise ValueError("threshold cannot be greater than num_shares.")
+
+
+def validate_secret(hex_secret: str) -> None:
+    """Raise ValueError unless hex_secret is exactly 64 hexadecimal characters."""
+    if not isinstance(hex_secret, str) or not _HEX64.fullmatch(hex_secret):
+        raise ValueError("Secret must be exactly 64 hexadecimal characters.")
+
+
 def split_secret(hex_secret: str, threshold: int, num_shares: int) -> List[Tuple[int, str]]:
     """
     Split a 64-character hexadecimal secret into Shamir shares.
     Raises ValueError for invalid inputs.
     """
-    if len(hex_secret) != 64 or any(c not in '0123456789abcdefABCDEF' for c in hex_secret):
-        raise ValueError("Secret must be exactly 64 hexadecimal characters.")
-    if threshold < 1 or num_shares < 1:
-        raise ValueError("threshold and num_shares must be positive integers.")
-    if threshold > num_shares:
-        raise ValueError("threshold cannot be greater than num_shares.")
+    validate_secret(hex_secret)
+    _check_params(threshold, num_shares)
 
     secret_int = int(hex_secret, 16)
-    coeffs = [secret_int] + [random.randrange(0, PRIME) for _ in range(threshold - 1)]
+    coeffs = [secret_int] + _random_coeffs(threshold - 1)
     shares: List[Tuple[int, str]] = []
     for i in range(1, num_shares + 1):
-        y = sum(coef * pow(i, power, PRIME) for power, coef in enumerate(coeffs)) % PRIME
-        shares.append((i, format(y, 'x')))
+        # Horner's rule; x is small, so the reduction can wait until the end.
+        y = 0
+        for coef in reversed(coeffs):
+            y = y * i + coef
+        shares.append((i, format(y % PRIME, 'x')))
     return shares
 
 
-def recover_secret(shares: List[Tuple[int, str]], threshold: int) -> str:
+class ShareBatch:
     """
-    Recover the original 64-character hexadecimal secret from Shamir shares.
-    Tries combinations if more shares provided.
+    Columnar result of split_secrets().
+
+    x_s[j] is the x-coordinate of the j-th share and columns[j][s] is its
+    y-value for the s-th secret, so each column is what one storage server
+    receives for the whole batch. commitments[s] holds the Feldman
+    commitments of secret s when the batch was split with verifiable=True.
+
+    A plain class rather than a dataclass: importing dataclasses would
+    double the CLI's start-up time.
+    """
+
+    def __init__(self, threshold: int, x_s: List[int], columns: List[List[int]],
+                 commitments: Optional[List[List[int]]] = None):
+        self.threshold = threshold
+        self.x_s = x_s
+        self.columns = columns
+        self.commitments = commitments
+
+    def _fields(self):
+        return self.threshold, self.x_s, self.columns, self.commitments
+
+    def __eq__(self, other):
+        if not isinstance(other, ShareBatch):
+            return NotImplemented
+        return self._fields() == other._fields()
+
+    def __repr__(self) -> str:
+        return (f"ShareBatch(threshold={self.threshold!r}, x_s={self.x_s!r}, "
+                f"columns={self.columns!r}, commitments={self.commitments!r})")
+
+    def __len__(self) -> int:
+        return len(self.columns[0]) if self.columns else 0
+
+    def shares(self, s: int) -> List[Tuple[int, str]]:
+        """Return the shares of secret s in split_secret()'s (x, hex_y) form."""
+        return [(x, format(col[s], 'x')) for x, col in zip(self.x_s, self.columns)]
+
+
+def split_secrets(hex_secrets: Sequence[str], threshold: int, num_shares: int,
+                  verifiable: bool = False) -> ShareBatch:
+    """
+    Split many 64-character hexadecimal secrets with the same parameters.
+    All coefficients come from a single CSPRNG read and every polynomial is
+    evaluated with Horner's rule at the shared x-coordinates 1..num_shares.
+    With verifiable=True the batch also carries Feldman commitments.
+    Raises ValueError for invalid inputs.
+    """
+    _check_params(threshold, num_shares)
+    for hex_secret in hex_secrets:
+        validate_secret(hex_secret)
+
+    x_s = list(range(1, num_shares + 1))
+    count = len(hex_secrets)
+    degree = threshold - 1
+    rand = _random_coeffs(count * degree)
+    columns: List[List[int]] = [[0] * count for _ in x_s]
+    commitments: Optional[List[List[int]]] = [] if verifiable else None
+    p = PRIME
+    for s, hex_secret in enumerate(hex_secrets):
+        secret_int = int(hex_secret, 16)
+        # Highest-degree coefficient first, constant term (the secret) last.
+        high_first = rand[s * degree:(s + 1) * degree]
+        for j, x in enumerate(x_s):
+            y = 0
+            for coef in high_first:
+                y = y * x + coef
+            columns[j][s] = (y * x + secret_int) % p
+        if commitments is not None:
+            commitments.append(commit([secret_int] + high_first[::-1]))
+    return ShareBatch(threshold=threshold, x_s=x_s, columns=columns, commitments=commitments)
+
+
+def _solve_linear(rows: List[List[int]], num_vars: int, p: int = PRIME) -> Union[List[int], None]:
+    """
+    Solve an augmented linear system over GF(p) by Gaussian elimination.
+    Free variables are set to zero; returns None if the system is inconsistent.
+    """
+    rows = [row[:] for row in rows]
+    pivots: List[int] = []
+    r = 0
+    for c in range(num_vars):
+        pivot = next((i for i in range(r, len(rows)) if rows[i][c] % p), None)
+        if pivot is None:
+            continue
+        rows[r], rows[pivot] = rows[pivot], rows[r]
+        inv = _modinv(rows[r][c], p)
+        rows[r] = [v * inv % p for v in rows[r]]
+        for i in range(len(rows)):
+            if i != r and rows[i][c]:
+                f = rows[i][c]
+                rows[i] = [(a - f * b) % p for a, b in zip(rows[i], rows[r])]
+        pivots.append(c)
+        r += 1
+        if r == len(rows):
+            break
+    if any(row[-1] % p for row in rows[r:]):
+        return None
+    solution = [0] * num_vars
+    for i, c in enumerate(pivots):
+        solution[c] = rows[i][-1]
+    return solution
+
+
+def _poly_divmod_monic(num: List[int], den: List[int], p: int = PRIME) -> Tuple[List[int], List[int]]:
+    """Divide polynomials (lowest degree first) by a monic divisor over GF(p)."""
+    num = num[:]
+    d = len(den) - 1
+    quot = [0] * max(len(num) - d, 1)
+    for i in range(len(num) - 1, d - 1, -1):
+        coef = num[i] % p
+        if coef:
+            quot[i - d] = coef
+            for j in range(d + 1):
+                num[i - d + j] = (num[i - d + j] - coef * den[j]) % p
+    return quot, num[:d]
+
+
+def _share_value(hex_y: str, p: int) -> int:
+    y = int(hex_y, 16)
+    if not 0 <= y < p:
+        hint = " (a share of the legacy 2^257 - 1 field?)" if p == PRIME else ""
+        raise ValueError(f"Share value does not fit the field{hint}.")
+    return y
+
+
+def decode_secret(shares: List[Tuple[int, str]], threshold: int,
+                  prime: int = PRIME) -> Tuple[str, List[int]]:
+    """
+    Recover a secret while locating corrupted shares (Berlekamp-Welch).
+
+    With n shares, up to (n - threshold) // 2 wrong shares are corrected in
+    polynomial time. Returns the 64-character hex secret and the sorted
+    x-coordinates of the shares that did not lie on the recovered polynomial.
+    Raises ValueError if the shares are inconsistent beyond that bound.
+    prime is the field modulus of the shares.
     """
     if threshold < 1:
         raise ValueError("threshold must be at least 1.")
     if len(shares) < threshold:
         raise ValueError("Insufficient shares to attempt recovery.")
+    x_s = [idx for idx, _ in shares]
+    if len(set(x_s)) != len(x_s):
+        raise ValueError("Share x-coordinates must be distinct.")
+    p = prime
+    y_s = [_share_value(h, p) for _, h in shares]
+    n, k = len(shares), threshold
+    e = (n - k) // 2
+
+    # Unknowns: Q (degree < e + k) followed by the non-leading coefficients of
+    # the monic error locator E (degree e). Each share gives
+    # Q(x) - y * E(x) = 0, i.e. Q(x) - y * E_low(x) = y * x^e.
+    rows: List[List[int]] = []
+    for x, y in zip(x_s, y_s):
+        powers = [pow(x, d, p) for d in range(e + k)]
+        rows.append(powers + [-y * powers[d] % p for d in range(e)] + [y * pow(x, e, p) % p])
+    solution = _solve_linear(rows, 2 * e + k, p)
+    if solution is None:
+        raise ValueError("Too many corrupted shares to recover the secret.")
+    q_poly = solution[:e + k]
+    e_poly = solution[e + k:] + [1]
+    poly, rem = _poly_divmod_monic(q_poly, e_poly, p)
+    if any(rem) or any(poly[k:]):
+        raise ValueError("Too many corrupted shares to recover the secret.")
+
+    bad: List[int] = []
+    for x, y in zip(x_s, y_s):
+        value = 0
+        for coef in reversed(poly):
+            value = (value * x + coef) % p
+        if value != y:
+            bad.append(x)
+    if len(bad) > e:
+        raise ValueError("Too many corrupted shares to recover the secret.")
+    return format(poly[0], '064x'), sorted(bad)
+
+
+def recover_secret(shares: List[Tuple[int, str]], threshold: int, prime: int = PRIME) -> str:
+    """
+    Recover the original 64-character hexadecimal secret from Shamir shares.
+    The first threshold shares are used if more are provided; use
+    decode_secret() to check the extra shares and correct corrupted ones.
+    """
+    return recover_secrets([shares], threshold, prime)[0]
+
+
+def recover_secrets(batch: Union[ShareBatch, Iterable[Sequence[Tuple[int, str]]]],
+                    threshold: int, prime: int = PRIME) -> List[str]:
+    """
+    Recover many 64-character hexadecimal secrets in one call.
+
+    batch is either a ShareBatch or an iterable of per-secret share lists in
+    recover_secret()'s format. The Lagrange weights for each distinct x-set
+    are computed once and cached, so every secret costs one dot product.
+    prime is the field modulus of the shares. Raises ValueError for invalid
+    inputs.
+    """
+    if threshold < 1:
+        raise ValueError("threshold must be at least 1.")
+    p = prime
+
+    if isinstance(batch, ShareBatch):
+        if len(batch.x_s) < threshold:
+            raise ValueError("Insufficient shares to attempt recovery.")
+        weights = _lagrange_weights(tuple(batch.x_s[:threshold]), p)
+        rows = zip(*batch.columns[:threshold])
+        return [format(sum(w * y for w, y in zip(weights, ys)) % p, '064x') for ys in rows]
+
+    recovered: List[str] = []
+    for shares in batch:
+        if len(shares) < threshold:
+            raise ValueError("Insufficient shares to attempt recovery.")
+        subset = sorted(shares[:threshold])
+        weights = _lagrange_weights(tuple(idx for idx, _ in subset), p)
+        secret_int = sum(w * _share_value(h, p) for w, (_, h) in zip(weights, subset)) % p
+        recovered.append(format(secret_int, '064x'))
+    return recovered
+
+# ---- Feldman verifiable secret sharing ----
+#
+# Commitments live in the subgroup of prime order PRIME of Z_VSS_P*, where
+# VSS_P = VSS_R * PRIME + 1 is a 2048-bit prime (VSS_R is the first even
+# cofactor from 2^1791 up that makes it prime) and VSS_G = 2^VSS_R
+# generates the subgroup. A polynomial a_0 + a_1 x + ... is committed to as
+# C_j = G^a_j, and a share (x, y) is valid iff G^y == prod_j C_j^(x^j).
+#
+# Since the group order is the field's own prime, C_0 = G^secret hides the
+# secret behind a full discrete log (about 2^128 generic steps, 2048-bit
+# NFS otherwise): commitments can be stored and shipped next to the shares.
+
+VSS_R = 2**1791 + 1302
+VSS_P = VSS_R * PRIME + 1
+
+# Fixed-base tables cover exponents of this many bits, WINDOW bits at a time
+_VSS_BITS = PRIME.bit_length()
+_VSS_WINDOW = 8
+# Random weights of batch verification; a bad share slips through with
+# probability about 2^-_BATCH_BITS
+_BATCH_BITS = 64
+# Batches at most this large are checked share by share once they fail
+_BATCH_LEAF = 4
+
+
+class FixedBaseTable:
+    """
+    base^e mod p for many exponents e < 2^bits. base^(d * 2^(window * k)) is
+    precomputed for every window position k and digit d, so one power is a
+    product of bits / window table entries and needs no squarings.
+    """
+
+    def __init__(self, base: int, p: int = VSS_P, bits: int = _VSS_BITS,
+                 window: int = _VSS_WINDOW):
+        self.p, self.bits, self.window = p, bits, window
+        self._rows: List[List[int]] = []
+        for _ in range(-(-bits // window)):
+            row = [1]
+            for _ in range((1 << window) - 1):
+                row.append(row[-1] * base % p)
+            self._rows.append(row)
+            base = row[-1] * base % p
+        self._mask = (1 << window) - 1
+
+    def pow(self, e: int) -> int:
+        if e < 0 or e >> self.bits:
+            raise ValueError(f"Exponent must be in [0, 2^{self.bits}).")
+        acc, p = 1, self.p
+        for row in self._rows:
+            if not e:
+                break
+            d = e & self._mask
+            if d:
+                acc = acc * row[d] % p
+            e >>= self.window
+        return acc
+
+
+@lru_cache(maxsize=1)
+def _generator_table() -> FixedBaseTable:
+    return FixedBaseTable(pow(2, VSS_R, VSS_P))
+
+
+def commit(coeffs: Sequence[int]) -> List[int]:
+    """Feldman commitments G^a_j to polynomial coefficients (constant term first)."""
+    table = _generator_table()
+    return [table.pow(a % PRIME) for a in coeffs]
+
+
+def format_commitments(commitments: Sequence[int]) -> str:
+    """
+    Text of a commit_{name} file: a "field <hex modulus>" line naming the
+    share field, then one hex commitment per line.
+    """
+    return "\n".join([f"field {PRIME:x}"] + [format(c, 'x') for c in commitments])
+
+
+def parse_commitments(text: str) -> List[int]:
+    """
+    Commitments of a format_commitments() text. Raises ValueError if it is
+    malformed or commits to shares of another field.
+    """
+    lines = text.strip().splitlines() or [""]
+    head = lines[0].split()
+    if len(head) != 2 or head[0] != "field":
+        raise ValueError("Commitments do not name their field (written for the legacy field?).")
+    if int(head[1], 16) != PRIME:
+        raise ValueError(f"Commitments are for the field {head[1]}, not {PRIME:x}.")
+    return [int(line, 16) for line in lines[1:] if line.strip()]
+
+
+def _commitment_value(commitments: Sequence[int], x: int, p: int = VSS_P) -> int:
+    """prod_j C_j^(x^j), by Horner's rule in the exponent."""
+    acc = 1
+    for c in reversed(commitments):
+        acc = pow(acc, x, p) * c % p
+    return acc
+
+
+def verify_share(share: Tuple[int, str], commitments: Sequence[int]) -> bool:
+    """True if share (x, hex_y) lies on the polynomial behind commitments."""
+    x, hex_y = share
+    y = int(hex_y, 16)
+    if not 0 <= y < PRIME:
+        return False
+    return _generator_table().pow(y) == _commitment_value(commitments, x)
+
+
+def _multi_pow(pairs: Sequence[Tuple[int, int]], p: int = VSS_P) -> int:
+    """prod base^e mod p over (base, e) pairs (Pippenger's bucket method)."""
+    pairs = [(b, e) for b, e in pairs if e]
+    if not pairs:
+        return 1
+    c = max(2, min(12, len(pairs).bit_length() - 2))
+    mask = (1 << c) - 1
+    top = max(e.bit_length() for _, e in pairs)
+    result = 1
+    for shift in range((top - 1) // c * c, -1, -c):
+        if result != 1:
+            for _ in range(c):
+                result = result * result % p
+        buckets = [1] * (mask + 1)
+        for b, e in pairs:
+            d = (e >> shift) & mask
+            if d:
+                buckets[d] = buckets[d] * b % p
+        # prod_d buckets[d]^d as a product of running products
+        running, window = 1, 1
+        for d in range(mask, 0, -1):
+            running = running * buckets[d] % p
+            window = window * running % p
+        result = result * window % p
+    return result
+
+
+def verify_shares(items: Sequence[Tuple[Tuple[int, str], Sequence[int]]]) -> List[int]:
+    """
+    Check many (share, commitments) pairs at once; returns the positions in
+    items of the shares that fail. With random weights r_k, every share is
+    folded into one equation G^(sum r_k y_k) == prod_k V_k^r_k, where V_k is
+    what share k's commitments predict for G^y_k: one fixed-base power and
+    one multi-exponentiation with short exponents. Only a failing batch is
+    split in halves, reusing V_k and r_k, to find the bad shares.
+    """
+    step = _BATCH_BITS // 8
+    weights = os.urandom(len(items) * step)
+    parsed, bad = [], []
+    for k, ((x, hex_y), commitments) in enumerate(items):
+        y = int(hex_y, 16)
+        if 0 <= y < PRIME and commitments:
+            r = int.from_bytes(weights[k * step:(k + 1) * step], 'little') | 1
+            parsed.append((k, y, _commitment_value(commitments, x), r))
+        else:
+            bad.append(k)
+    table = _generator_table()
+
+    def passes(part):
+        lhs = table.pow(sum(r * y for _, y, _, r in part) % PRIME)
+        return lhs == _multi_pow([(v, r) for _, _, v, r in part])
 
-    for subset in itertools.combinations(shares, threshold):
-        x_s = [idx for idx, _ in subset]
-        y_s = [int(h, 16) for _, h in subset]
-        secret_int = _lagrange_interpolate(0, x_s, y_s)
-        hex_out = format(secret_int, '064x')
-        return hex_out
+    def search(part, failed=False):
+        if len(part) <= _BATCH_LEAF:
+            bad.extend(k for k, y, v, _ in part if table.pow(y) != v)
+            return
+        if not failed and passes(part):
+            return
+        left, right = part[:len(part) // 2], part[len(part) // 2:]
+        if passes(left):
+            # The whole part failed, so the right half must hold a bad share
+            search(right, failed=True)
+        else:
+            search(left, failed=True)
+            search(right)
 
-    raise ValueError("Failed to recover secret from provided shares.")
\ No newline at end of file
+    search(parsed)
+    return sorted(bad)
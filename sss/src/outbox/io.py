@@ -1,12 +1,25 @@
 import os
+from typing import Sequence
 
 def save_text(content: str, filename: str, outbox_dir: str = "data/outbox") -> None:
     """
     Save string content to data/outbox/filename.txt.
     """
-    if not os.path.isdir(outbox_dir):
-        os.makedirs(outbox_dir)
+    os.makedirs(outbox_dir, exist_ok=True)
     path = os.path.join(outbox_dir, filename)
     with open(path, 'w', encoding='utf-8') as f:
         f.write(content)
-    print(f"[outbox] Saved {path}")
\ No newline at end of file
+    print(f"[outbox] Saved {path}")
+
+def save_container(ids: Sequence[str], threshold: int, x_s: Sequence[int],
+                   columns: Sequence[Sequence[int]], filename: str,
+                   outbox_dir: str = "data/outbox") -> None:
+    """
+    Save the shares of many secrets as one packed container in data/outbox.
+    """
+    from src.logic.container import encode_container
+    os.makedirs(outbox_dir, exist_ok=True)
+    path = os.path.join(outbox_dir, filename)
+    with open(path, 'wb') as f:
+        f.write(encode_container(ids, threshold, x_s, columns))
+    print(f"[outbox] Saved {path} ({len(ids)} secrets)")
\ No newline at end of file
@@ -0,0 +1,229 @@
+"""
+service.py
+
+Resident SSS service. Keeps one interpreter, the cached Lagrange weights and
+a pool of worker processes alive, so a split or recovery costs one request
+round trip instead of a `docker compose exec` plus interpreter start-up.
+
+SSSService is the in-process API; serve() exposes it over HTTP on a TCP port
+or a Unix socket. All endpoints take and return JSON:
+    GET  /healthz
+    POST /split          {"secret", "threshold", "num_shares"}
+    POST /recover        {"shares": [[x, hex], ...], "threshold", "decode": false}
+    POST /split_batch    {"secrets": [...], "threshold", "num_shares"}
+    POST /recover_batch  {"batch": [[[x, hex], ...], ...], "threshold"}
+Invalid input is answered with status 400 and {"error": ...}.
+
+Anyone who can reach the service can recover secrets, so it listens on
+127.0.0.1 or a Unix socket (mode 0600) by default. With a token, every
+endpoint but /healthz requires "Authorization: Bearer <token>" (401
+otherwise). Binding any other address needs allow_remote=True and a token.
+
+Example:
+    $ python3 -m src.cli serve --socket /tmp/sss.sock
+    $ curl --unix-socket /tmp/sss.sock -d '{"secret": "8d11...4f4b", \\
+          "threshold": 3, "num_shares": 5}' http://sss/split
+"""
+import hmac
+import ipaddress
+import json
+import logging
+import os
+import socketserver
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from src.logic.shamir import (
+    ShareBatch, split_secret, split_secrets, recover_secret, recover_secrets, decode_secret,
+)
+
+# Batches larger than this are fanned out over the worker pool
+CHUNK_SIZE = 2048
+
+
+def _split_chunk(secrets: Sequence[str], threshold: int, num_shares: int) -> ShareBatch:
+    return split_secrets(secrets, threshold, num_shares)
+
+
+def _recover_chunk(batch: Sequence[Sequence[Tuple[int, str]]], threshold: int) -> List[str]:
+    return recover_secrets(batch, threshold)
+
+
+class SSSService:
+    """
+    In-process split/recover API backed by a persistent process pool.
+    Raises ValueError for invalid inputs, like the functions it wraps.
+    """
+
+    def __init__(self, workers: int = 1):
+        self.workers = workers
+        self._pool = None
+        if workers > 1:
+            from concurrent.futures import ProcessPoolExecutor
+            self._pool = ProcessPoolExecutor(max_workers=workers)
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def _map(self, func, chunks, *args):
+        if self._pool is None or len(chunks) <= 1:
+            return [func(chunk, *args) for chunk in chunks]
+        return list(self._pool.map(func, chunks, *([a] * len(chunks) for a in args)))
+
+    def split(self, secret: str, threshold: int, num_shares: int) -> List[Tuple[int, str]]:
+        return split_secret(secret, threshold, num_shares)
+
+    def recover(self, shares: Sequence[Tuple[int, str]], threshold: int,
+                decode: bool = False) -> Tuple[str, List[int]]:
+        """Returns the secret and, with decode=True, the x of corrupted shares."""
+        shares = [(int(x), h) for x, h in shares]
+        if decode:
+            return decode_secret(shares, threshold)
+        return recover_secret(shares, threshold), []
+
+    def split_batch(self, secrets: Sequence[str], threshold: int, num_shares: int) -> ShareBatch:
+        chunks = [secrets[i:i + CHUNK_SIZE] for i in range(0, len(secrets), CHUNK_SIZE)]
+        if not chunks:
+            return split_secrets([], threshold, num_shares)
+        parts = self._map(_split_chunk, chunks, threshold, num_shares)
+        columns = [[] for _ in parts[0].x_s]
+        for part in parts:
+            for col, values in zip(columns, part.columns):
+                col.extend(values)
+        return ShareBatch(threshold=threshold, x_s=parts[0].x_s, columns=columns)
+
+    def recover_batch(self, batch: Sequence[Sequence[Tuple[int, str]]], threshold: int) -> List[str]:
+        batch = [[(int(x), h) for x, h in shares] for shares in batch]
+        chunks = [batch[i:i + CHUNK_SIZE] for i in range(0, len(batch), CHUNK_SIZE)]
+        recovered: List[str] = []
+        for part in self._map(_recover_chunk, chunks, threshold):
+            recovered.extend(part)
+        return recovered
+
+    def handle(self, path: str, body: Dict) -> Dict:
+        """Dispatch one JSON request; raises KeyError for unknown paths."""
+        if path == '/split':
+            shares = self.split(body['secret'], int(body['threshold']), int(body['num_shares']))
+            return {'shares': shares}
+        if path == '/recover':
+            secret, bad = self.recover(body['shares'], int(body['threshold']),
+                                       bool(body.get('decode', False)))
+            return {'secret': secret, 'bad_shares': bad}
+        if path == '/split_batch':
+            batch = self.split_batch(body['secrets'], int(body['threshold']), int(body['num_shares']))
+            return {'x_s': batch.x_s,
+                    'columns': [[format(y, 'x') for y in col] for col in batch.columns]}
+        if path == '/recover_batch':
+            return {'secrets': self.recover_batch(body['batch'], int(body['threshold']))}
+        raise KeyError(path)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    service: SSSService = None
+    token: Optional[str] = None
+
+    def _authorized(self) -> bool:
+        if self.token is None:
+            return True
+        supplied = self.headers.get('Authorization', '')
+        return hmac.compare_digest(supplied.encode(), f"Bearer {self.token}".encode())
+
+    def _reply(self, status: int, payload: Dict) -> None:
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == '/healthz':
+            self._reply(200, {'ok': True, 'workers': self.service.workers})
+        else:
+            self._reply(404, {'error': f"Unknown endpoint {self.path}"})
+
+    def do_POST(self):
+        if not self._authorized():
+            self._reply(401, {'error': "Missing or wrong bearer token"})
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            body = json.loads(self.rfile.read(length) or b'{}')
+            self._reply(200, self.service.handle(self.path, body))
+        except KeyError as e:
+            if e.args and e.args[0] == self.path:
+                self._reply(404, {'error': f"Unknown endpoint {self.path}"})
+            else:
+                self._reply(400, {'error': f"Missing field {e}"})
+        except (ValueError, TypeError) as e:
+            self._reply(400, {'error': str(e)})
+
+    def address_string(self):
+        # Unix-socket clients have no (host, port) address
+        return self.client_address[0] if self.client_address else 'unix'
+
+    def log_message(self, format, *args):
+        logging.debug(f"{self.address_string()} {format % args}")
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def _is_loopback(host: str) -> bool:
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def make_server(service: SSSService, host: str = '127.0.0.1', port: int = 8700,
+                socket_path: Optional[str] = None, token: Optional[str] = None,
+                allow_remote: bool = False):
+    """
+    Create (but do not start) an HTTP server bound to a port or Unix socket.
+    Raises ValueError for a non-loopback host unless allow_remote is set
+    and a token is given.
+    """
+    if not socket_path and not _is_loopback(host):
+        if not allow_remote:
+            raise ValueError(f"Refusing to listen on {host} without allow_remote (--allow-remote)")
+        if not token:
+            raise ValueError(f"Listening on {host} requires a token (--token-file or SSS_SERVICE_TOKEN)")
+    handler = type('Handler', (_Handler,), {'service': service, 'token': token or None})
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        # Only the owner may connect
+        old_umask = os.umask(0o177)
+        try:
+            return _UnixHTTPServer(socket_path, handler)
+        finally:
+            os.umask(old_umask)
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def serve(host: str = '127.0.0.1', port: int = 8700, socket_path: Optional[str] = None,
+          workers: int = 1, token: Optional[str] = None, allow_remote: bool = False) -> None:
+    """Run the service until interrupted."""
+    service = SSSService(workers)
+    try:
+        server = make_server(service, host, port, socket_path, token, allow_remote)
+    except ValueError:
+        service.close()
+        raise
+    logging.info(f"SSS service listening on {socket_path or f'{host}:{port}'} "
+                 f"with {workers} worker(s)" + (", token required" if token else ""))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+        if socket_path and os.path.exists(socket_path):
+            os.unlink(socket_path)
@@ -0,0 +1,114 @@
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src import cli as sss_cli
+
+HEX_KEYS = {
+    "alice_raw_key.txt": "8d11e51fd3fd2773611133ab0f2d22938d1092f4f21f1b0b3e1dcb8cda6e4f4b",
+    "second_key.txt": "0123456789abcdef" * 4,
+}
+
+
+def _split_inbox(tmp_path, workers=1, fmt='text'):
+    inbox, shares = tmp_path / "inbox", tmp_path / "shares"
+    inbox.mkdir()
+    for name, key in HEX_KEYS.items():
+        (inbox / name).write_text(key)
+    sss_cli.cmd_split(argparse.Namespace(inbox=str(inbox), outbox=str(shares),
+                                         threshold=3, num_shares=5, workers=workers, format=fmt))
+    return shares
+
+
+def test_split_empty_inbox(tmp_path):
+    out = tmp_path / "out"
+    sss_cli.cmd_split(argparse.Namespace(inbox=str(tmp_path / "inbox"), outbox=str(out),
+                                         threshold=3, num_shares=5, workers=1, format='text'))
+    assert not out.exists()
+
+
+def test_split_combine_groups_shares_per_secret(tmp_path):
+    shares = _split_inbox(tmp_path, workers=2)
+    assert len(list(shares.iterdir())) == 10
+    out = tmp_path / "out"
+    sss_cli.cmd_combine(argparse.Namespace(inbox=str(shares), outbox=str(out),
+                                           threshold=3, workers=2, format='text'))
+    for name, key in HEX_KEYS.items():
+        assert (out / f"recovered_{name}").read_text() == key
+
+
+def test_combine_single_secret_corrects_bad_share(tmp_path):
+    shares = _split_inbox(tmp_path)
+    for path in shares.glob("share_*_second_key.txt"):
+        path.unlink()
+    (shares / "share_2_alice_raw_key.txt").write_text("1234")
+    out = tmp_path / "out"
+    sss_cli.cmd_combine(argparse.Namespace(inbox=str(shares), outbox=str(out),
+                                           threshold=3, workers=1, format='text'))
+    assert (out / "recovered.txt").read_text() == HEX_KEYS["alice_raw_key.txt"]
+
+
+def test_split_combine_containers(tmp_path):
+    shares = _split_inbox(tmp_path, workers=2, fmt='container')
+    assert sorted(p.name for p in shares.iterdir()) == [f"share_{x}.sssc" for x in range(1, 6)]
+    (shares / "share_1.sssc").unlink()
+    (shares / "share_4.sssc").unlink()
+    out = tmp_path / "out"
+    sss_cli.cmd_combine(argparse.Namespace(inbox=str(shares), outbox=str(out),
+                                           threshold=3, workers=1, format='container'))
+    for name, key in HEX_KEYS.items():
+        assert (out / f"recovered_{name}").read_text() == key
+
+
+def test_combine_containers_skips_damaged_files(tmp_path):
+    shares = _split_inbox(tmp_path, workers=1, fmt='container')
+    blob = (shares / "share_1.sssc").read_bytes()
+    (shares / "share_1.sssc").write_bytes(blob[:len(blob) // 2])
+    (shares / "share_2.sssc").write_bytes(b"garbage")
+    out = tmp_path / "out"
+    sss_cli.cmd_combine(argparse.Namespace(inbox=str(shares), outbox=str(out),
+                                           threshold=3, workers=1, format='container'))
+    for name, key in HEX_KEYS.items():
+        assert (out / f"recovered_{name}").read_text() == key
+
+
+def test_verifiable_combine_drops_bad_shares(tmp_path):
+    inbox, shares = tmp_path / "inbox", tmp_path / "shares"
+    inbox.mkdir()
+    (inbox / "alice_raw_key.txt").write_text(HEX_KEYS["alice_raw_key.txt"])
+    sss_cli.cmd_split(argparse.Namespace(inbox=str(inbox), outbox=str(shares), threshold=3,
+                                         num_shares=5, workers=1, format='text', verifiable=True))
+    assert (shares / "commit_alice_raw_key.txt").exists()
+    # Two corrupted shares are more than decode_secret() alone can correct
+    for idx in (1, 4):
+        path = shares / f"share_{idx}_alice_raw_key.txt"
+        path.write_text(format(int(path.read_text(), 16) ^ 0xff, 'x'))
+    out = tmp_path / "out"
+    sss_cli.cmd_combine(argparse.Namespace(inbox=str(shares), outbox=str(out),
+                                           threshold=3, workers=1, format='text'))
+    assert (out / "recovered.txt").read_text() == HEX_KEYS["alice_raw_key.txt"]
+
+
+def test_combine_containers_picks_shares_per_secret(tmp_path, caplog):
+    from src.logic.container import encode_container
+    from src.logic.shamir import split_secrets
+
+    keys = {f"k{i}.txt": format(i * 0x1234567, '064x') for i in range(1, 5)}
+    batch = split_secrets(list(keys.values()), 3, 5)
+    col = {x: dict(zip(keys, batch.columns[x - 1])) for x in batch.x_s}
+    shares = tmp_path / "shares"
+    shares.mkdir()
+    # k1 is in every container, k2 and k3 in different ones, k4 has two shares only
+    for name, ids, x_s in (("a", ["k1.txt", "k2.txt", "k3.txt", "k4.txt"], [1, 2]),
+                           ("b", ["k1.txt", "k2.txt"], [3]),
+                           ("c", ["k1.txt", "k3.txt"], [4, 5])):
+        blob = encode_container(ids, 3, x_s, [[col[x][i] for i in ids] for x in x_s])
+        (shares / f"share_{name}.sssc").write_bytes(blob)
+    out = tmp_path / "out"
+    sss_cli.cmd_combine(argparse.Namespace(inbox=str(shares), outbox=str(out),
+                                           threshold=3, workers=1, format='container'))
+    assert {p.name: p.read_text() for p in out.iterdir()} == \
+        {f"recovered_{name}": key for name, key in keys.items() if name != "k4.txt"}
+    assert "Cannot recover k4.txt: need 3 shares, found 2" in caplog.text
@@ -0,0 +1,58 @@
+import os
+import struct
+import sys
+import pytest
+
+test_dir = os.path.dirname(__file__)
+src_dir = os.path.abspath(os.path.join(test_dir, '..', 'src'))
+sys.path.insert(0, src_dir)
+# container.py imports the field moduli from src.logic.shamir
+sys.path.insert(0, os.path.dirname(src_dir))
+
+from logic.container import encode_container, ContainerView
+from logic.shamir import split_secrets, recover_secrets
+
+HEX_KEY = "8d11e51fd3fd2773611133ab0f2d22938d1092f4f21f1b0b3e1dcb8cda6e4f4b"
+
+
+def test_container_roundtrip():
+    keys = [HEX_KEY, "ab" * 32]
+    batch = split_secrets(keys, threshold=2, num_shares=3)
+    blob = encode_container(["zeta", "alpha"], 2, batch.x_s, batch.columns)
+    view = ContainerView(blob)
+    assert view.threshold == 2
+    assert view.x_s == [1, 2, 3]
+    assert view.ids() == ["alpha", "zeta"]
+    assert view.shares("zeta") == batch.shares(0)
+    assert view.column(1) == [batch.columns[1][1], batch.columns[1][0]]
+    assert len(view.raw("alpha")) == 3 * 33
+    assert recover_secrets([view.shares("alpha")], 2) == [keys[1]]
+
+
+def test_container_rejects_garbage():
+    with pytest.raises(ValueError):
+        ContainerView(b"not a container at all")
+
+
+def test_container_unknown_id():
+    view = ContainerView(encode_container(["k"], 1, [1], [[5]]))
+    with pytest.raises(KeyError):
+        view.values("missing")
+
+
+def test_container_lookup_every_id():
+    ids = [f"key{i:03d}" for i in range(37)]
+    view = ContainerView(encode_container(ids, 1, [1], [list(range(37))]))
+    assert [view.values(i)[0] for i in reversed(ids)] == list(range(36, -1, -1))
+    with pytest.raises(KeyError):
+        view.values("key")
+
+
+def test_container_names_its_field():
+    from logic.shamir import LEGACY_PRIME, PRIME
+    assert ContainerView(encode_container(["k"], 1, [1], [[5]])).modulus == PRIME
+    # A version 1 container (no modulus field) holds legacy 2^257 - 1 shares
+    header = struct.pack('<4sBBHHII', b"SSSC", 1, 33, 1, 1, 1, 1) + struct.pack('<H', 1)
+    index = struct.pack('<IHQ', 0, 1, len(header) + 14 + 1)
+    view = ContainerView(header + index + b"k" + (5).to_bytes(33, 'little'))
+    assert view.modulus == LEGACY_PRIME and view.values("k") == [5]
@@ -0,0 +1,90 @@
+import argparse
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src import cli as sss_cli
+from src.logic.envelope import (
+    Manifest, create_envelope, open_envelope, hkdf_extract, hkdf_expand,
+)
+
+HEX_KEY = "8d11e51fd3fd2773611133ab0f2d22938d1092f4f21f1b0b3e1dcb8cda6e4f4b"
+
+
+def test_hkdf_rfc5869_vector():
+    # RFC 5869, test case 1
+    prk = hkdf_extract(bytes.fromhex("000102030405060708090a0b0c"), bytes([0x0b] * 22))
+    assert prk.hex() == "077709362c2e32df0ddc3f0dc47bba6390b6c73bb50f9c3122ec844ad7c2b3e5"
+    okm = hkdf_expand(prk, bytes.fromhex("f0f1f2f3f4f5f6f7f8f9"), 42)
+    assert okm.hex() == ("3cb25f25faacd57a90434f64d0362f2a2d2d0a90cf1a5a4c5db02d56ecc4c5bf"
+                         "34007208d5b887185865")
+
+
+def test_envelope_roundtrip_and_rekey():
+    files = [f"file_{i}.bin" for i in range(1000)]
+    manifest, shares = create_envelope(HEX_KEY, files, 3, 5, master="alice_raw_key.txt")
+    keys = open_envelope(manifest, shares[:3]).data_keys()
+    assert len(set(keys.values())) == 1000 and all(len(k) == 64 for k in keys.values())
+
+    # The manifest round-trips through JSON; any quorum, even with a bad share, agrees
+    restored = Manifest.from_json(manifest.to_json())
+    shares[0] = (1, "1234")
+    envelope = open_envelope(restored, shares)
+    assert envelope.data_keys() == keys
+
+    restored.rekey("file_7.bin")
+    assert restored.files["file_7.bin"] == "file_7.bin#2"
+    assert envelope.data_key("file_7.bin") not in keys.values()
+    with pytest.raises(KeyError):
+        envelope.data_key("missing.bin")
+
+
+def test_envelope_rejects_wrong_master():
+    manifest, _ = create_envelope(HEX_KEY, ["a"], 2, 3)
+    _, other = create_envelope("ab" * 32, ["a"], 2, 3)
+    with pytest.raises(ValueError):
+        open_envelope(manifest, other[:2])
+    with pytest.raises(ValueError):
+        Manifest.from_json(json.dumps({"version": 1, "files": {}}))
+
+
+def test_version_1_manifest_opens_legacy_field_shares():
+    from src.logic.shamir import LEGACY_PRIME, PRIME
+    manifest, current = create_envelope(HEX_KEY, ["a"], 2, 3)
+    assert Manifest.from_json(manifest.to_json()).modulus == PRIME
+    data = json.loads(manifest.to_json())
+    data["version"] = 1
+    del data["modulus"]
+    legacy = Manifest.from_json(json.dumps(data))
+    assert legacy.modulus == LEGACY_PRIME
+    # Shares of 2^257 - 1, as split when version 1 manifests were written
+    shares = [(x, format((int(HEX_KEY, 16) + (2 ** 256 + 7) * x) % LEGACY_PRIME, 'x')) for x in (1, 2)]
+    assert open_envelope(legacy, shares).data_keys() == open_envelope(manifest, current[:2]).data_keys()
+    with pytest.raises(ValueError):
+        open_envelope(manifest, shares)
+
+
+def test_cli_envelope_and_derive(tmp_path):
+    files, keys_out, shares = tmp_path / "files", tmp_path / "keys", tmp_path / "shares"
+    files.mkdir()
+    for i in range(20):
+        (files / f"doc_{i}.txt").write_text("x" * i)
+    key = tmp_path / "alice_raw_key.txt"
+    key.write_text(HEX_KEY)
+    sss_cli.cmd_envelope(argparse.Namespace(key=str(key), files=str(files), outbox=str(shares),
+                                            manifest_name="manifest.json", keys_out=str(keys_out),
+                                            threshold=3, num_shares=5))
+    # One share per index for the whole directory, plus the manifest
+    assert sorted(p.name for p in shares.iterdir()) == \
+        ["manifest.json"] + [f"share_{x}_alice_raw_key.txt" for x in range(1, 6)]
+    (shares / "share_2_alice_raw_key.txt").unlink()
+    out = tmp_path / "out"
+    sss_cli.cmd_derive(argparse.Namespace(inbox=str(shares), manifest=str(shares / "manifest.json"),
+                                          outbox=str(out), file=None))
+    assert len(list(out.iterdir())) == 20
+    for path in keys_out.iterdir():
+        assert (out / path.name).read_text() == path.read_text()
@@ -0,0 +1,76 @@
+import io
+import os
+import sys
+import pytest
+
+test_dir = os.path.dirname(__file__)
+src_dir = os.path.abspath(os.path.join(test_dir, '..', 'src'))
+sys.path.insert(0, src_dir)
+
+pytest.importorskip("numpy")
+
+from logic.gf256 import split_bytes, combine_bytes, split_stream, combine_stream
+
+PEM = os.path.join(test_dir, '..', '..', 'data_at_rest', 'private.pem')
+
+
+def test_split_and_combine_bytes():
+    data = os.urandom(10_000)
+    shares = split_bytes(data, threshold=3, num_shares=5)
+    assert len(shares) == 5
+    assert all(len(s) == len(data) + 2 for s in shares)
+    assert combine_bytes(shares[2:]) == data
+    assert combine_bytes([shares[4], shares[0], shares[2]]) == data
+
+
+def test_single_share_threshold_and_empty_payload():
+    assert combine_bytes(split_bytes(b"abc", threshold=1, num_shares=2)[1:]) == b"abc"
+    assert combine_bytes(split_bytes(b"", threshold=2, num_shares=2)) == b""
+
+
+def test_stream_roundtrip_with_small_blocks():
+    with open(PEM, 'rb') as f:
+        data = f.read()
+    dsts = [io.BytesIO() for _ in range(4)]
+    assert split_stream(io.BytesIO(data), dsts, threshold=2, block_size=7) == len(data)
+    out = io.BytesIO()
+    srcs = [io.BytesIO(d.getvalue()) for d in dsts[1:3]]
+    assert combine_stream(srcs, out, block_size=5) == len(data)
+    assert out.getvalue() == data
+
+
+def test_combine_insufficient_shares():
+    shares = split_bytes(b"secret", threshold=3, num_shares=5)
+    with pytest.raises(ValueError):
+        combine_bytes(shares[:2])
+
+
+def test_split_threshold_gt_shares():
+    with pytest.raises(ValueError):
+        split_bytes(b"secret", threshold=4, num_shares=3)
+
+
+def test_combine_rejects_zero_threshold_header():
+    srcs = [io.BytesIO(bytes((1, 0)) + b"abc"), io.BytesIO(bytes((2, 0)) + b"abc")]
+    with pytest.raises(ValueError):
+        combine_stream(srcs, io.BytesIO())
+
+
+def test_cli_split_and_combine_files(tmp_path):
+    import argparse
+    sys.path.insert(0, os.path.dirname(src_dir))
+    from src import cli as sss_cli
+
+    files, shares, out = tmp_path / "files", tmp_path / "shares", tmp_path / "out"
+    files.mkdir()
+    with open(PEM, 'rb') as f:
+        (files / "private.pem").write_bytes(f.read())
+    (files / "blob.bin").write_bytes(os.urandom(100_000))
+    sss_cli.cmd_split_files(argparse.Namespace(files=str(files), outbox=str(shares),
+                                               threshold=3, num_shares=5))
+    assert len(list(shares.iterdir())) == 10
+    for path in shares.glob("share_[13]_*"):
+        path.unlink()
+    sss_cli.cmd_combine_files(argparse.Namespace(inbox=str(shares), outbox=str(out)))
+    assert {p.name: p.read_bytes() for p in out.iterdir()} == \
+        {p.name: p.read_bytes() for p in files.iterdir()}
@@ -0,0 +1,128 @@
+import argparse
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src import cli as sss_cli
+from src.logic.shamir import (
+    PRIME, VSS_P, split_secrets, recover_secret, recover_secrets, verify_shares,
+)
+from src.logic.refresh import (
+    refresh_batch, refresh_deltas, encode_deltas, decode_deltas, apply_delta,
+    apply_commitment_delta,
+)
+
+HEX_KEY = "8d11e51fd3fd2773611133ab0f2d22938d1092f4f21f1b0b3e1dcb8cda6e4f4b"
+
+
+def test_refresh_keeps_secrets_and_breaks_old_shares():
+    keys = [format(i * 0x1234567 + 1, '064x') for i in range(200)]
+    batch = split_secrets(keys, 3, 5)
+    fresh = refresh_batch(batch)
+    assert recover_secrets(fresh, 3) == keys
+    assert all(a != b for old, new in zip(batch.columns, fresh.columns) for a, b in zip(old, new))
+    # One share from before the refresh spoils the combination
+    mixed = [batch.shares(0)[0]] + fresh.shares(0)[1:3]
+    assert recover_secret(mixed, 3) != keys[0]
+
+
+def test_refresh_deltas_vanish_at_zero():
+    columns = refresh_deltas(50, 4, [0, 1, 2])
+    assert columns[0] == [0] * 50
+    assert all(0 <= d < PRIME for col in columns for d in col)
+    assert refresh_deltas(3, 1, [1, 2]) == [[0] * 3, [0] * 3]
+
+
+def test_refresh_updates_feldman_commitments():
+    batch = split_secrets([HEX_KEY] * 20, 3, 5, verifiable=True)
+    fresh = refresh_batch(batch)
+    assert [c[0] for c in fresh.commitments] == [c[0] for c in batch.commitments]
+    items = [(share, fresh.commitments[s]) for s in range(20) for share in fresh.shares(s)]
+    assert verify_shares(items) == []
+    stale = [(batch.shares(0)[0], fresh.commitments[0])]
+    assert verify_shares(stale) == [0]
+
+
+def test_delta_record_roundtrip_and_errors():
+    entries = [("share_1_a.txt", 5), ("share_2_ä.txt", PRIME - 1), ("commit_a.txt", [1, VSS_P - 1])]
+    decoded = decode_deltas(encode_deltas(entries, b"r" * 16))
+    assert decoded == (b"r" * 16, PRIME, VSS_P, entries)
+    blob = encode_deltas(entries)
+    for bad in (blob[:10], blob[:-1], blob + b"x", b"XXXX" + blob[4:]):
+        with pytest.raises(ValueError):
+            decode_deltas(bad)
+    assert apply_delta("ff", PRIME - 0xff) == "0"
+    field = f"field {PRIME:x}\n"
+    assert apply_commitment_delta(field + "2\n3", [5, 7]) == field + "a\n15"
+    with pytest.raises(ValueError):
+        apply_commitment_delta(field + "2\n3", [5])
+    with pytest.raises(ValueError):
+        apply_commitment_delta("2\n3", [5, 7])
+
+
+def test_cli_refresh_writes_record_and_applies(tmp_path):
+    inbox, outbox = tmp_path / "inbox", tmp_path / "outbox"
+    inbox.mkdir()
+    batch = split_secrets([HEX_KEY, "ab" * 32], 3, 5)
+    for s, name in enumerate(["k1.txt", "k2.txt"]):
+        for idx, share in batch.shares(s):
+            (inbox / f"share_{idx}_{name}").write_text(share)
+    before = {p.name: p.read_text() for p in inbox.iterdir()}
+
+    sss_cli.cmd_refresh(argparse.Namespace(inbox=str(inbox), outbox=str(outbox), threshold=3,
+                                           apply=True, workers=1))
+    (record,) = outbox.iterdir()
+    _, _, _, entries = decode_deltas(record.read_bytes())
+    assert sorted(name for name, _ in entries) == sorted(before)
+    for name, delta in entries:
+        assert (inbox / name).read_text() == apply_delta(before[name], delta)
+
+    sss_cli.cmd_combine(argparse.Namespace(inbox=str(inbox), outbox=str(outbox), threshold=3,
+                                           workers=1, format='text'))
+    assert (outbox / "recovered_k1.txt").read_text() == HEX_KEY
+    assert (outbox / "recovered_k2.txt").read_text() == "ab" * 32
+
+
+def _apply_record(record, directory):
+    """Apply a delta record to the files of directory, as a storage server does."""
+    _, _, _, entries = decode_deltas(record.read_bytes())
+    for name, delta in entries:
+        path = directory / name
+        if isinstance(delta, int):
+            path.write_text(apply_delta(path.read_text(), delta))
+        else:
+            path.write_text(apply_commitment_delta(path.read_text(), delta))
+
+
+def test_cli_refresh_keeps_verifiable_shares_verifiable(tmp_path, caplog):
+    secrets, store, outbox = tmp_path / "secrets", tmp_path / "store", tmp_path / "outbox"
+    secrets.mkdir()
+    (secrets / "k1.txt").write_text(HEX_KEY)
+    (secrets / "k2.txt").write_text("ab" * 32)
+    sss_cli.cmd_split(argparse.Namespace(inbox=str(secrets), outbox=str(store), threshold=3,
+                                         num_shares=5, workers=1, format='text', verifiable=True))
+    before = {p.name: p.read_text() for p in store.iterdir()}
+
+    # The record is written without touching the store, then applied there
+    sss_cli.cmd_refresh(argparse.Namespace(inbox=str(store), outbox=str(outbox), threshold=3,
+                                           apply=False, workers=1))
+    assert {p.name: p.read_text() for p in store.iterdir()} == before
+    (record,) = outbox.iterdir()
+    _apply_record(record, store)
+    assert all((store / name).read_text() != text for name, text in before.items())
+
+    # Then refreshed again, in place
+    sss_cli.cmd_refresh(argparse.Namespace(inbox=str(store), outbox=str(outbox), threshold=3,
+                                           apply=True, workers=1))
+    for record in outbox.iterdir():
+        record.unlink()
+
+    with caplog.at_level("WARNING"):
+        sss_cli.cmd_combine(argparse.Namespace(inbox=str(store), outbox=str(outbox), threshold=3,
+                                               workers=1, format='text'))
+    assert not [r for r in caplog.records if r.levelname in ("WARNING", "ERROR")]
+    assert (outbox / "recovered_k1.txt").read_text() == HEX_KEY
+    assert (outbox / "recovered_k2.txt").read_text() == "ab" * 32
@@ -0,0 +1,78 @@
+import json
+import os
+import sys
+import threading
+import http.client
+import pytest
+
+# Ensure the project root is on PYTHONPATH so that `src` can be imported
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.service import SSSService, make_server
+
+HEX_KEY = "8d11e51fd3fd2773611133ab0f2d22938d1092f4f21f1b0b3e1dcb8cda6e4f4b"
+
+
+@pytest.fixture
+def server():
+    service = SSSService(workers=1)
+    srv = make_server(service, port=0)
+    thread = threading.Thread(target=srv.serve_forever, daemon=True)
+    thread.start()
+    yield srv.server_address[1]
+    srv.shutdown()
+    srv.server_close()
+    service.close()
+
+
+def _post(port, path, body, headers=None):
+    conn = http.client.HTTPConnection('127.0.0.1', port)
+    conn.request('POST', path, json.dumps(body), headers or {})
+    resp = conn.getresponse()
+    return resp.status, json.loads(resp.read())
+
+
+def test_service_batch_roundtrip_in_process():
+    service = SSSService(workers=1)
+    batch = service.split_batch([HEX_KEY] * 5000, 3, 5)
+    assert len(batch) == 5000
+    lists = [batch.shares(s)[:3] for s in range(len(batch))]
+    assert service.recover_batch(lists, 3) == [HEX_KEY] * 5000
+
+
+def test_service_split_and_recover_over_http(server):
+    status, body = _post(server, '/split', {'secret': HEX_KEY, 'threshold': 3, 'num_shares': 5})
+    assert status == 200
+    shares = body['shares']
+    shares[0][1] = "1234"
+    status, body = _post(server, '/recover', {'shares': shares, 'threshold': 3, 'decode': True})
+    assert status == 200
+    assert body == {'secret': HEX_KEY, 'bad_shares': [1]}
+
+
+def test_service_rejects_invalid_input(server):
+    status, body = _post(server, '/split', {'secret': 'dead', 'threshold': 3, 'num_shares': 5})
+    assert status == 400 and 'error' in body
+    status, _ = _post(server, '/nope', {})
+    assert status == 404
+
+
+def test_service_requires_token_and_opt_in_for_remote_hosts():
+    service = SSSService(workers=1)
+    with pytest.raises(ValueError):
+        make_server(service, host='0.0.0.0', port=0)
+    with pytest.raises(ValueError):
+        make_server(service, host='0.0.0.0', port=0, allow_remote=True)
+    srv = make_server(service, port=0, token='s3cret')
+    thread = threading.Thread(target=srv.serve_forever, daemon=True)
+    thread.start()
+    try:
+        port = srv.server_address[1]
+        body = {'secret': HEX_KEY, 'threshold': 3, 'num_shares': 5}
+        assert _post(port, '/split', body)[0] == 401
+        assert _post(port, '/split', body, {'Authorization': 'Bearer wrong'})[0] == 401
+        assert _post(port, '/split', body, {'Authorization': 'Bearer s3cret'})[0] == 200
+    finally:
+        srv.shutdown()
+        srv.server_close()
+        service.close()
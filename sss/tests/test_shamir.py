@@ -15,7 +15,12 @@ test_dir = os.path.dirname(__file__)
 src_dir = os.path.abspath(os.path.join(test_dir, '..', 'src'))
 sys.path.insert(0, src_dir)
 
-from logic.shamir import split_secret, recover_secret
+from logic.shamir import (
+    PRIME, split_secret, recover_secret, split_secrets, recover_secrets, decode_secret,
+    _lagrange_interpolate, _lagrange_weights,
+    VSS_R, VSS_P, FixedBaseTable, commit, verify_share, verify_shares,
+    _multi_pow, LEGACY_PRIME, format_commitments, parse_commitments,
+)
 
 # Valid key example
 HEX_KEY = "8d11e51fd3fd2773611133ab0f2d22938d1092f4f21f1b0b3e1dcb8cda6e4f4b"
@@ -48,4 +53,145 @@ def test_recover_with_extra_shares():
     shares = split_secret(HEX_KEY, threshold=3, num_shares=5)
     # Provide 4 shares but threshold=3
     recovered = recover_secret(shares[:4], threshold=3)
-    assert recovered == HEX_KEY
\ No newline at end of file
+    assert recovered == HEX_KEY
+
+def test_split_secrets_batch_roundtrip():
+    keys = [HEX_KEY, "00" * 32, "ff" * 32]
+    batch = split_secrets(keys, threshold=3, num_shares=5)
+    assert len(batch) == 3
+    assert batch.x_s == [1, 2, 3, 4, 5]
+    assert len(batch.columns) == 5
+    for s, key in enumerate(keys):
+        shares = batch.shares(s)
+        assert recover_secret(shares[2:], threshold=3) == key.lower()
+
+
+def test_split_secrets_rejects_invalid_member():
+    with pytest.raises(ValueError):
+        split_secrets([HEX_KEY, "deadbeef"], threshold=2, num_shares=3)
+
+
+def test_recover_secrets_from_batch_and_lists():
+    keys = [HEX_KEY, "0123456789abcdef" * 4]
+    batch = split_secrets(keys, threshold=3, num_shares=5)
+    assert recover_secrets(batch, threshold=3) == keys
+    lists = [batch.shares(s)[::-1] for s in range(len(keys))]
+    assert recover_secrets(lists, threshold=3) == keys
+
+
+def test_lagrange_weights_match_interpolation():
+    x_s = (2, 4, 5)
+    y_s = [11, 22, 33]
+    weights = _lagrange_weights(x_s)
+    assert sum(w * y for w, y in zip(weights, y_s)) % PRIME == \
+        _lagrange_interpolate(0, list(x_s), y_s)
+
+
+def test_recover_duplicate_x_rejected():
+    shares = split_secret(HEX_KEY, threshold=2, num_shares=3)
+    with pytest.raises(ValueError):
+        recover_secret([shares[0], shares[0]], threshold=2)
+
+
+def test_decode_secret_corrects_bad_shares():
+    shares = split_secret(HEX_KEY, threshold=10, num_shares=20)
+    shares[3] = (shares[3][0], "1234")
+    shares[17] = (shares[17][0], format(int(shares[17][1], 16) + 1, 'x'))
+    recovered, bad = decode_secret(shares, threshold=10)
+    assert recovered == HEX_KEY
+    assert bad == [4, 18]
+
+
+def test_decode_secret_consistent_shares():
+    shares = split_secret(HEX_KEY, threshold=3, num_shares=5)
+    assert decode_secret(shares, threshold=3) == (HEX_KEY, [])
+
+
+def test_decode_secret_too_many_errors():
+    shares = split_secret(HEX_KEY, threshold=3, num_shares=4)
+    shares[0] = (1, "abc")
+    with pytest.raises(ValueError):
+        decode_secret(shares, threshold=3)
+
+
+def _probable_prime(n, rounds=32):
+    d, s = n - 1, 0
+    while d % 2 == 0:
+        d, s = d // 2, s + 1
+    for a in range(2, 2 + rounds):
+        x = pow(a, d, n)
+        if x in (1, n - 1):
+            continue
+        for _ in range(s - 1):
+            x = x * x % n
+            if x == n - 1:
+                break
+        else:
+            return False
+    return True
+
+
+def test_vss_group_parameters():
+    # The field is prime, so the commitment group has prime order
+    assert PRIME > 2**256 and _probable_prime(PRIME)
+    assert VSS_P.bit_length() == 2048 and _probable_prime(VSS_P)
+    # The generator has order exactly PRIME
+    g = pow(2, VSS_R, VSS_P)
+    assert g != 1 and pow(g, PRIME, VSS_P) == 1
+
+
+def test_fixed_base_table_and_multi_pow():
+    table = FixedBaseTable(5, p=VSS_P, bits=64, window=5)
+    for e in (0, 1, 31, 32, 2**64 - 1, 123456789123456789):
+        assert table.pow(e) == pow(5, e, VSS_P)
+    with pytest.raises(ValueError):
+        table.pow(2**64)
+    pairs = [(b, e) for b, e in zip(range(3, 40), range(10**20, 10**21, 10**19 + 7))]
+    expected = 1
+    for b, e in pairs:
+        expected = expected * pow(b, e, VSS_P) % VSS_P
+    assert _multi_pow(pairs) == expected
+
+
+def test_verifiable_split_and_batch_verification():
+    batch = split_secrets([HEX_KEY, "ab" * 32] * 100, threshold=3, num_shares=5, verifiable=True)
+    assert len(batch.commitments[0]) == 3
+    assert batch.commitments[0][0] == commit([int(HEX_KEY, 16)])[0]
+    items = [(share, batch.commitments[s]) for s in range(len(batch)) for share in batch.shares(s)]
+    assert all(verify_share(*item) for item in items[:10])
+    assert verify_shares(items) == []
+
+    # Wrong value, share of another secret, out-of-range value
+    x, y = items[7][0]
+    items[7] = ((x, format(int(y, 16) ^ 1, 'x')), items[7][1])
+    items[512] = (items[0][0], items[512][1])
+    items[900] = ((3, format(PRIME, 'x')), items[900][1])
+    assert not verify_share(*items[7])
+    assert verify_shares(items) == [7, 512, 900]
+
+
+def _legacy_shares(secret_hex, coeffs, num_shares):
+    """Shares of a polynomial modulo LEGACY_PRIME, as split before PRIME changed."""
+    poly = [int(secret_hex, 16)] + coeffs
+    return [(x, format(sum(c * x ** k for k, c in enumerate(poly)) % LEGACY_PRIME, 'x'))
+            for x in range(1, num_shares + 1)]
+
+
+def test_legacy_field_shares_combine_only_in_their_field():
+    shares = _legacy_shares(HEX_KEY, [LEGACY_PRIME - 5, 2 ** 256 + 7], 5)
+    assert recover_secret(shares[:3], 3, prime=LEGACY_PRIME) == HEX_KEY
+    assert decode_secret(shares, 3, prime=LEGACY_PRIME) == (HEX_KEY, [])
+    assert recover_secret(shares[:3], 3) != HEX_KEY
+    # A value past PRIME cannot be a share of the current field
+    with pytest.raises(ValueError, match="legacy"):
+        recover_secret([(1, format(PRIME + 5, 'x'))] + shares[1:3], 3)
+
+
+def test_commitment_files_name_their_field():
+    commitments = [3, 5, 7]
+    text = format_commitments(commitments)
+    assert text.splitlines()[0] == f"field {PRIME:x}"
+    assert parse_commitments(text + "\n") == commitments
+    for bad in ("3\n5\n7", f"field {LEGACY_PRIME:x}\n3\n5\n7", ""):
+        with pytest.raises(ValueError):
+            parse_commitments(bad)